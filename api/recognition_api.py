@@ -7,13 +7,18 @@ import base64
 import numpy as np
 from PIL import Image
 import io
+import time
 from typing import Optional
 
+from face_recognition import inference_scheduler, model_registry
 from face_recognition.encoder import ArcFaceEncoder
 from face_recognition.matcher import FaceMatcher
+from face_recognition.cascade import CascadeMatcher
+from face_recognition.adaptive_detection import FaceScaleTracker
 from face_recognition.database import FaceDatabase
 from face_recognition.config import FLASK_SECRET_KEY, FLASK_DEBUG, COSINE_SIMILARITY_THRESHOLD, ENABLE_GAP_VALIDATION
 from face_recognition.quality_checker import user_message_for_reason
+from face_recognition.roster import RosterNotFoundError
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = FLASK_SECRET_KEY
@@ -22,18 +27,28 @@ CORS(app)  # Enable CORS untuk web interface
 # Initialize components
 encoder = None
 matcher = None
+cascade = None
 db = None
+face_scales = FaceScaleTracker()  # Skala wajah frame terakhir per client (adaptive det_size)
 
 
 def init_components():
     """Initialize encoder, matcher, dan database."""
-    global encoder, matcher, db
+    global encoder, matcher, cascade, db
     if encoder is None:
         print("Initializing face recognition components...")
+        start = time.time()
         encoder = ArcFaceEncoder()
+        models_seconds = time.time() - start
         db = FaceDatabase()
         matcher = FaceMatcher(db)
-        print("Components initialized!")
+        cascade = CascadeMatcher(encoder, matcher)
+        print(f"Components initialized in {time.time() - start:.2f}s (models {models_seconds:.2f}s)")
+
+
+def detection_client_id() -> str:
+    """Identitas client untuk hint ukuran wajah: header X-Client-Id (kiosk), fallback IP."""
+    return request.headers.get('X-Client-Id') or request.remote_addr or 'unknown'
 
 
 @app.route('/status', methods=['GET'])
@@ -45,7 +60,10 @@ def status():
         return jsonify({
             'success': True,
             'status': 'ready',
-            'stats': stats
+            'stats': stats,
+            'inference_batching': inference_scheduler.stats(),
+            'cascade': cascade.stats(),
+            'adaptive_detection': {**model_registry.detection_stats(), **face_scales.stats()}
         })
     except Exception as e:
         return jsonify({
@@ -80,6 +98,7 @@ def recognize():
     Accepts:
     - Multipart form data dengan 'image' file
     - JSON dengan 'image' base64 encoded string
+    - Optional 'roster_id' (query param / form / JSON): hanya cocokkan dengan NIM di roster
     
     Returns:
     {
@@ -126,10 +145,15 @@ def recognize():
         if threshold is None:
             threshold = COSINE_SIMILARITY_THRESHOLD
         
-        # Generate embedding
-        embedding, qc = encoder.encode_with_qc(image_bgr, mode="lightweight")
+        # Detection + QC (recognition dijalankan oleh cascade).
+        # det_size adaptif dari ukuran wajah frame sebelumnya client ini
+        client_id = detection_client_id()
+        face, qc = encoder.detect_with_qc(image_bgr, mode="lightweight",
+                                          face_scale_hint=face_scales.hint(client_id))
+        if face is not None or qc.get("reason") == "no_face":
+            face_scales.update(client_id, image_bgr.shape, [face] if face is not None else [])
 
-        if embedding is None:
+        if face is None:
             reason = (qc or {}).get("reason", "no_face")
             return jsonify({
                 'success': False,
@@ -139,6 +163,10 @@ def recognize():
                 'details': (qc or {}).get("details", {})
             }), 200
         
+        # Roster (ruang / sesi ujian): query param, form field, atau JSON
+        roster_id = request.args.get('roster_id') or request.form.get('roster_id') or \
+                    (request.json.get('roster_id') if request.is_json else None)
+        
         # Check if this is auto-scan mode (from header or parameter)
         is_auto_scan = request.headers.get('X-Auto-Scan', 'false').lower() == 'true' or \
                        request.args.get('auto_scan', 'false').lower() == 'true'
@@ -146,7 +174,26 @@ def recognize():
         # Match dengan database (dengan validasi gap)
         # Untuk auto-scan, kita lebih fleksibel dengan gap
         require_gap = not is_auto_scan  # Auto-scan tidak require gap ketat
-        matches = matcher.match(embedding, threshold=threshold, require_gap=require_gap)
+        try:
+            # Cascade: embedding model utama hanya jika screen model cepat ambigu
+            matches, cascade_info = cascade.match(image_bgr, face, threshold=threshold,
+                                                  require_gap=require_gap, roster_id=roster_id)
+        except RosterNotFoundError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'roster_id': roster_id
+            }), 404
+        
+        if cascade_info['embedding_failed']:
+            # Wajah lolos QC tetapi embedding gagal: respons QC seperti encode_with_qc
+            return jsonify({
+                'success': False,
+                'error': 'Quality check failed',
+                'reason': 'no_face',
+                'user_message': user_message_for_reason('no_face'),
+                'details': {'why': 'no_embedding'}
+            }), 200
         
         if not matches:
             print(f"[ERROR] No match found above threshold {threshold}")
@@ -175,7 +222,9 @@ def recognize():
         # Validasi gap (hanya jika diaktifkan di config)
         # Threshold sudah cukup tinggi untuk mengurangi false positive
         # Voting mechanism sudah handle konsistensi untuk auto-scan
-        if ENABLE_GAP_VALIDATION and not is_auto_scan and len(matches) > 1:
+        # Tier 'fast': skor skala model cepat, gap sudah divalidasi cascade (CASCADE_MARGIN);
+        # tier gap di bawah di-tune untuk skala model utama
+        if ENABLE_GAP_VALIDATION and not is_auto_scan and len(matches) > 1 and cascade_info['tier'] == 'full':
             best_confidence = best_match['confidence']
             second_confidence = matches[1]['confidence']
             gap = best_confidence - second_confidence
@@ -208,13 +257,14 @@ def recognize():
                     'min_required_gap': min_gap_required
                 }), 400
         
-        print(f"[SUCCESS] Recognized: NIM {best_match['nim']} with confidence {adjusted_confidence:.4f}")
+        print(f"[SUCCESS] Recognized: NIM {best_match['nim']} with confidence {adjusted_confidence:.4f} (tier {cascade_info['tier']})")
         
         # Log recognition
         db.log_recognition(
             nim=best_match['nim'],
             confidence=adjusted_confidence,
-            status='success' if adjusted_confidence >= threshold else 'low_confidence'
+            status='success' if adjusted_confidence >= threshold else 'low_confidence',
+            tier=cascade_info['tier']
         )
         
         return jsonify({
@@ -226,6 +276,7 @@ def recognize():
                 'confidence_penalty': confidence_penalty,
                 'details': qc_details
             },
+            'tier': cascade_info['tier'],
             'matches': matches[:5]  # Top 5 matches
         })
         
@@ -2520,90 +2520,79 @@ HTML_TEMPLATE = """
                     if (!blob) return;
                     
                     try {
-                        // First, detect face untuk visual feedback
-                        const detectFormData = new FormData();
-                        detectFormData.append('image', blob, 'frame.jpg');
-                        detectFormData.append('width', registerVideo.videoWidth);
-                        detectFormData.append('height', registerVideo.videoHeight);
+                        // Satu request: bbox untuk visual feedback + verdict QC (satu decode, satu detection)
+                        const frameFormData = new FormData();
+                        frameFormData.append('image', blob, 'frame.jpg');
+                        frameFormData.append('width', registerVideo.videoWidth);
+                        frameFormData.append('height', registerVideo.videoHeight);
                         
-                        const detectResponse = await fetch('/detect-face', {
+                        const frameResponse = await fetch('/api/frame-analyze', {
                             method: 'POST',
-                            body: detectFormData
+                            body: frameFormData
                         });
                         
-                        if (detectResponse.ok) {
-                            const detectData = await detectResponse.json();
-                            if (detectData.success && detectData.face) {
+                        if (frameResponse.ok) {
+                            const frameData = await frameResponse.json();
+                            if (frameData.success && frameData.face) {
                                 // Update temporal smoothing state
-                                lastRegisterFaceData = detectData.face;
+                                lastRegisterFaceData = frameData.face;
                                 lastRegisterFaceTime = Date.now();
                                 
                                 // Draw face box (will be rendered in detection loop)
                                 
                                 // Update liveness detection
-                                updateLivenessDetection(detectData.face);
+                                updateLivenessDetection(frameData.face);
                                 
-                                // Check QC jika face detected
-                                const qcFormData = new FormData();
-                                qcFormData.append('image', blob, 'frame.jpg');
-                                
-                                const qcResponse = await fetch('/api/check-qc', {
-                                    method: 'POST',
-                                    body: qcFormData
-                                });
-                                
-                                if (qcResponse.ok) {
-                                    const qcData = await qcResponse.json();
-                                    
-                                    if (qcData.qc_pass) {
-                                        // Check liveness
-                                        if (registerMotionDetected && registerBlinkDetected) {
-                                            // Both QC and liveness passed - add to voting history
-                                            registerReadyHistory.push(true);
-                                            if (registerReadyHistory.length > REGISTER_READY_VOTES_REQUIRED) {
-                                                registerReadyHistory.shift();
-                                            }
-                                            
-                                            // Check if we have enough votes
-                                            if (registerReadyHistory.length >= REGISTER_READY_VOTES_REQUIRED && 
-                                                registerReadyHistory.every(v => v === true)) {
-                                                // Stable ready state - store this frame as best
-                                                registerBestFrameBlob = blob;
-                                                // Auto capture setelah delay kecil untuk memastikan frame stabil
-                                                setTimeout(() => {
-                                                    if (registerBestFrameBlob && !registerPhotoCaptured) {
-                                                        updateRegisterStatus('✅ Foto siap - Mengambil foto...');
-                                                        autoCaptureRegisterPhoto(registerBestFrameBlob);
-                                                    }
-                                                }, 300); // Delay 300ms untuk memastikan frame benar-benar stabil
-                                            } else {
-                                                // Store current frame sebagai candidate jika belum ada
-                                                if (!registerBestFrameBlob) {
-                                                    registerBestFrameBlob = blob;
+                                // Verdict QC dari response yang sama
+                                const qcData = frameData;
+                                if (qcData.qc_pass) {
+                                    // Check liveness
+                                    if (registerMotionDetected && registerBlinkDetected) {
+                                        // Both QC and liveness passed - add to voting history
+                                        registerReadyHistory.push(true);
+                                        if (registerReadyHistory.length > REGISTER_READY_VOTES_REQUIRED) {
+                                            registerReadyHistory.shift();
+                                        }
+                                        
+                                        // Check if we have enough votes
+                                        if (registerReadyHistory.length >= REGISTER_READY_VOTES_REQUIRED && 
+                                            registerReadyHistory.every(v => v === true)) {
+                                            // Stable ready state - store this frame as best
+                                            registerBestFrameBlob = blob;
+                                            // Auto capture setelah delay kecil untuk memastikan frame stabil
+                                            setTimeout(() => {
+                                                if (registerBestFrameBlob && !registerPhotoCaptured) {
+                                                    updateRegisterStatus('✅ Foto siap - Mengambil foto...');
+                                                    autoCaptureRegisterPhoto(registerBestFrameBlob);
                                                 }
-                                                updateRegisterStatus(`Kualitas baik - Memeriksa stabilitas... (${registerReadyHistory.length}/${REGISTER_READY_VOTES_REQUIRED})`);
-                                            }
+                                            }, 300); // Delay 300ms untuk memastikan frame benar-benar stabil
                                         } else {
-                                            // Reset voting history jika liveness belum pass
-                                            registerReadyHistory = [];
-                                            
-                                            // Show liveness progress
-                                            let progressMsg = 'Kualitas baik - ';
-                                            if (!registerMotionDetected && !registerBlinkDetected) {
-                                                progressMsg += 'Gerakkan kepala dan kedipkan mata';
-                                            } else if (!registerMotionDetected) {
-                                                progressMsg += 'Gerakkan kepala';
-                                            } else if (!registerBlinkDetected) {
-                                                progressMsg += 'Kedipkan mata';
+                                            // Store current frame sebagai candidate jika belum ada
+                                            if (!registerBestFrameBlob) {
+                                                registerBestFrameBlob = blob;
                                             }
-                                            updateRegisterStatus(progressMsg);
+                                            updateRegisterStatus(`Kualitas baik - Memeriksa stabilitas... (${registerReadyHistory.length}/${REGISTER_READY_VOTES_REQUIRED})`);
                                         }
                                     } else {
-                                        // QC failed - reset voting history dan best frame
+                                        // Reset voting history jika liveness belum pass
                                         registerReadyHistory = [];
-                                        registerBestFrameBlob = null;
-                                        updateRegisterStatus('Wajah terdeteksi - ' + (qcData.user_message || 'Memeriksa kualitas...'));
+                                        
+                                        // Show liveness progress
+                                        let progressMsg = 'Kualitas baik - ';
+                                        if (!registerMotionDetected && !registerBlinkDetected) {
+                                            progressMsg += 'Gerakkan kepala dan kedipkan mata';
+                                        } else if (!registerMotionDetected) {
+                                            progressMsg += 'Gerakkan kepala';
+                                        } else if (!registerBlinkDetected) {
+                                            progressMsg += 'Kedipkan mata';
+                                        }
+                                        updateRegisterStatus(progressMsg);
                                     }
+                                } else {
+                                    // QC failed - reset voting history dan best frame
+                                    registerReadyHistory = [];
+                                    registerBestFrameBlob = null;
+                                    updateRegisterStatus('Wajah terdeteksi - ' + (qcData.user_message || 'Memeriksa kualitas...'));
                                 }
                             } else {
                                 // No face detected - update temporal smoothing
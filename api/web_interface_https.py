@@ -9,13 +9,21 @@ import base64
 import numpy as np
 from PIL import Image
 import io
+import time
 
 # Import face recognition components
 from face_recognition.encoder import ArcFaceEncoder
+from face_recognition import model_registry, inference_scheduler
 from face_recognition.database import FaceDatabase
 from face_recognition.matcher import FaceMatcher
-from face_recognition.config import FLASK_SECRET_KEY, COSINE_SIMILARITY_THRESHOLD, ENABLE_GAP_VALIDATION
+from face_recognition.cascade import CascadeMatcher
+from face_recognition.adaptive_detection import FaceScaleTracker
+from face_recognition.config import (
+    FLASK_SECRET_KEY, COSINE_SIMILARITY_THRESHOLD, ENABLE_GAP_VALIDATION, UI_DET_SIZE,
+    RETINAFACE_CONFIDENCE_THRESHOLD
+)
 from face_recognition.quality_checker import user_message_for_reason, quality_check_strict
+from face_recognition.roster import RosterNotFoundError
 from api.register_helpers import (
     validate_register_request,
     api_response,
@@ -81,28 +89,58 @@ def check_rate_limit(ip_address: str, max_requests: int = 5, window_seconds: int
 # Initialize components
 encoder = None
 matcher = None
+cascade = None
 db = None
-face_detector = None  # Cache untuk face detector
+face_scales = FaceScaleTracker()  # Skala wajah frame terakhir per client (adaptive det_size)
 
 def init_components():
     """Initialize encoder, matcher, dan database."""
-    global encoder, matcher, db
+    global encoder, matcher, cascade, db
     if encoder is None:
         print("Initializing face recognition components...")
+        start = time.time()
         encoder = ArcFaceEncoder()
+        models_seconds = time.time() - start
         db = FaceDatabase()
         matcher = FaceMatcher(db)
-        print("Components initialized!")
+        cascade = CascadeMatcher(encoder, matcher)
+        print(f"Components initialized in {time.time() - start:.2f}s (models {models_seconds:.2f}s)")
+
+def detection_client_id() -> str:
+    """Identitas client untuk hint ukuran wajah: header X-Client-Id (kiosk / tab), fallback IP."""
+    return request.headers.get('X-Client-Id') or request.remote_addr or 'unknown'
 
-def get_face_detector():
-    """Get cached face detector instance."""
-    global face_detector
-    if face_detector is None:
-        from face_recognition.preprocessor import FacePreprocessor
-        print("Initializing face detector for detection endpoint...")
-        face_detector = FacePreprocessor()
-        print("Face detector initialized!")
-    return face_detector
+def qc_verdict(image_bgr: np.ndarray, faces: list) -> dict:
+    """
+    Verdict QC lightweight untuk frame register page (tanpa embedding).
+    
+    Returns:
+        Dict qc_pass, reason, user_message, severity, hint (+ details)
+    """
+    from face_recognition.quality_checker import (
+        QC_SEVERITY, QC_HINTS, quality_check_lightweight, user_message_for_reason
+    )
+    
+    if len(faces) == 0:
+        return {
+            'qc_pass': False,
+            'reason': 'no_face',
+            'user_message': 'Wajah tidak terdeteksi',
+            'severity': QC_SEVERITY.get('no_face', 'error'),
+            'hint': QC_HINTS.get('no_face', '')
+        }
+    
+    ok, reason, details, selected_face = quality_check_lightweight(image_bgr, faces)
+    
+    # Extract severity and hint from details
+    return {
+        'qc_pass': bool(ok),
+        'reason': 'ok' if ok else reason,
+        'user_message': 'Kualitas baik' if ok else user_message_for_reason(reason),
+        'severity': details.get('severity', 'info'),
+        'hint': details.get('hint', ''),
+        'details': details
+    }
 
 @app.route('/')
 def index():
@@ -114,9 +152,6 @@ def index():
 def detect_face():
     """Detect face in image (for visual feedback) - OPTIMIZED for speed."""
     try:
-        # Get cached detector (much faster than creating new instance)
-        detector = get_face_detector()
-        
         # Get image from request
         if 'image' not in request.files:
             return jsonify({
@@ -132,45 +167,38 @@ def detect_face():
         original_width = request.form.get('width', type=int) or image.width
         original_height = request.form.get('height', type=int) or image.height
         
-        # OPTIMIZATION: Resize image untuk detection lebih cepat
-        # Detection tidak perlu full resolution, cukup max 640px
-        max_size = 640
-        resized_width, resized_height = image.width, image.height
-        if image.width > max_size or image.height > max_size:
-            ratio = min(max_size / image.width, max_size / image.height)
-            resized_width = int(image.width * ratio)
-            resized_height = int(image.height * ratio)
-            image = image.resize((resized_width, resized_height), Image.Resampling.LANCZOS)
-        
         # Convert to numpy array (BGR for OpenCV)
         image_array = np.array(image.convert('RGB'))
         image_bgr = image_array[:, :, ::-1]  # RGB to BGR
         
-        # Use cached detector to detect face
-        face_data = detector.detect_face(image_bgr)
+        # Detector-only; detector sendiri me-resize ke input size (tanpa resize PIL terpisah),
+        # det_size adaptif dari ukuran wajah frame sebelumnya (maksimal UI_DET_SIZE)
+        client_id = detection_client_id()
+        faces = model_registry.detect_faces(image_bgr, det_size=UI_DET_SIZE,
+                                            face_scale_hint=face_scales.hint(client_id))
+        face_scales.update(client_id, image_bgr.shape, faces)
         
-        if face_data is None:
+        best_face = max(faces, key=lambda f: f.det_score) if faces else None
+        if best_face is None or best_face.det_score < RETINAFACE_CONFIDENCE_THRESHOLD:
             return jsonify({
                 'success': False,
                 'face': None
             })
         
-        # Scale bbox back to original size if resized
-        bbox = face_data['bbox'].copy()
-        if resized_width and resized_height and (resized_width != original_width or resized_height != original_height):
-            scale_x = original_width / resized_width
-            scale_y = original_height / resized_height
-            bbox[0] = int(bbox[0] * scale_x)
-            bbox[1] = int(bbox[1] * scale_y)
-            bbox[2] = int(bbox[2] * scale_x)
-            bbox[3] = int(bbox[3] * scale_y)
+        # Scale bbox back to original size if client sent a resized frame
+        bbox = best_face.bbox.astype(int)
+        if image.width != original_width or image.height != original_height:
+            scale_x = original_width / image.width
+            scale_y = original_height / image.height
+            bbox = np.array([bbox[0] * scale_x, bbox[1] * scale_y,
+                             bbox[2] * scale_x, bbox[3] * scale_y]).astype(int)
         
         # Return bbox in format [x1, y1, x2, y2]
         return jsonify({
             'success': True,
             'face': {
                 'bbox': bbox.tolist(),
-                'confidence': float(face_data['det_score'])
+                'confidence': float(best_face.det_score)
             }
         })
         
@@ -213,14 +241,23 @@ def recognize():
         
         threshold = request.args.get('threshold', type=float) or COSINE_SIMILARITY_THRESHOLD
         
+        # Roster (ruang / sesi ujian): query param, form field, atau JSON
+        roster_id = request.args.get('roster_id') or request.form.get('roster_id') or \
+                    (request.json.get('roster_id') if request.is_json else None)
+        
         # Check if this is auto-scan mode
         is_auto_scan = request.headers.get('X-Auto-Scan', 'false').lower() == 'true' or \
                        request.args.get('auto_scan', 'false').lower() == 'true'
         
-        # Generate embedding dengan QC RINGAN (real-time)
-        embedding, qc = encoder.encode_with_qc(image_bgr, mode="lightweight")
+        # Detection + QC RINGAN (real-time); recognition dijalankan oleh cascade.
+        # det_size adaptif dari ukuran wajah frame sebelumnya client ini
+        client_id = detection_client_id()
+        face, qc = encoder.detect_with_qc(image_bgr, mode="lightweight",
+                                          face_scale_hint=face_scales.hint(client_id))
+        if face is not None or qc.get("reason") == "no_face":
+            face_scales.update(client_id, image_bgr.shape, [face] if face is not None else [])
 
-        if embedding is None:
+        if face is None:
             # QC fail / no face / multiple faces / blur / too small
             reason = (qc or {}).get("reason", "no_face")
             return jsonify({
@@ -234,7 +271,26 @@ def recognize():
         # Match dengan database
         # Untuk auto-scan, tidak require gap (voting mechanism handle konsistensi)
         require_gap = not is_auto_scan
-        matches = matcher.match(embedding, threshold=threshold, require_gap=require_gap)
+        try:
+            # Cascade: embedding model utama hanya jika screen model cepat ambigu
+            matches, cascade_info = cascade.match(image_bgr, face, threshold=threshold,
+                                                  require_gap=require_gap, roster_id=roster_id)
+        except RosterNotFoundError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'roster_id': roster_id
+            }), 404
+        
+        if cascade_info['embedding_failed']:
+            # Wajah lolos QC tetapi embedding gagal: respons QC seperti encode_with_qc
+            return jsonify({
+                'success': False,
+                'error': 'Quality check failed',
+                'reason': 'no_face',
+                'user_message': user_message_for_reason('no_face'),
+                'details': {'why': 'no_embedding'}
+            }), 200
         
         if not matches:
             return jsonify({
@@ -254,7 +310,9 @@ def recognize():
         # Validasi gap (hanya jika diaktifkan di config)
         # Threshold sudah cukup tinggi untuk mengurangi false positive
         # Voting mechanism sudah handle konsistensi untuk auto-scan
-        if ENABLE_GAP_VALIDATION and not is_auto_scan and len(matches) > 1:
+        # Tier 'fast': skor skala model cepat, gap sudah divalidasi cascade (CASCADE_MARGIN);
+        # tier gap di bawah di-tune untuk skala model utama
+        if ENABLE_GAP_VALIDATION and not is_auto_scan and len(matches) > 1 and cascade_info['tier'] == 'full':
             best_confidence = best_match['confidence']
             second_confidence = matches[1]['confidence']
             gap = best_confidence - second_confidence
@@ -287,7 +345,8 @@ def recognize():
         db.log_recognition(
             nim=best_match['nim'],
             confidence=adjusted_confidence,
-            status='success' if best_match['confidence'] >= threshold else 'low_confidence'
+            status='success' if best_match['confidence'] >= threshold else 'low_confidence',
+            tier=cascade_info['tier']
         )
         
         return jsonify({
@@ -299,6 +358,7 @@ def recognize():
                 'confidence_penalty': confidence_penalty,
                 'details': qc_details
             },
+            'tier': cascade_info['tier'],
             'matches': matches[:5]
         })
         
@@ -331,58 +391,79 @@ def check_qc():
         image_array = np.array(image.convert('RGB'))
         image_bgr = image_array[:, :, ::-1]  # RGB to BGR
         
-        # Get encoder instance
-        init_components()
+        # Detection only (detector dari registry, det_size kecil / adaptif); tidak perlu encoder/database
+        client_id = detection_client_id()
+        faces = model_registry.detect_faces(image_bgr, det_size=UI_DET_SIZE,
+                                            face_scale_hint=face_scales.hint(client_id))
+        face_scales.update(client_id, image_bgr.shape, faces)
         
-        # Detect faces
-        faces = encoder.detect_faces(image_bgr)
+        return jsonify({'success': True, **qc_verdict(image_bgr, faces)})
         
-        if len(faces) == 0:
-            from face_recognition.quality_checker import QC_SEVERITY, QC_HINTS
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'qc_pass': False,
+            'reason': 'error',
+            'user_message': str(e)
+        }), 500
+
+@app.route('/api/frame-analyze', methods=['POST'])
+def frame_analyze():
+    """
+    Analisis satu frame register page: bbox + confidence (untuk overlay / liveness)
+    dan verdict QC lightweight, dari satu decode dan satu detection.
+    Menggantikan pasangan /detect-face + /api/check-qc per frame.
+    """
+    try:
+        if 'image' not in request.files:
             return jsonify({
-                'success': True,
+                'success': False,
+                'face': None,
                 'qc_pass': False,
-                'reason': 'no_face',
-                'user_message': 'Wajah tidak terdeteksi',
-                'severity': QC_SEVERITY.get('no_face', 'error'),
-                'hint': QC_HINTS.get('no_face', '')
-            })
+                'reason': 'no_image',
+                'user_message': 'Tidak ada gambar yang dikirim'
+            }), 400
         
-        # Run QC lightweight check
-        from face_recognition.quality_checker import quality_check_lightweight, user_message_for_reason
+        file = request.files['image']
+        image = Image.open(io.BytesIO(file.read()))
         
-        ok, reason, details, selected_face = quality_check_lightweight(image_bgr, faces)
+        # Dimensi asli video (jika client mengirim frame yang sudah di-resize)
+        original_width = request.form.get('width', type=int) or image.width
+        original_height = request.form.get('height', type=int) or image.height
         
-        # Extract severity and hint from details
-        severity = details.get('severity', 'info')
-        hint = details.get('hint', '')
+        image_array = np.array(image.convert('RGB'))
+        image_bgr = image_array[:, :, ::-1]  # RGB to BGR
         
-        if ok:
-            return jsonify({
-                'success': True,
-                'qc_pass': True,
-                'reason': 'ok',
-                'user_message': 'Kualitas baik',
-                'severity': severity,
-                'hint': hint,
-                'details': details
-            })
-        else:
-            return jsonify({
-                'success': True,
-                'qc_pass': False,
-                'reason': reason,
-                'user_message': user_message_for_reason(reason),
-                'severity': severity,
-                'hint': hint,
-                'details': details
-            })
+        client_id = detection_client_id()
+        faces = model_registry.detect_faces(image_bgr, det_size=UI_DET_SIZE,
+                                            face_scale_hint=face_scales.hint(client_id))
+        face_scales.update(client_id, image_bgr.shape, faces)
+        
+        face = None
+        if faces:
+            best_face = max(faces, key=lambda f: f.det_score)
+            if best_face.det_score >= RETINAFACE_CONFIDENCE_THRESHOLD:
+                bbox = best_face.bbox.astype(int)
+                if image.width != original_width or image.height != original_height:
+                    scale_x = original_width / image.width
+                    scale_y = original_height / image.height
+                    bbox = np.array([bbox[0] * scale_x, bbox[1] * scale_y,
+                                     bbox[2] * scale_x, bbox[3] * scale_y]).astype(int)
+                face = {
+                    'bbox': bbox.tolist(),
+                    'confidence': float(best_face.det_score)
+                }
+        
+        return jsonify({'success': True, 'face': face, **qc_verdict(image_bgr, faces)})
         
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({
             'success': False,
+            'face': None,
             'qc_pass': False,
             'reason': 'error',
             'user_message': str(e)
@@ -499,8 +580,8 @@ def register():
         # Save photo to disk
         photo_path = save_register_photo(nim, file)
         
-        # Initialize encoder and load image
-        encoder_instance = ArcFaceEncoder()
+        # Encoder global (model dari registry, tidak di-load ulang per request)
+        encoder_instance = encoder
         image_bgr = encoder_instance.load_image(str(photo_path))
         if image_bgr is None:
             cleanup_photo(photo_path)
@@ -535,14 +616,15 @@ def register():
                 details=details
             ), 400
         
-        # Generate embedding
-        embedding = selected_face.normed_embedding
+        # Generate embedding (recognition hanya untuk wajah yang lolos QC)
+        embedding = encoder_instance.embed_face(image_bgr, selected_face)
         if embedding is None:
             cleanup_photo(photo_path)
             return api_response(False, "Gagal generate embedding"), 500
         
-        # Save to database
-        success = db.save_embedding(nim, embedding, str(photo_path))
+        # Save to database (+ embedding model cascade cepat jika aktif)
+        success = db.save_embedding(nim, embedding, str(photo_path),
+                                    embedding_fast=encoder_instance.embed_face_fast(image_bgr, selected_face))
         
         if success:
             # Log registration success
@@ -634,7 +716,11 @@ def status():
         return jsonify({
             'success': True,
             'status': 'ready',
-            'stats': stats
+            'stats': stats,
+            'models': model_registry.stats(),
+            'inference_batching': inference_scheduler.stats(),
+            'cascade': cascade.stats(),
+            'adaptive_detection': {**model_registry.detection_stats(), **face_scales.stats()}
         })
     except Exception as e:
         return jsonify({
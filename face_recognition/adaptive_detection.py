@@ -0,0 +1,93 @@
+"""
+Adaptive detection input size per client (frame real-time: kiosk, webcam register page).
+
+Frame berurutan dari client yang sama punya ukuran wajah yang hampir sama. FaceScaleTracker
+menyimpan skala wajah terbaik di frame terakhir per client; request berikutnya mengirimnya
+sebagai face_scale_hint ke model_registry.detect_faces, yang memilih input size detector
+terkecil yang masih cukup (close-up kiosk: 256 / 320, wajah kecil / jauh: 640).
+Request tanpa hint (foto enrollment, batch encoder) tetap di det_size penuh.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from face_recognition.config import ADAPTIVE_DET_CLIENT_TTL, ADAPTIVE_DET_MAX_CLIENTS
+
+
+def face_scale(bbox: Any, image_shape: Sequence[int]) -> float:
+    """
+    Sisi wajah (akar luas bbox) relatif terhadap sisi terpanjang image. Detector me-resize
+    sisi terpanjang ke input size, jadi sisi wajah di input detector = face_scale * size,
+    tidak tergantung resolusi frame yang dikirim client.
+
+    Args:
+        bbox: [x1, y1, x2, y2]
+        image_shape: Shape image (H, W[, C])
+
+    Returns:
+        Skala wajah (0..1)
+    """
+    h, w = image_shape[:2]
+    area = max(0.0, float(bbox[2]) - float(bbox[0])) * max(0.0, float(bbox[3]) - float(bbox[1]))
+    return area ** 0.5 / max(1, h, w)
+
+
+class FaceScaleTracker:
+    """Skala wajah frame terakhir per client (LRU, TTL) untuk face_scale_hint."""
+
+    def __init__(self, ttl: float = ADAPTIVE_DET_CLIENT_TTL, max_clients: int = ADAPTIVE_DET_MAX_CLIENTS):
+        """
+        Initialize tracker.
+
+        Args:
+            ttl: Umur maksimum hint (detik)
+            max_clients: Jumlah client maksimum; yang paling lama tidak aktif dibuang
+        """
+        self.ttl = ttl
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._scales: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()  # client -> (scale, time)
+        self._hits = 0
+        self._misses = 0
+
+    def hint(self, client_id: Hashable) -> Optional[float]:
+        """Skala wajah frame sebelumnya client ini, atau None (belum ada / basi -> det_size penuh)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._scales.get(client_id)
+            if entry is None or now - entry[1] > self.ttl:
+                self._misses += 1
+                return None
+            self._hits += 1
+            return entry[0]
+
+    def update(self, client_id: Hashable, image_shape: Sequence[int], faces: List[Any]):
+        """
+        Simpan skala wajah terbaik (det_score tertinggi) frame ini; tanpa wajah -> hint dihapus.
+
+        Args:
+            client_id: Identitas client (mis. header X-Client-Id atau IP)
+            image_shape: Shape image tempat faces dideteksi
+            faces: Hasil detect_faces
+        """
+        with self._lock:
+            if not faces:
+                self._scales.pop(client_id, None)
+                return
+            best = max(faces, key=lambda f: f.det_score)
+            self._scales[client_id] = (face_scale(best.bbox, image_shape), time.monotonic())
+            self._scales.move_to_end(client_id)
+            while len(self._scales) > self.max_clients:
+                self._scales.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Jumlah client yang dilacak dan hit rate hint."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'clients': len(self._scales),
+                'hint_hits': self._hits,
+                'hint_misses': self._misses,
+                'hint_hit_rate': self._hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,320 @@
+"""
+Approximate nearest-neighbour (ANN) index untuk FaceMatcher.
+IVF-flat: embeddings dikelompokkan ke nlist cluster (spherical k-means),
+query hanya di-scan ke nprobe cluster terdekat, lalu shortlist di-rerank exact di gallery.
+"""
+import os
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Optional, List
+
+from face_recognition.config import (
+    ANN_IVF_NLIST, ANN_IVF_NPROBE, ANN_IVF_TRAIN_ITERATIONS, ARCFACE_EMBEDDING_SIZE
+)
+from face_recognition.gallery import EmbeddingGallery
+
+
+INDEX_FORMAT_VERSION = 1
+
+
+def _spherical_kmeans(data: np.ndarray, k: int, iterations: int, seed: int = 0,
+                      chunk_size: int = 65536) -> np.ndarray:
+    """
+    Spherical k-means (cosine) untuk embeddings yang sudah L2-normalized.
+
+    Args:
+        data: Matrix (N x D) float32, L2-normalized
+        k: Jumlah cluster
+        iterations: Jumlah iterasi Lloyd
+        seed: Random seed
+
+    Returns:
+        Centroids (k x D) float32, L2-normalized
+    """
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = _nearest_centroid(data, centroids, chunk_size)
+
+        # Jumlahkan anggota per cluster (sort + reduceat, jauh lebih cepat dari np.add.at)
+        order = np.argsort(assign, kind="stable")
+        starts = np.searchsorted(assign[order], np.arange(k))
+        nonempty = np.bincount(assign, minlength=k) > 0
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(data[order], starts[nonempty], axis=0)
+        norms = np.linalg.norm(sums, axis=1)
+
+        # Cluster kosong: re-seed dengan titik random
+        empty = norms == 0
+        if empty.any():
+            sums[empty] = data[rng.choice(len(data), size=int(empty.sum()), replace=False)]
+            norms[empty] = 1.0
+        centroids = (sums / norms[:, None]).astype(np.float32)
+
+    return centroids
+
+
+def _nearest_centroid(data: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    """Assign setiap row ke centroid dengan cosine similarity tertinggi (chunked)."""
+    assign = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), chunk_size):
+        block = data[start:start + chunk_size]
+        assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+class IVFFlatIndex:
+    """
+    IVF-flat index di atas EmbeddingGallery.
+
+    Index hanya menyimpan centroid + assignment row -> cluster; vector tetap di gallery,
+    sehingga rerank shortlist memakai embedding float32 yang sama dengan exact search.
+    nprobe adalah knob recall vs latency (nprobe = nlist berarti exact).
+    """
+
+    kind = "ivf"
+
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = ANN_IVF_NPROBE,
+                 dim: int = ARCFACE_EMBEDDING_SIZE):
+        """Initialize index kosong (belum di-train)."""
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.dim = dim
+        self.centroids: Optional[np.ndarray] = None
+        self.gallery: Optional[EmbeddingGallery] = None
+        self._assign = np.full(0, -1, dtype=np.int32)  # row -> cluster (-1 = kosong)
+        self._lists: List[np.ndarray] = []
+        self._dirty = set()
+        self._lock = threading.RLock()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, gallery: EmbeddingGallery, iterations: int = ANN_IVF_TRAIN_ITERATIONS,
+              max_train_size: Optional[int] = None, seed: int = 0):
+        """
+        Train centroid dari embeddings di gallery.
+
+        Args:
+            gallery: Gallery sumber embeddings
+            iterations: Iterasi k-means
+            max_train_size: Batas jumlah sample untuk training (default 256 per cluster)
+            seed: Random seed
+        """
+        rows = np.array([row for row, nim in enumerate(gallery.nims) if nim is not None], dtype=np.int64)
+        if len(rows) == 0:
+            raise ValueError("Gallery kosong, tidak bisa train ANN index")
+
+        nlist = self.nlist or int(4 * np.sqrt(len(rows)))
+        nlist = max(1, min(nlist, len(rows)))
+        max_train_size = max_train_size or nlist * 256
+
+        rng = np.random.default_rng(seed)
+        if len(rows) > max_train_size:
+            rows = rng.choice(rows, size=max_train_size, replace=False)
+        data = np.ascontiguousarray(gallery.matrix[rows])
+
+        with self._lock:
+            self.nlist = nlist
+            self.centroids = _spherical_kmeans(data, nlist, iterations, seed=seed)
+
+    def attach(self, gallery: EmbeddingGallery, known_assign: Optional[dict] = None):
+        """
+        Assign semua row gallery ke cluster dan daftar sebagai listener untuk update incremental.
+
+        Args:
+            gallery: Gallery yang di-index
+            known_assign: Optional {nim: cluster} dari file index (skip hitung ulang)
+        """
+        if not self.is_trained:
+            raise RuntimeError("ANN index belum di-train")
+
+        # Urutan lock: gallery dulu baru index (sama dengan urutan saat gallery memanggil listener)
+        with gallery.lock, self._lock:
+            if self.gallery is not None:
+                self.gallery.remove_listener(self)
+
+            nims = gallery.nims
+            assign = np.full(len(nims), -1, dtype=np.int32)
+            pending = []
+            for row, nim in enumerate(nims):
+                if nim is None:
+                    continue
+                cluster = known_assign.get(nim) if known_assign else None
+                if cluster is None or cluster >= self.nlist:
+                    pending.append(row)
+                else:
+                    assign[row] = cluster
+            if pending:
+                pending = np.array(pending, dtype=np.int64)
+                assign[pending] = _nearest_centroid(gallery.matrix[pending], self.centroids)
+
+            self._assign = assign
+            self._lists = [np.flatnonzero(assign == c) for c in range(self.nlist)]
+            self._dirty = set()
+            self.gallery = gallery
+            gallery.add_listener(self)
+
+    def build(self, gallery: EmbeddingGallery, **train_kwargs) -> "IVFFlatIndex":
+        """Train + attach sekaligus."""
+        self.train(gallery, **train_kwargs)
+        self.attach(gallery)
+        return self
+
+    def on_upsert(self, row: int, normed_embedding: np.ndarray):
+        """Listener gallery: assign row baru / berubah ke cluster terdekat."""
+        with self._lock:
+            if row >= len(self._assign):
+                grown = np.full(max(row + 1, len(self._assign) * 2), -1, dtype=np.int32)
+                grown[:len(self._assign)] = self._assign
+                self._assign = grown
+            cluster = int(np.argmax(self.centroids @ normed_embedding))
+            old = int(self._assign[row])
+            if old == cluster:
+                return
+            if old >= 0:
+                self._dirty.add(old)
+            self._assign[row] = cluster
+            self._dirty.add(cluster)
+
+    def on_remove(self, row: int):
+        """Listener gallery: keluarkan row dari cluster-nya."""
+        with self._lock:
+            if row < len(self._assign) and self._assign[row] >= 0:
+                self._dirty.add(int(self._assign[row]))
+                self._assign[row] = -1
+
+    def _flush(self):
+        """Rebuild inverted list yang berubah sejak search terakhir."""
+        for cluster in self._dirty:
+            self._lists[cluster] = np.flatnonzero(self._assign == cluster)
+        self._dirty = set()
+
+    def candidates(self, query_embedding: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """
+        Shortlist row gallery dari nprobe cluster terdekat.
+
+        Args:
+            query_embedding: Query embedding vector
+            nprobe: Override jumlah cluster yang di-scan (recall vs latency)
+
+        Returns:
+            Array nomor row kandidat
+        """
+        query_normed = EmbeddingGallery.normalize(query_embedding)
+        if query_normed is None:
+            return np.empty(0, dtype=np.int64)
+
+        with self._lock:
+            if self._dirty:
+                self._flush()
+            nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+            centroid_scores = self.centroids @ query_normed
+            if nprobe < self.nlist:
+                probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+            else:
+                probe = np.arange(self.nlist)
+            return np.concatenate([self._lists[c] for c in probe])
+
+    def save(self, path: Path):
+        """
+        Persist index ke disk (npz): centroid + assignment per NIM.
+        Ditulis ke file sementara lalu di-rename supaya atomic.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            nims = self.gallery.nims if self.gallery is not None else []
+            rows = [row for row, nim in enumerate(nims) if nim is not None and self._assign[row] >= 0]
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    format_version=np.int32(INDEX_FORMAT_VERSION),
+                    kind=np.array(self.kind),
+                    nlist=np.int32(self.nlist),
+                    nprobe=np.int32(self.nprobe),
+                    centroids=self.centroids,
+                    nims=np.array([nims[row] for row in rows], dtype=str),
+                    assign=self._assign[rows] if rows else np.empty(0, dtype=np.int32),
+                )
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path, gallery: Optional[EmbeddingGallery] = None,
+             nprobe: Optional[int] = None, nlist: Optional[int] = None) -> "IVFFlatIndex":
+        """
+        Load index dari disk. Jika gallery diberikan, langsung di-attach
+        (NIM yang belum ada di file akan di-assign ke cluster terdekat).
+
+        Raises:
+            ValueError: Format / jenis index berbeda, atau nlist file != nlist (jika diisi)
+        """
+        with np.load(Path(path), allow_pickle=False) as data:
+            if int(data["format_version"]) != INDEX_FORMAT_VERSION:
+                raise ValueError(f"Format ANN index tidak didukung: {int(data['format_version'])}")
+            if str(data["kind"]) != cls.kind:
+                raise ValueError(f"Jenis ANN index di file '{data['kind']}', bukan '{cls.kind}'")
+            if nlist is not None and int(data["nlist"]) != nlist:
+                raise ValueError(f"nlist ANN index di file {int(data['nlist'])}, konfigurasi {nlist}")
+            index = cls(nlist=int(data["nlist"]), nprobe=nprobe or int(data["nprobe"]),
+                        dim=int(data["centroids"].shape[1]))
+            index.centroids = data["centroids"].astype(np.float32)
+            known_assign = dict(zip(data["nims"].tolist(), data["assign"].tolist()))
+
+        if gallery is not None:
+            index.attach(gallery, known_assign=known_assign)
+        return index
+
+
+def create_ann_index(kind: str, **kwargs):
+    """
+    Factory ANN index berdasarkan nama.
+
+    Args:
+        kind: Jenis index ('ivf')
+
+    Returns:
+        Instance index (belum di-train)
+    """
+    if kind == "ivf":
+        return IVFFlatIndex(nlist=kwargs.get("nlist", ANN_IVF_NLIST), nprobe=kwargs.get("nprobe", ANN_IVF_NPROBE))
+    raise ValueError(f"ANN index tidak dikenal: {kind}")
+
+
+def load_or_build_ann_index(kind: str, gallery: EmbeddingGallery, path: Optional[Path] = None):
+    """
+    Load index dari disk jika ada dan cocok (jenis index dan nlist konfigurasi),
+    kalau tidak build baru lalu simpan.
+
+    Args:
+        kind: Jenis index ('ivf')
+        gallery: Gallery yang di-index
+        path: Lokasi file index
+
+    Returns:
+        Index yang sudah attach ke gallery
+    """
+    index_cls = {IVFFlatIndex.kind: IVFFlatIndex}.get(kind)
+    if index_cls is None:
+        raise ValueError(f"ANN index tidak dikenal: {kind}")
+
+    if path is not None and Path(path).exists():
+        try:
+            # nlist eksplisit di config harus sama dengan file (train membatasi nlist <= jumlah embeddings)
+            nlist = max(1, min(ANN_IVF_NLIST, len(gallery))) if ANN_IVF_NLIST else None
+            index = index_cls.load(path, gallery, nprobe=ANN_IVF_NPROBE, nlist=nlist)
+            print(f"ANN index loaded dari {path} (nlist={index.nlist}, nprobe={index.nprobe})")
+            return index
+        except Exception as e:
+            print(f"Warning: gagal load ANN index {path}, rebuild: {str(e)}")
+
+    index = create_ann_index(kind)
+    index.build(gallery)
+    print(f"ANN index built (nlist={index.nlist}, nprobe={index.nprobe}, size={len(gallery)})")
+    if path is not None:
+        index.save(path)
+    return index
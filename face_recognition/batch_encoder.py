@@ -1,30 +1,73 @@
 """
 Batch Encoder untuk process semua foto dan generate embeddings
 Support: sample mode, custom file list, resume capability
+
+Pipeline:
+    decode (prefetch, PREFETCH_DECODE_WORKERS thread, queue PREFETCH_QUEUE_SIZE)
+    -> per batch BATCH_SIZE foto: detect -> QC -> align (paralel di MAX_WORKERS thread)
+    -> recognition batched (satu forward pass untuk semua crop yang lolos QC)
+    -> write ke database (upsert bulk, satu transaksi per DB_WRITE_BATCH_SIZE NIM)
 """
 import os
 import sys
+import time
 import random
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple, Dict
 from tqdm import tqdm
 import argparse
 import numpy as np
 
-from face_recognition.config import PHOTOS_DIR, SUPPORTED_FORMATS
+from face_recognition.config import (
+    PHOTOS_DIR, SUPPORTED_FORMATS, BATCH_SIZE, MAX_WORKERS, PREFETCH_DECODE_WORKERS, PREFETCH_QUEUE_SIZE,
+    DB_WRITE_BATCH_SIZE
+)
+from face_recognition import prefetch, manifest
 from face_recognition.encoder import ArcFaceEncoder
+from face_recognition import model_registry
 from face_recognition.database import FaceDatabase
 from face_recognition.quality_checker import quality_check_strict, user_message_for_reason
 
 
+STAGES = ('decode', 'detect', 'qc', 'align', 'recognize', 'write')
+
+
 class BatchEncoder:
     """Batch encoder untuk process multiple photos."""
     
-    def __init__(self):
-        """Initialize encoder dan database."""
+    def __init__(self, batch_size: int = BATCH_SIZE, threads: int = MAX_WORKERS, processes: int = 1,
+                 decoders: int = PREFETCH_DECODE_WORKERS, write_batch_size: int = DB_WRITE_BATCH_SIZE):
+        """
+        Initialize encoder dan database.
+        
+        Args:
+            batch_size: Jumlah foto per batch (crop per forward pass recognition + per transaksi DB)
+            threads: Jumlah thread untuk detect / QC / align
+            processes: Jumlah worker process; > 1 = model + koneksi DB dibuat di tiap worker, bukan di sini
+            decoders: Jumlah thread prefetch decode
+            write_batch_size: Jumlah NIM per transaksi upsert ke database
+        """
+        self.batch_size = max(1, batch_size)
+        self.threads = max(1, threads)
+        self.processes = max(1, processes)
+        self.decoders = max(1, decoders)
+        self.write_batch_size = max(1, write_batch_size)
+        self._pending_writes: List[Tuple[str, np.ndarray, str, Optional[np.ndarray]]] = []
+        self._pending_manifest: List[Tuple] = []  # Row manifest foto QC failed
+        self._params_hash = manifest.params_hash()
+        self.encoder = None
+        self.db = None
+        if self.processes > 1:
+            print(f"Multiprocess mode: {self.processes} workers, model di-load di setiap worker")
+            return
         print("Initializing ArcFace encoder...")
-        self.encoder = ArcFaceEncoder()
+        self.encoder = ArcFaceEncoder(batching=False)  # Model dari registry process-wide
         self.db = FaceDatabase()
+        for name, info in model_registry.stats().items():
+            print(f"  {name}: {info['file']}, load {info['load_seconds']}s "
+                  f"(optimized cache {info['optimized_cache']}), RSS +{info['rss_delta_mb']} MB")
         print("Initialization complete!")
     
     def extract_nim_from_filename(self, filename: str) -> str:
@@ -59,7 +102,7 @@ class BatchEncoder:
     
     def process_file(self, photo_path: Path, force: bool = False) -> tuple:
         """
-        Process single photo file.
+        Process single photo file (pipeline yang sama dengan process_files, batch berisi satu foto).
         
         Args:
             photo_path: Path ke photo file
@@ -68,47 +111,145 @@ class BatchEncoder:
         Returns:
             (success: bool, nim: str, error: str or None)
         """
+        nim = self.extract_nim_from_filename(photo_path.name)
+        stats = self._new_stats(1)
+        if not self._filter_existing([photo_path], force, stats):
+            return (True, nim, "Already processed (use --force to regenerate)")
+        
+        image_bgr = self.encoder.load_image(str(photo_path))
+        if image_bgr is None:
+            return (False, nim, "Gagal load image")
+        
+        nim, photo_path, aligned, error, _ = self._prepare(photo_path, image_bgr)
+        if error is not None:
+            self._record_failure(stats, nim, photo_path, error)
+        else:
+            self._embed_and_save([(nim, photo_path, aligned)], stats)
+        self._flush_writes(stats)
+        self.db.save_manifest(self._pending_manifest)
+        self._pending_manifest = []
+        
+        errors = stats['qc_errors'] + stats['errors']
+        return (False, nim, errors[0]['error']) if errors else (True, nim, None)
+    
+    def _prepare(self, photo_path: Path, image_bgr: np.ndarray
+                 ) -> Tuple[str, Path, Optional[np.ndarray], Optional[str], Dict[str, float]]:
+        """
+        Stage model per foto (image sudah di-decode prefetcher): detect -> QC ketat -> align.
+        Dijalankan di thread pool (ONNX Runtime melepas GIL).
+        
+        Returns:
+            (nim, photo_path, aligned crop atau None, error atau None, detik per stage)
+        """
+        nim = self.extract_nim_from_filename(photo_path.name)
+        timings = {}
         try:
-            # Extract NIM dari filename
-            nim = self.extract_nim_from_filename(photo_path.name)
-            
-            # Check if already exists in database
-            if not force:
-                existing = self.db.get_embedding(nim)
-                if existing is not None:
-                    return (True, nim, "Already processed (use --force to regenerate)")
-            
-            # Load image + detect faces (sekali), lalu QC ketat sebelum simpan ke DB
-            image_bgr = self.encoder.load_image(str(photo_path))
-            if image_bgr is None:
-                return (False, nim, "Gagal load image")
-
+            start = time.perf_counter()
             faces = self.encoder.detect_faces(image_bgr)
+            timings['detect'] = time.perf_counter() - start
+
+            start = time.perf_counter()
             ok, reason, details, selected_face = quality_check_strict(image_bgr, faces)
+            timings['qc'] = time.perf_counter() - start
             if not ok or selected_face is None:
                 msg = user_message_for_reason(reason)
-                return (False, nim, f"QC failed: {reason} - {msg} - {details}")
+                return (nim, photo_path, None, f"QC failed: {reason} - {msg} - {details}", timings)
 
-            embedding = selected_face.normed_embedding
-            if embedding is None:
-                return (False, nim, "Gagal generate embedding (no embedding)")
-            embedding = np.array(embedding, dtype=np.float32)
-            
-            # Save to database (will overwrite if exists)
-            success = self.db.save_embedding(nim, embedding, str(photo_path))
-            
-            if success:
-                return (True, nim, None)
-            else:
-                return (False, nim, "Gagal save ke database")
-                
+            # Recognition hanya untuk wajah yang lolos QC
+            start = time.perf_counter()
+            aligned = self.encoder.align_face(image_bgr, selected_face)
+            timings['align'] = time.perf_counter() - start
+            return (nim, photo_path, aligned, None, timings)
         except Exception as e:
+            return (nim, photo_path, None, str(e), timings)
+    
+    def _record_failure(self, stats: dict, nim: str, photo_path: Path, error: str):
+        """Catat kegagalan (QC failure dipisah untuk debugging kualitas dataset)."""
+        entry = {'nim': nim, 'file': str(photo_path), 'error': error}
+        if isinstance(error, str) and error.startswith("QC failed:"):
+            stats['qc_failed'] += 1
+            stats['qc_errors'].append(entry)
+            # Foto + parameter QC sama akan gagal lagi: catat supaya run berikutnya tidak mengulang
+            try:
+                self._pending_manifest.append(
+                    manifest.build_entry(nim, photo_path, manifest.STATUS_QC_FAILED,
+                                         current_params_hash=self._params_hash))
+            except OSError:
+                pass
+        else:
+            stats['failed'] += 1
+            stats['errors'].append(entry)
+    
+    def _filter_existing(self, photo_files: List[Path], force: bool, stats: dict) -> List[Path]:
+        """
+        Pilih foto yang perlu di-encode (kecuali force): dibandingkan dengan encoding_manifest,
+        hanya foto baru, foto yang isinya berubah, atau yang di-encode dengan model / parameter QC lain.
+        Dengan cascade aktif, NIM yang belum punya embedding_fast juga di-encode ulang (backfill).
+        NIM dan manifest diambil dengan satu query masing-masing.
+        """
+        if force:
+            return list(photo_files)
+        existing = self.db.get_existing_nims()
+        # Row yang disimpan saat cascade mati / embedding cepat gagal: embedding_fast NULL
+        missing_fast = self.db.get_nims_without_fast() if self.encoder.fast_rec_model is not None else set()
+        entries = self.db.get_manifest()
+        reasons = stats.setdefault('reencode_reasons', {})
+        todo, touched = [], []
+        for photo_path in photo_files:
             nim = self.extract_nim_from_filename(photo_path.name)
-            return (False, nim, str(e))
+            entry = entries.get(nim)
+            try:
+                if entry is None and nim in existing and nim not in missing_fast:
+                    # Embedding dari sebelum ada manifest: adopsi foto saat ini tanpa encode ulang
+                    touched.append(manifest.build_entry(nim, photo_path, manifest.STATUS_OK,
+                                                        current_params_hash=self._params_hash))
+                    stats['skipped'] += 1
+                    continue
+                decision, fingerprint = manifest.check_entry(entry, photo_path, self._params_hash)
+            except OSError:
+                decision, fingerprint = 'new', None  # File tidak terbaca: biar decoder yang mencatat error
+            
+            if decision in ('unchanged', 'touched') and entry['status'] == manifest.STATUS_OK and nim not in existing:
+                decision = 'missing'  # Embedding sudah dihapus dari database
+            elif decision in ('unchanged', 'touched') and entry['status'] == manifest.STATUS_OK and nim in missing_fast:
+                decision = 'missing_fast'
+            if decision in ('unchanged', 'touched'):
+                if decision == 'touched':
+                    touched.append(manifest.build_entry(nim, photo_path, entry['status'], fingerprint,
+                                                        current_params_hash=self._params_hash))
+                stats['skipped'] += 1  # Tidak berubah sejak encode terakhir
+                continue
+            reasons[decision] = reasons.get(decision, 0) + 1
+            todo.append(photo_path)
+        
+        if touched:
+            self.db.save_manifest(touched)
+        return todo
+    
+    def _new_stats(self, total: int) -> dict:
+        """Stats dict kosong untuk process_files / process_file."""
+        return {
+            'total': total,
+            'success': 0,
+            'failed': 0,
+            'skipped': 0,
+            'qc_failed': 0,
+            'qc_errors': [],
+            'errors': [],
+            'batch_size': self.batch_size,
+            'threads': self.threads,
+            'recognition_batches': 0,
+            'write_transactions': 0,
+            'reencode_reasons': {},
+            'stage_seconds': {stage: 0.0 for stage in STAGES},
+            'stage_items': {stage: 0 for stage in STAGES},
+            'prefetch': {}
+        }
     
     def process_files(self, photo_files: List[Path], desc: str = "Processing", force: bool = False) -> dict:
         """
-        Process multiple photo files.
+        Process multiple photo files per batch BATCH_SIZE.
+        Decode berjalan terus di thread prefetch; stage model mengambil image dari queue.
         
         Args:
             photo_files: List of photo file paths
@@ -116,54 +257,158 @@ class BatchEncoder:
             force: Jika True, regenerate embedding meskipun sudah ada di database
             
         Returns:
-            Statistics dict
+            Statistics dict (termasuk 'stage_seconds' / 'stage_items' per stage dan 'prefetch')
         """
-        stats = {
-            'total': len(photo_files),
-            'success': 0,
-            'failed': 0,
-            'skipped': 0,
-            'qc_failed': 0,
-            'qc_errors': [],
-            'errors': []
-        }
+        if self.processes > 1:
+            return self._process_files_parallel(photo_files, desc=desc, force=force)
         
-        with tqdm(total=len(photo_files), desc=desc) as pbar:
-            for photo_path in photo_files:
-                success, nim, error = self.process_file(photo_path, force=force)
-                
-                if success:
-                    if error is None or "Regenerated" in str(error):
-                        stats['success'] += 1
-                    else:
-                        stats['skipped'] += 1  # Already exists (and not forced)
-                else:
-                    # QC failure: treat separately for debugging dataset quality
-                    if isinstance(error, str) and error.startswith("QC failed:"):
-                        stats['qc_failed'] += 1
-                        stats['qc_errors'].append({
-                            'nim': nim,
-                            'file': str(photo_path),
-                            'error': error
-                        })
-                    else:
-                        stats['failed'] += 1
-                        stats['errors'].append({
-                            'nim': nim,
-                            'file': str(photo_path),
-                            'error': error
-                        })
+        stats = self._new_stats(len(photo_files))
+        start_time = time.perf_counter()
+        todo = self._filter_existing(photo_files, force, stats)
+        
+        with tqdm(total=len(photo_files), desc=desc) as pbar, \
+                ThreadPoolExecutor(max_workers=self.threads) as executor, \
+                prefetch.ImagePrefetcher(todo, self.encoder.load_image, decoders=self.decoders,
+                                         queue_size=max(PREFETCH_QUEUE_SIZE, self.batch_size)) as prefetcher:
+            pbar.update(stats['skipped'])
+            batch = []
+            for photo_path, image_bgr, decode_seconds, error in prefetcher:
+                stats['stage_seconds']['decode'] += decode_seconds
+                stats['stage_items']['decode'] += 1
+                if error is not None:
+                    self._record_failure(stats, self.extract_nim_from_filename(photo_path.name), photo_path, error)
+                    pbar.update(1)
+                    continue
                 
-                pbar.update(1)
-                pbar.set_postfix({
-                    'success': stats['success'],
-                    'failed': stats['failed'],
-                    'qc_failed': stats['qc_failed'],
-                    'skipped': stats['skipped']
-                })
+                batch.append((photo_path, image_bgr))
+                if len(batch) >= self.batch_size:
+                    self._process_batch(executor, batch, stats)
+                    pbar.update(len(batch))
+                    batch = []
+                    pbar.set_postfix({
+                        'success': stats['success'],
+                        'failed': stats['failed'],
+                        'qc_failed': stats['qc_failed'],
+                        'skipped': stats['skipped'],
+                        'queue': prefetcher.depth()
+                    })
+            if batch:
+                self._process_batch(executor, batch, stats)
+                pbar.update(len(batch))
+            self._flush_writes(stats)
+            self.db.save_manifest(self._pending_manifest)  # Sisa QC failed tanpa write di akhir
+            self._pending_manifest = []
+            stats['prefetch'] = prefetcher.stats()
+        
+        stats['elapsed_seconds'] = time.perf_counter() - start_time
+        return stats
+    
+    def _process_batch(self, executor: ThreadPoolExecutor, batch: List[Tuple[Path, np.ndarray]], stats: dict):
+        """Detect / QC / align paralel untuk satu batch image, lalu recognition + write."""
+        prepared = list(executor.map(lambda item: self._prepare(*item), batch))
+        
+        ready = []
+        for nim, photo_path, aligned, error, timings in prepared:
+            for stage, seconds in timings.items():
+                stats['stage_seconds'][stage] += seconds
+                stats['stage_items'][stage] += 1
+            if error is not None:
+                self._record_failure(stats, nim, photo_path, error)
+            else:
+                ready.append((nim, photo_path, aligned))
+        
+        if ready:
+            self._embed_and_save(ready, stats)
+    
+    def _process_files_parallel(self, photo_files: List[Path], desc: str, force: bool) -> dict:
+        """
+        Bagi file ke N worker process (shard interleaved supaya beban rata).
+        Setiap worker punya ONNX session sendiri dengan intra-op threads = cores / N,
+        lalu stats per worker digabung.
+        """
+        processes = min(self.processes, max(1, len(photo_files)))
+        intra_op_threads = max(1, (os.cpu_count() or 1) // processes)
+        threads = max(1, self.threads // processes)
+        decoders = max(1, self.decoders // processes)
+        shards = [photo_files[i::processes] for i in range(processes)]
+        print(f"Processing {len(photo_files)} files di {processes} worker "
+              f"({intra_op_threads} intra-op thread, {threads} prep thread, {decoders} decoder per worker)...")
+        
+        start_time = time.perf_counter()
+        results = []
+        # spawn: worker tidak mewarisi thread pool ONNX Runtime / koneksi DB dari parent
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+            futures = [
+                executor.submit(_encode_shard, shard, f"{desc} [worker {i + 1}/{processes}]", force,
+                                self.batch_size, threads, decoders, self.write_batch_size, intra_op_threads)
+                for i, shard in enumerate(shards)
+            ]
+            for future in as_completed(futures):
+                results.append(future.result())
         
+        stats = merge_stats(results)
+        stats['total'] = len(photo_files)
+        stats['processes'] = processes
+        stats['elapsed_seconds'] = time.perf_counter() - start_time
         return stats
     
+    def _embed_and_save(self, ready: List[Tuple[str, Path, np.ndarray]], stats: dict):
+        """Satu forward pass recognition untuk semua crop batch, lalu antrikan untuk upsert bulk."""
+        start = time.perf_counter()
+        try:
+            crops = [aligned for _, _, aligned in ready]
+            embeddings = self.encoder.embed_aligned_batch(crops)
+            # Cascade: embedding model cepat dari crop yang sama (kolom embedding_fast)
+            fast_embeddings = (self.encoder.embed_aligned_batch(crops, fast=True)
+                               if self.encoder.fast_rec_model is not None else [None] * len(ready))
+        except Exception as e:
+            for nim, photo_path, _ in ready:
+                self._record_failure(stats, nim, photo_path, f"Gagal generate embedding: {str(e)}")
+            return
+        stats['stage_seconds']['recognize'] += time.perf_counter() - start
+        stats['stage_items']['recognize'] += len(ready)
+        stats['recognition_batches'] += 1
+        
+        for (nim, photo_path, _), embedding, embedding_fast in zip(ready, embeddings, fast_embeddings):
+            if not np.any(embedding):
+                self._record_failure(stats, nim, photo_path, "Gagal generate embedding (no embedding)")
+            else:
+                if embedding_fast is not None and not np.any(embedding_fast):
+                    embedding_fast = None
+                self._pending_writes.append((nim, embedding, str(photo_path), embedding_fast))
+        
+        if len(self._pending_writes) >= self.write_batch_size:
+            self._flush_writes(stats)
+    
+    def _flush_writes(self, stats: dict):
+        """Upsert embedding yang menunggu dalam satu transaksi (execute_values)."""
+        items, self._pending_writes = self._pending_writes, []
+        if not items:
+            return
+        
+        start = time.perf_counter()
+        saved = self.db.save_embeddings_batch(items, transaction_size=len(items))
+        stats['stage_seconds']['write'] += time.perf_counter() - start
+        stats['stage_items']['write'] += len(items)
+        stats['write_transactions'] = stats.get('write_transactions', 0) + 1
+        
+        if saved:
+            stats['success'] += saved
+            for nim, _, photo_path, _ in items:
+                try:
+                    self._pending_manifest.append(
+                        manifest.build_entry(nim, Path(photo_path), manifest.STATUS_OK,
+                                             current_params_hash=self._params_hash))
+                except OSError:
+                    pass  # Foto hilang setelah di-encode: run berikutnya mencoba lagi
+        else:
+            for nim, _, photo_path, _ in items:
+                self._record_failure(stats, nim, Path(photo_path), "Gagal save ke database")
+        
+        entries, self._pending_manifest = self._pending_manifest, []
+        self.db.save_manifest(entries)
+    
     def process_sample(self, n: int = 100, force: bool = False) -> dict:
         """
         Process random sample of photos.
@@ -257,9 +502,11 @@ class BatchEncoder:
     def process_all(self, force: bool = False) -> dict:
         """
         Process semua foto dari photos directory.
+        Tanpa force: incremental, hanya foto yang berubah / baru / di-encode dengan model
+        atau parameter QC lain (lihat encoding_manifest).
         
         Args:
-            force: Jika True, regenerate embedding meskipun sudah ada di database
+            force: Jika True, regenerate embedding semua foto
             
         Returns:
             Statistics dict
@@ -283,6 +530,34 @@ class BatchEncoder:
         print(f"Failed         : {stats.get('failed', 0)}")
         print(f"QC Failed      : {stats.get('qc_failed', 0)}")
         print(f"Skipped        : {stats.get('skipped', 0)}")
+        if stats.get('reencode_reasons'):
+            reasons = ", ".join(f"{reason}: {count}" for reason, count in sorted(stats['reencode_reasons'].items()))
+            print(f"Encode karena  : {reasons}")
+        
+        if stats.get('stage_seconds'):
+            elapsed = stats.get('elapsed_seconds', 0.0)
+            processed = stats['total'] - stats.get('skipped', 0)
+            print(f"\nThroughput     : {processed / elapsed if elapsed > 0 else 0.0:.1f} foto/s "
+                  f"({elapsed:.1f} s, batch {stats['batch_size']}, {stats.get('processes', 1)} process x "
+                  f"{stats['threads']} thread, "
+                  f"{stats['recognition_batches']} forward pass recognition, "
+                  f"{stats.get('write_transactions', 0)} transaksi DB)")
+            print(f"{'stage':<12}{'items':>8}{'seconds':>10}{'items/s':>10}")
+            for stage in STAGES:
+                seconds = stats['stage_seconds'][stage]
+                items = stats['stage_items'][stage]
+                print(f"{stage:<12}{items:>8}{seconds:>10.2f}{items / seconds if seconds > 0 else 0.0:>10.1f}")
+            print("(decode..align: detik thread, dijalankan paralel; recognize / write: detik wall, "
+                  "dijumlah dari semua worker)")
+        
+        if stats.get('prefetch', {}).get('items'):
+            queue_stats = stats['prefetch']
+            summary = prefetch.summarize(queue_stats)
+            print(f"Prefetch queue : rata-rata {summary['mean_queue_depth']:.1f}/{queue_stats['queue_size']}, "
+                  f"kosong {summary['empty_fraction']:.0%} saat diambil, "
+                  f"model menunggu {queue_stats['consumer_wait_seconds']:.1f} s, "
+                  f"decoder menunggu {queue_stats['producer_blocked_seconds']:.1f} s "
+                  f"-> {'I/O-bound (tambah decoder)' if summary['bound'] == 'io' else 'compute-bound'}")
         
         if stats.get('qc_errors'):
             print(f"\nQC Failures ({len(stats['qc_errors'])}):")
@@ -300,6 +575,64 @@ class BatchEncoder:
         print("="*60)
 
 
+def _encode_shard(photo_files: List[Path], desc: str, force: bool, batch_size: int, threads: int,
+                  decoders: int, write_batch_size: int, intra_op_threads: int) -> dict:
+    """Entry point worker process: load model sendiri lalu process satu shard."""
+    model_registry.configure(intra_op_threads=intra_op_threads)
+    batch_encoder = BatchEncoder(batch_size=batch_size, threads=threads, decoders=decoders,
+                                 write_batch_size=write_batch_size)
+    try:
+        return batch_encoder.process_files(photo_files, desc=desc, force=force)
+    finally:
+        batch_encoder.db.close()
+
+
+def merge_stats(results: List[dict]) -> dict:
+    """
+    Gabungkan stats dict dari beberapa worker (format sama dengan process_files).
+    
+    Args:
+        results: List stats per worker
+        
+    Returns:
+        Statistics dict gabungan
+    """
+    merged = {
+        'total': 0,
+        'success': 0,
+        'failed': 0,
+        'skipped': 0,
+        'qc_failed': 0,
+        'qc_errors': [],
+        'errors': [],
+        'batch_size': results[0]['batch_size'] if results else BATCH_SIZE,
+        'threads': results[0]['threads'] if results else MAX_WORKERS,
+        'recognition_batches': 0,
+        'write_transactions': 0,
+        'reencode_reasons': {},
+        'stage_seconds': {stage: 0.0 for stage in STAGES},
+        'stage_items': {stage: 0 for stage in STAGES},
+        'prefetch': {}
+    }
+    for stats in results:
+        for key in ('total', 'success', 'failed', 'skipped', 'qc_failed', 'recognition_batches',
+                    'write_transactions'):
+            merged[key] += stats.get(key, 0)
+        merged['qc_errors'].extend(stats.get('qc_errors', []))
+        merged['errors'].extend(stats.get('errors', []))
+        for stage in STAGES:
+            merged['stage_seconds'][stage] += stats.get('stage_seconds', {}).get(stage, 0.0)
+            merged['stage_items'][stage] += stats.get('stage_items', {}).get(stage, 0)
+        for reason, count in stats.get('reencode_reasons', {}).items():
+            merged['reencode_reasons'][reason] = merged['reencode_reasons'].get(reason, 0) + count
+        for key, value in stats.get('prefetch', {}).items():
+            if key == 'queue_size':
+                merged['prefetch'][key] = value
+            else:
+                merged['prefetch'][key] = merged['prefetch'].get(key, 0) + value
+    return merged
+
+
 def main():
     """Entry point untuk batch encoder."""
     parser = argparse.ArgumentParser(description="Batch encoder untuk face recognition")
@@ -327,13 +660,44 @@ def main():
     parser.add_argument(
         "--force",
         action="store_true",
-        help="Force regenerate embeddings meskipun sudah ada di database"
+        help="Force regenerate semua embeddings (tanpa --force: hanya foto baru / berubah / model lain)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=BATCH_SIZE,
+        help=f"Foto per batch recognition / transaksi DB (default {BATCH_SIZE})"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=MAX_WORKERS,
+        help=f"Thread detect / QC / align (default {MAX_WORKERS}, dibagi rata ke worker)"
+    )
+    parser.add_argument(
+        "--decoders",
+        type=int,
+        default=PREFETCH_DECODE_WORKERS,
+        help=f"Thread prefetch decode (default {PREFETCH_DECODE_WORKERS}, dibagi rata ke worker)"
+    )
+    parser.add_argument(
+        "--write-batch-size",
+        type=int,
+        default=DB_WRITE_BATCH_SIZE,
+        help=f"NIM per transaksi upsert ke database (default {DB_WRITE_BATCH_SIZE})"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Jumlah worker process, masing-masing dengan model sendiri (default 1)"
     )
     
     args = parser.parse_args()
     
     # Initialize batch encoder
-    batch_encoder = BatchEncoder()
+    batch_encoder = BatchEncoder(batch_size=args.batch_size, threads=args.threads, processes=args.workers,
+                                 decoders=args.decoders, write_batch_size=args.write_batch_size)
     
     # Process based on arguments
     if args.nims:
@@ -364,7 +728,8 @@ def main():
     batch_encoder.print_stats(stats)
     
     # Close database
-    batch_encoder.db.close()
+    if batch_encoder.db is not None:
+        batch_encoder.db.close()
 
 
 if __name__ == "__main__":
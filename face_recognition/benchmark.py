@@ -0,0 +1,265 @@
+"""
+Benchmark inference pipeline (latency per image) untuk membandingkan konfigurasi model.
+"""
+import os
+import random
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from face_recognition.config import (
+    ARCFACE_MODEL_NAME, ARCFACE_DET_SIZE, UI_DET_SIZE, INFERENCE_PROVIDERS, PHOTOS_DIR, SUPPORTED_FORMATS
+)
+
+
+def load_benchmark_images(files: Optional[List[str]] = None, sample: int = 50, seed: int = 0) -> List[np.ndarray]:
+    """
+    Load image untuk benchmark: file tertentu, atau sample random dari PHOTOS_DIR.
+
+    Returns:
+        List image BGR
+    """
+    import cv2
+
+    if files:
+        paths = [Path(f) for f in files]
+    else:
+        paths = sorted(p for p in PHOTOS_DIR.iterdir() if p.suffix in SUPPORTED_FORMATS) if PHOTOS_DIR.exists() else []
+        random.Random(seed).shuffle(paths)
+        paths = paths[:sample]
+
+    images = []
+    for path in paths:
+        image = cv2.imread(str(path))
+        if image is not None:
+            images.append(image)
+    return images
+
+
+def _bbox_iou(a: np.ndarray, b: np.ndarray) -> float:
+    """IoU dua bbox [x1, y1, x2, y2]."""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return float(inter / union) if union > 0 else 0.0
+
+
+def time_per_image(fn: Callable[[np.ndarray], object], images: List[np.ndarray],
+                   warmup: int = 2) -> Dict:
+    """
+    Jalankan fn untuk setiap image dan ukur latency.
+
+    Returns:
+        {'results', 'latencies_ms', 'mean_ms', 'p50_ms', 'p95_ms'}
+    """
+    for image in images[:warmup]:
+        fn(image)
+
+    results, latencies = [], []
+    for image in images:
+        start = time.perf_counter()
+        results.append(fn(image))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies = np.array(latencies)
+    return {
+        'results': results,
+        'latencies_ms': latencies,
+        'mean_ms': float(latencies.mean()),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+    }
+
+
+def benchmark_detection(images: List[np.ndarray]) -> Dict[str, Dict]:
+    """
+    Bandingkan path lama (FaceAnalysis.get: detection + landmark + recognition, 640)
+    dengan detector-only di ARCFACE_DET_SIZE dan UI_DET_SIZE.
+
+    Returns:
+        {variant: {'mean_ms', 'p50_ms', 'p95_ms', 'detect_rate', 'mean_iou'}}
+    """
+    from insightface.app import FaceAnalysis
+    from face_recognition import model_registry
+
+    full = FaceAnalysis(name=ARCFACE_MODEL_NAME, providers=INFERENCE_PROVIDERS)
+    full.prepare(ctx_id=-1, det_size=ARCFACE_DET_SIZE)
+
+    variants = {
+        f"full_get_{ARCFACE_DET_SIZE[0]}": full.get,
+        f"detector_{ARCFACE_DET_SIZE[0]}": lambda img: model_registry.detect_faces(img, det_size=ARCFACE_DET_SIZE),
+        f"detector_{UI_DET_SIZE[0]}": lambda img: model_registry.detect_faces(img, det_size=UI_DET_SIZE),
+    }
+
+    report = {}
+    baseline = None
+    for name, fn in variants.items():
+        timing = time_per_image(fn, images)
+        best = [max(faces, key=lambda f: f.det_score) if faces else None for faces in timing['results']]
+        if baseline is None:
+            baseline = best
+
+        ious = [_bbox_iou(face.bbox, ref.bbox) for face, ref in zip(best, baseline)
+                if face is not None and ref is not None]
+        report[name] = {
+            'mean_ms': timing['mean_ms'],
+            'p50_ms': timing['p50_ms'],
+            'p95_ms': timing['p95_ms'],
+            'detect_rate': sum(face is not None for face in best) / max(1, len(best)),
+            'mean_iou': float(np.mean(ious)) if ious else 0.0,
+        }
+    return report
+
+
+def print_detection_report(report: Dict[str, Dict], num_images: int):
+    """Print tabel hasil benchmark_detection."""
+    print("\n" + "=" * 72)
+    print(f"DETECTION BENCHMARK ({num_images} images)")
+    print("=" * 72)
+    print(f"{'variant':<20}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'detect':>10}{'IoU*':>10}")
+    for name, row in report.items():
+        print(f"{name:<20}{row['mean_ms']:>10.1f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+              f"{row['detect_rate']:>10.2%}{row['mean_iou']:>10.3f}")
+    print("* IoU bbox wajah terbaik vs variant pertama (path FaceAnalysis.get lama)")
+    print("=" * 72)
+
+
+def _detect_and_embed(image: np.ndarray):
+    """Pipeline /recognize tanpa QC: detect -> recognition wajah terbaik."""
+    from face_recognition import model_registry
+
+    faces = model_registry.detect_faces(image)
+    if faces:
+        model_registry.get_recognizer().get(image, max(faces, key=lambda f: f.det_score))
+    return faces
+
+
+def measure_session_config(images: List[np.ndarray], options: Dict[str, Any], concurrency: int = 1) -> Dict:
+    """
+    Load ulang detector + recognizer dengan opsi session tertentu lalu ukur pipeline.
+
+    Args:
+        images: Image BGR
+        options: Opsi session (key model_registry.SESSION_DEFAULTS)
+        concurrency: Jumlah request bersamaan (thread) untuk mengukur throughput
+
+    Returns:
+        {'mean_ms', 'p50_ms', 'p95_ms', 'throughput', 'load_seconds'}
+    """
+    from face_recognition import model_registry
+
+    model_registry.reset()
+    model_registry.configure(**options)
+    start = time.perf_counter()
+    model_registry.get_detector()
+    model_registry.get_recognizer()
+    load_seconds = time.perf_counter() - start
+
+    timing = time_per_image(_detect_and_embed, images)
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            start = time.perf_counter()
+            list(executor.map(_detect_and_embed, images))
+            elapsed = time.perf_counter() - start
+        throughput = len(images) / elapsed if elapsed > 0 else 0.0
+    else:
+        throughput = 1000.0 / timing['mean_ms'] if timing['mean_ms'] > 0 else 0.0
+
+    return {
+        'mean_ms': timing['mean_ms'],
+        'p50_ms': timing['p50_ms'],
+        'p95_ms': timing['p95_ms'],
+        'throughput': throughput,
+        'load_seconds': load_seconds,
+    }
+
+
+def sweep_session_options(images: List[np.ndarray], concurrency: int = 1
+                          ) -> Tuple[Dict[str, Any], List[Tuple[Dict[str, Any], Dict]]]:
+    """
+    Sweep opsi session ONNX Runtime satu dimensi per langkah (greedy): setiap dimensi
+    dicoba dari konfigurasi terbaik sejauh ini, jadi ~15 kombinasi, bukan seluruh grid.
+    Skor = throughput (image/s) pada concurrency yang diminta.
+
+    Args:
+        images: Image BGR
+        concurrency: Request bersamaan per proses (mis. thread Flask per worker)
+
+    Returns:
+        (konfigurasi terbaik, list (konfigurasi, hasil) sesuai urutan dicoba)
+    """
+    from face_recognition import model_registry
+
+    cores = os.cpu_count() or 1
+    intra_candidates = sorted({n for n in (cores, cores // 2, cores // 4, max(1, cores // concurrency), 1) if n > 0},
+                              reverse=True)
+    dimensions = [
+        [{'intra_op_threads': n} for n in intra_candidates],
+        [{'graph_optimization': level} for level in ('all', 'extended', 'basic')],
+        [{'execution_mode': 'sequential', 'inter_op_threads': 0},
+         {'execution_mode': 'parallel', 'inter_op_threads': 2}],
+        [{'allow_spinning': True}, {'allow_spinning': False}],
+        [{'cpu_mem_arena': True, 'mem_pattern': True}, {'cpu_mem_arena': False},
+         {'mem_pattern': False}],
+    ]
+
+    original = model_registry.session_config()
+    results: List[Tuple[Dict[str, Any], Dict]] = []
+    tried: Dict[Tuple, Dict] = {}
+
+    def run(options: Dict[str, Any]) -> Dict:
+        key = tuple(sorted(options.items()))
+        if key not in tried:
+            tried[key] = measure_session_config(images, options, concurrency=concurrency)
+            results.append((dict(options), tried[key]))
+            print(f"  {format_session_options(options)}: {tried[key]['throughput']:.1f} img/s, "
+                  f"p50 {tried[key]['p50_ms']:.1f} ms")
+        return tried[key]
+
+    try:
+        best = dict(original)
+        best_result = run(best)
+        for variants in dimensions:
+            for overrides in variants:
+                candidate = {**best, **overrides}
+                result = run(candidate)
+                # Minimal 2% lebih cepat supaya noise pengukuran tidak mengganti konfigurasi
+                if result['throughput'] > best_result['throughput'] * 1.02:
+                    best, best_result = candidate, result
+    finally:
+        model_registry.reset()
+        model_registry.configure(**original)
+
+    return best, results
+
+
+def format_session_options(options: Dict[str, Any]) -> str:
+    """Ringkas: hanya opsi yang berbeda dari default ORT."""
+    from face_recognition.model_registry import SESSION_DEFAULTS
+
+    changed = {key: value for key, value in options.items() if value != SESSION_DEFAULTS[key]}
+    return ", ".join(f"{key}={value}" for key, value in changed.items()) or "default ORT"
+
+
+def print_session_sweep(best: Dict[str, Any], results: List[Tuple[Dict[str, Any], Dict]],
+                        num_images: int, concurrency: int):
+    """Print hasil sweep_session_options dan env var untuk konfigurasi terbaik."""
+    from face_recognition.model_registry import SESSION_DEFAULTS
+
+    print("\n" + "=" * 72)
+    print(f"ONNX RUNTIME SESSION SWEEP ({num_images} images, concurrency {concurrency}, {os.cpu_count()} cores)")
+    print("=" * 72)
+    print(f"{'img/s':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'load s':>8}  options")
+    for options, row in sorted(results, key=lambda item: -item[1]['throughput']):
+        print(f"{row['throughput']:>8.1f}{row['mean_ms']:>10.1f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+              f"{row['load_seconds']:>8.2f}  {format_session_options(options)}")
+    print(f"\nTerbaik: {format_session_options(best)}")
+    print("Env (.env):")
+    for key, value in best.items():
+        if value != SESSION_DEFAULTS[key]:
+            value = str(value).lower() if isinstance(value, bool) else value
+            print(f"  INFERENCE_{key.upper()}={value}")
+    print("=" * 72)
@@ -0,0 +1,161 @@
+"""
+Cascade recognition real-time: buffalo_s (MobileFaceNet) screen, ARCFACE_MODEL_NAME (ResNet) konfirmasi.
+
+Embedding cepat dicocokkan ke fast gallery (kolom embeddings.embedding_fast). Hasil screen
+diterima jika skor top-1 >= CASCADE_FAST_THRESHOLD dan gap top-1 / top-2 >= CASCADE_MARGIN;
+selain itu frame di-escalate: embedding model utama dihitung dan dicocokkan seperti biasa.
+NIM tanpa embedding_fast (belum di-backfill) tidak pernah menjadi kandidat screen: frame orang
+tersebut tidak cocok kuat ke siapa pun di fast gallery dan di-escalate (low_score / margin),
+sehingga hanya frame itu yang membayar model utama, bukan semua frame.
+
+Skor tier 'fast' ada di skala model cepat; caller tidak menerapkan aturan yang di-tune untuk
+skala model utama (mis. gap tier di /recognize) ke hasil tier 'fast'.
+"""
+import threading
+import time
+import numpy as np
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from face_recognition.config import (
+    CASCADE_ENABLED, CASCADE_FAST_MODEL_NAME, CASCADE_MARGIN, CASCADE_FAST_THRESHOLD, ARCFACE_MODEL_NAME
+)
+
+
+class CascadeMatcher:
+    """Match wajah hasil detect_with_qc: screen recognizer cepat, escalate ke recognizer utama jika ambigu."""
+
+    def __init__(self, encoder, matcher, enabled: bool = CASCADE_ENABLED, margin: float = CASCADE_MARGIN,
+                 fast_threshold: float = CASCADE_FAST_THRESHOLD):
+        """
+        Initialize cascade.
+
+        Args:
+            encoder: ArcFaceEncoder (dengan fast_rec_model jika cascade aktif)
+            matcher: FaceMatcher untuk model utama
+            enabled: False = selalu model utama (perilaku tanpa cascade)
+            margin: Gap top-1 - top-2 minimum supaya hasil screen diterima
+            fast_threshold: Skor top-1 minimum hasil screen (skala model cepat)
+        """
+        self.encoder = encoder
+        self.matcher = matcher
+        self.margin = margin
+        self.fast_threshold = fast_threshold
+        self.enabled = enabled and encoder.fast_rec_model is not None and matcher.db.uses_gallery
+        if enabled and not self.enabled:
+            print(f"Warning: cascade {CASCADE_FAST_MODEL_NAME} -> {ARCFACE_MODEL_NAME} tidak aktif "
+                  f"(butuh resident gallery dan model cepat berbeda dari model utama)")
+
+        self._lock = threading.Lock()
+        self._tiers: Counter = Counter()
+        self._escalations: Counter = Counter()
+        self._tier_seconds: Counter = Counter()
+
+    def match(self, image_bgr: np.ndarray, face: Any, threshold: Optional[float] = None,
+              top_k: Optional[int] = None, require_gap: bool = True,
+              roster_id: Optional[str] = None) -> Tuple[List[Dict], Dict[str, Any]]:
+        """
+        Match satu wajah.
+
+        Args:
+            image_bgr: Image BGR tempat wajah dideteksi
+            face: Face terpilih (detect_with_qc)
+            threshold: Threshold match model utama (default matcher)
+            top_k: Jumlah match (default matcher)
+            require_gap: Diteruskan ke FaceMatcher.match
+            roster_id: Roster selalu lewat model utama (sub-matrix roster hanya untuk gallery utama)
+
+        Returns:
+            (matches, info). info: {'tier': 'fast' / 'full', 'escalation': alasan atau None,
+            'fast_top1', 'fast_margin', 'embedding_failed': True jika embedding model utama gagal
+            (matches kosong, bukan berarti tidak ada match)}
+
+        Raises:
+            RosterNotFoundError: roster_id tidak ditemukan
+        """
+        threshold = self.matcher.threshold if threshold is None else threshold
+        top_k = self.matcher.top_k if top_k is None else top_k
+        info: Dict[str, Any] = {'tier': 'full', 'escalation': None, 'fast_top1': None, 'fast_margin': None,
+                                'embedding_failed': False}
+
+        start = time.perf_counter()
+        if not self.enabled:
+            reason = None
+        elif roster_id:
+            reason = 'roster'
+        else:
+            fast_matches, reason = self._screen(image_bgr, face, threshold, top_k, info)
+            if reason is None:
+                self._record('fast', None, time.perf_counter() - start)
+                info['tier'] = 'fast'
+                return fast_matches, info
+        info['escalation'] = reason
+
+        embedding = self.encoder.embed_face(image_bgr, face)
+        if embedding is None:
+            info['embedding_failed'] = True
+            matches = []
+        else:
+            matches = self.matcher.match(embedding, threshold=threshold, top_k=top_k,
+                                         require_gap=require_gap, roster_id=roster_id)
+        self._record('full', reason, time.perf_counter() - start)
+        return matches, info
+
+    def _screen(self, image_bgr: np.ndarray, face: Any, threshold: float, top_k: int,
+                info: Dict[str, Any]) -> Tuple[List[Dict], Optional[str]]:
+        """Embedding cepat -> fast gallery. Returns (matches, None) jika diterima, ([], alasan escalate) jika tidak."""
+        gallery = self.matcher.db.get_fast_gallery()
+        if len(gallery) == 0:
+            return [], 'fast_gallery_empty'
+
+        embedding = self.encoder.embed_face_fast(image_bgr, face)
+        if embedding is None:
+            return [], 'no_fast_embedding'
+
+        # Top-2 tanpa threshold untuk margin; yang dikembalikan tetap difilter threshold
+        candidates = gallery.search(embedding, threshold=-1.0, top_k=max(top_k, 2))
+        if not candidates:
+            return [], 'fast_gallery_empty'
+        top1 = candidates[0]['confidence']
+        margin = top1 - candidates[1]['confidence'] if len(candidates) > 1 else 1.0
+        info['fast_top1'] = top1
+        info['fast_margin'] = margin
+
+        if top1 < max(threshold, self.fast_threshold):
+            return [], 'low_score'
+        if margin < self.margin:
+            return [], 'margin'
+        return [m for m in candidates if m['confidence'] >= threshold][:top_k], None
+
+    def _record(self, tier: str, escalation: Optional[str], seconds: float):
+        with self._lock:
+            self._tiers[tier] += 1
+            self._tier_seconds[tier] += seconds
+            if escalation is not None:
+                self._escalations[escalation] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Jumlah frame per tier, escalation rate per alasan dan latency rata-rata per tier."""
+        db = self.matcher.db
+        main_size = len(db.gallery) if db.gallery is not None else 0
+        fast_size = len(db.fast_gallery) if db.fast_gallery is not None else 0
+        with self._lock:
+            frames = sum(self._tiers.values())
+            screened = self._tiers['fast'] + sum(count for reason, count in self._escalations.items()
+                                                 if reason != 'roster')
+            return {
+                'enabled': self.enabled,
+                'fast_model': CASCADE_FAST_MODEL_NAME,
+                'margin': self.margin,
+                'fast_threshold': self.fast_threshold,
+                # Fraksi NIM yang sudah punya embedding_fast (sisanya selalu lewat model utama)
+                'fast_coverage': fast_size / main_size if main_size else 0.0,
+                'frames': frames,
+                'fast_accepted': self._tiers['fast'],
+                'escalated': sum(self._escalations.values()),
+                # Fraksi frame yang di-screen tetapi tetap butuh model utama
+                'escalation_rate': (screened - self._tiers['fast']) / screened if screened else 0.0,
+                'escalations': dict(self._escalations),
+                'mean_ms': {tier: self._tier_seconds[tier] / count * 1000
+                            for tier, count in self._tiers.items() if count},
+            }
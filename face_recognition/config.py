@@ -16,6 +16,49 @@ PHOTOS_DIR = BASE_DIR / "output" / "photos"
 ARCFACE_MODEL_NAME = "buffalo_l"  # ResNet100 (default) atau "buffalo_s" untuk MobileFaceNet
 ARCFACE_INPUT_SIZE = (112, 112)  # Wajib 112x112 untuk ArcFace
 ARCFACE_EMBEDDING_SIZE = 512  # 512-D embedding
+ARCFACE_DET_SIZE = (640, 640)  # Input size detector (RetinaFace / SCRFD)
+UI_DET_SIZE = (int(os.getenv("UI_DET_SIZE", "320")),) * 2  # Detector-only untuk feedback UI (/detect-face, /api/check-qc)
+
+# Adaptive detection input size (frame real-time): det_size dipilih dari ukuran wajah di frame
+# sebelumnya client yang sama. Close-up kiosk -> 256 / 320; foto enrollment (tanpa hint) tetap 640.
+ADAPTIVE_DET_ENABLED = os.getenv("ADAPTIVE_DET_ENABLED", "true").lower() == "true"
+ADAPTIVE_DET_SIZES = (256, 320, 480, 640)  # Kandidat input size (kelipatan 32, stride terbesar SCRFD)
+ADAPTIVE_DET_MIN_FACE_PX = int(os.getenv("ADAPTIVE_DET_MIN_FACE_PX", "80"))  # Sisi wajah minimum (px) di input detector
+ADAPTIVE_DET_CLIENT_TTL = 10.0  # Detik; hint lebih lama dari ini dianggap basi (client pindah / orang berganti)
+ADAPTIVE_DET_MAX_CLIENTS = 1024  # Jumlah client yang disimpan (LRU)
+INSIGHTFACE_ROOT = "~/.insightface"  # Lokasi model pack InsightFace (auto-download)
+INFERENCE_PROVIDERS = os.getenv("INFERENCE_PROVIDERS", "CPUExecutionProvider").split(",")  # Mis. "CUDAExecutionProvider,CPUExecutionProvider" untuk GPU
+
+# ONNX Runtime SessionOptions (detector + recognizer). Default = default ORT; di gunicorn set
+# INFERENCE_INTRA_OP_THREADS ~ cores / jumlah worker supaya proses tidak berebut core.
+# Cari kombinasi terbaik dengan `python main.py benchmark-ort --sample 50`.
+INFERENCE_INTRA_OP_THREADS = int(os.getenv("INFERENCE_INTRA_OP_THREADS", "0"))  # Thread intra-op per session (0 = semua core)
+INFERENCE_INTER_OP_THREADS = int(os.getenv("INFERENCE_INTER_OP_THREADS", "0"))  # Thread inter-op (hanya mode parallel)
+INFERENCE_EXECUTION_MODE = os.getenv("INFERENCE_EXECUTION_MODE", "sequential")  # "sequential" atau "parallel"
+INFERENCE_GRAPH_OPTIMIZATION = os.getenv("INFERENCE_GRAPH_OPTIMIZATION", "all")  # "disable", "basic", "extended", "all"
+INFERENCE_CPU_MEM_ARENA = os.getenv("INFERENCE_CPU_MEM_ARENA", "true").lower() == "true"  # Arena allocator CPU
+INFERENCE_MEM_PATTERN = os.getenv("INFERENCE_MEM_PATTERN", "true").lower() == "true"  # Pre-alokasi memory pattern
+INFERENCE_ALLOW_SPINNING = os.getenv("INFERENCE_ALLOW_SPINNING", "true").lower() == "true"  # Thread pool busy-wait antar run
+INFERENCE_THREAD_AFFINITY = os.getenv("INFERENCE_THREAD_AFFINITY", "")  # Format ORT, mis. "1;2;3" (kosong = tidak di-pin)
+# Cache model ONNX yang sudah dioptimasi ORT (key: hash model, versi ORT, optimization level, provider)
+INFERENCE_OPTIMIZED_CACHE_ENABLED = os.getenv("INFERENCE_OPTIMIZED_CACHE_ENABLED", "true").lower() == "true"
+INFERENCE_OPTIMIZED_CACHE_DIR = MODELS_DIR / "ort_cache"
+# Presisi model yang dipakai registry: "fp32" (file asli pack) atau "int8" (hasil `python main.py quantize`)
+INFERENCE_PRECISION = os.getenv("INFERENCE_PRECISION", "fp32")
+INFERENCE_QUANTIZED_DIR = MODELS_DIR / "quantized"  # <pack>/<model>.int8.onnx
+QUANTIZATION_MODE = os.getenv("QUANTIZATION_MODE", "static")  # "static" (kalibrasi activation, QDQ) atau "dynamic" (weight saja)
+QUANTIZATION_CALIBRATION_SIZE = 200  # Foto PHOTOS_DIR untuk kalibrasi static (foto evaluasi drift diambil setelahnya)
+# File ONNX per task di model pack; pack lain dicari otomatis berdasarkan taskname
+MODEL_PACK_FILES = {
+    "buffalo_l": {"detection": "det_10g.onnx", "recognition": "w600k_r50.onnx"},
+    "buffalo_s": {"detection": "det_500m.onnx", "recognition": "w600k_mbf.onnx"},
+}
+
+# Micro-batching recognition: crop 112x112 dari request concurrent digabung jadi satu get_feat
+INFERENCE_BATCHING_ENABLED = os.getenv("INFERENCE_BATCHING_ENABLED", "true").lower() == "true"
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "16"))  # Crop maksimum per forward pass
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "3"))  # Tunggu maksimum setelah crop pertama masuk
+INFERENCE_EMBED_TIMEOUT = float(os.getenv("INFERENCE_EMBED_TIMEOUT", "10"))  # Detik; request menyerah jika batcher macet
 
 # Preprocessing Settings
 NORMALIZATION_MEAN = 127.5
@@ -48,6 +91,56 @@ COSINE_SIMILARITY_THRESHOLD = 0.65  # Threshold untuk matching (ArcFace optimal:
 ENABLE_GAP_VALIDATION = False  # Nonaktifkan gap validation (threshold sudah cukup, voting mechanism handle konsistensi)
 MIN_CONFIDENCE_GAP = 0.1  # Gap minimum (tidak digunakan jika ENABLE_GAP_VALIDATION = False)
 TOP_K_MATCHES = 5  # Return top 5 matches
+GALLERY_ENABLED = True  # Load embeddings sekali ke memory (matrix N x 512), tidak scan tabel per request
+GALLERY_SYNC_CHANNEL = "embeddings_changed"  # Channel LISTEN/NOTIFY untuk perubahan tabel embeddings
+GALLERY_SYNC_INTERVAL = 30  # Detik; catch-up berdasarkan version watermark (jika ada NOTIFY yang terlewat)
+GALLERY_BATCH_MAX_SCORE_BYTES = 256 * 1024 * 1024  # Batas memory matrix score per chunk di match_batch
+GALLERY_DTYPE = os.getenv("GALLERY_DTYPE", "float32")  # "float32" (exact), "float16" / "int8" (compact + rerank float32), "pq"
+GALLERY_RERANK_CANDIDATES = 256  # Kandidat first-pass yang di-rerank exact (mode float16 / int8)
+GALLERY_STORE_DIR = MODELS_DIR / "gallery"  # Lokasi file float32 memory-mapped untuk rerank
+GALLERY_SNAPSHOT_PATH = Path(os.getenv("GALLERY_SNAPSHOT_PATH", str(MODELS_DIR / "gallery_snapshot.bin")))  # Snapshot shared antar worker (`python main.py snapshot`)
+GALLERY_SNAPSHOT_ENABLED = os.getenv("GALLERY_SNAPSHOT_ENABLED", "true").lower() == "true"  # Pakai snapshot jika file ada (mode float32)
+GALLERY_SNAPSHOT_HEADROOM = 4096  # Row kosong di snapshot untuk insert incremental tanpa copy matrix
+
+# Cascade real-time recognition: screen embedding buffalo_s (MobileFaceNet) ke gallery buffalo_s
+# (kolom embeddings.embedding_fast), embedding ARCFACE_MODEL_NAME hanya jika hasil screen ambigu
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "false").lower() == "true"
+CASCADE_FAST_MODEL_NAME = "buffalo_s"
+CASCADE_MARGIN = float(os.getenv("CASCADE_MARGIN", "0.10"))  # Gap top-1 - top-2 minimum supaya hasil screen diterima
+CASCADE_FAST_THRESHOLD = float(os.getenv("CASCADE_FAST_THRESHOLD", str(COSINE_SIMILARITY_THRESHOLD)))  # Skor top-1 minimum (skala buffalo_s)
+
+# Product Quantization (GALLERY_DTYPE = "pq"): M bytes per NIM di RAM, rerank dari BYTEA di database
+PQ_NUM_SUBQUANTIZERS = 64  # M; 512 / 64 = 8 dimensi per subspace, 64 bytes per NIM
+PQ_TRAIN_ITERATIONS = 20  # Iterasi k-means per subspace
+PQ_TRAIN_SAMPLE_SIZE = 100000  # Batas sample embeddings untuk training codebook
+PQ_CODEBOOK_PATH = MODELS_DIR / "pq_codebook.npz"  # Codebook hasil `python main.py pq-train`
+
+# Roster (daftar NIM per ruang / sesi ujian): matching hanya ke sub-matrix roster
+ROSTER_DIR = BASE_DIR / "rosters"  # File <roster_id>.csv (format seperti nim_list.csv); fallback tabel rosters
+ROSTER_CACHE_SIZE = 32  # Jumlah sub-matrix roster di cache (LRU)
+ROSTER_CACHE_TTL = 30  # Detik; umur maksimum sub-matrix roster di cache (juga di-evict saat CSV / tabel rosters berubah)
+
+# Duplicate / impostor pair detection (`python main.py find-duplicates`)
+DUPLICATE_SIMILARITY_THRESHOLD = 0.60  # Pasangan >= ini dicatat (sedikit di bawah COSINE_SIMILARITY_THRESHOLD untuk tuning)
+DUPLICATE_NEAR_IDENTICAL_THRESHOLD = 0.90  # >= ini dianggap foto / orang yang sama terdaftar dua kali
+DUPLICATE_TILE_SIZE = 1024  # Row per tile; tile score 1024 x 1024 float32 = 4 MB
+DUPLICATE_WORKERS = int(os.getenv("DUPLICATE_WORKERS", "1"))  # Tile paralel; 1 = BLAS memparalelkan tiap GEMM ke semua core
+DUPLICATE_OUTPUT_PATH = BASE_DIR / "logs" / "duplicate_pairs.csv"
+
+# ANN Index Settings (untuk gallery sangat besar, mis. seluruh universitas)
+ANN_INDEX_TYPE = os.getenv("ANN_INDEX_TYPE", "")  # "" = exact brute-force, "ivf" = IVF-flat
+ANN_INDEX_PATH = MODELS_DIR / "ann_ivf_index.npz"
+ANN_IVF_NLIST = None  # Jumlah cluster; None = otomatis 4 * sqrt(N)
+ANN_IVF_NPROBE = int(os.getenv("ANN_IVF_NPROBE", "16"))  # Cluster yang di-scan per query (naikkan = recall naik, latency naik)
+ANN_IVF_TRAIN_ITERATIONS = 15
+
+# pgvector Search Backend (opsional): similarity search di PostgreSQL, worker tanpa gallery di RAM
+PGVECTOR_ENABLED = os.getenv("PGVECTOR_ENABLED", "false").lower() == "true"
+PGVECTOR_INDEX_TYPE = os.getenv("PGVECTOR_INDEX_TYPE", "hnsw")  # "hnsw" atau "ivfflat"
+PGVECTOR_HNSW_EF_SEARCH = 100  # Naikkan = recall naik, latency naik
+PGVECTOR_IVFFLAT_LISTS = 100  # Jumlah list IVFFlat (~ sqrt(N))
+PGVECTOR_IVFFLAT_PROBES = 10
+PGVECTOR_MIGRATION_BATCH_SIZE = 1000  # Row per batch saat migrasi BYTEA -> vector
 
 # Image Format Support
 SUPPORTED_FORMATS = ['.jpg', '.jpeg', '.png', '.JPG', '.JPEG', '.PNG']
@@ -69,6 +162,9 @@ FLASK_DEBUG = os.getenv("FLASK_ENV", "development") == "development"
 # Batch Processing Settings
 BATCH_SIZE = 32  # Process 32 images at once
 MAX_WORKERS = 4  # Number of parallel workers
+PREFETCH_DECODE_WORKERS = 4  # Thread decode foto (cv2.imread) di depan stage model
+PREFETCH_QUEUE_SIZE = BATCH_SIZE * 4  # Image decoded maksimum yang menunggu stage model
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "500"))  # NIM per transaksi upsert bulk (execute_values)
 
 # Logging
 LOG_DIR = BASE_DIR / "logs"
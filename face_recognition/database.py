@@ -3,15 +3,26 @@ PostgreSQL Database untuk Face Recognition Embeddings
 """
 import psycopg2
 from psycopg2 import pool, sql
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 import numpy as np
 from typing import Optional, List, Dict, Tuple
 from datetime import datetime
 import pickle
+import threading
+import json
+import time
 
 from face_recognition.config import (
-    DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, DB_CONNECTION_STRING
+    DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, DB_CONNECTION_STRING,
+    GALLERY_ENABLED, ARCFACE_EMBEDDING_SIZE, GALLERY_SYNC_CHANNEL, GALLERY_SYNC_INTERVAL, GALLERY_DTYPE,
+    PGVECTOR_ENABLED, PGVECTOR_INDEX_TYPE, PGVECTOR_HNSW_EF_SEARCH, PGVECTOR_IVFFLAT_LISTS,
+    PGVECTOR_IVFFLAT_PROBES, PGVECTOR_MIGRATION_BATCH_SIZE, PQ_CODEBOOK_PATH,
+    GALLERY_SNAPSHOT_PATH, GALLERY_SNAPSHOT_ENABLED, GALLERY_SNAPSHOT_HEADROOM, DB_WRITE_BATCH_SIZE
 )
+from face_recognition.gallery import EmbeddingGallery
+from face_recognition.pq import ProductQuantizer
+from face_recognition.snapshot import GallerySnapshot, write_snapshot
 
 
 class FaceDatabase:
@@ -20,6 +31,19 @@ class FaceDatabase:
     def __init__(self):
         """Initialize database connection pool."""
         self.connection_pool = None
+        self.gallery: Optional[EmbeddingGallery] = None
+        self.fast_gallery: Optional[EmbeddingGallery] = None  # Gallery embedding_fast (cascade), sync bersama gallery
+        self._gallery_lock = threading.RLock()
+        self._gallery_version = 0  # Watermark: version tertinggi yang sudah diterapkan ke gallery
+        self._gallery_xmin = 0  # Txid tertua yang masih berjalan saat watermark dibaca (lihat _snapshot_xmin)
+        self._last_catchup = 0.0
+        self._listen_conn = None
+        # Versi isi roster (tabel rosters) yang diketahui proses ini, untuk invalidasi cache roster.
+        # Per roster dinaikkan oleh NOTIFY save_roster; epoch dinaikkan jika NOTIFY mungkin terlewat.
+        self._roster_lock = threading.Lock()
+        self._roster_versions: Dict[str, int] = {}
+        self._roster_epoch = 0
+        self._snapshot: Optional[GallerySnapshot] = None  # Snapshot memory-mapped yang dipakai gallery
         self._init_connection_pool()
         self._init_database()
     
@@ -70,6 +94,44 @@ class FaceDatabase:
                 )
             """)
             
+            # Version monotonic untuk incremental sync gallery antar proses
+            cursor.execute("""
+                CREATE SEQUENCE IF NOT EXISTS embeddings_version_seq
+            """)
+            cursor.execute("""
+                ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS version BIGINT
+            """)
+            cursor.execute("""
+                ALTER TABLE embeddings ALTER COLUMN version SET DEFAULT nextval('embeddings_version_seq')
+            """)
+            cursor.execute("""
+                UPDATE embeddings SET version = nextval('embeddings_version_seq') WHERE version IS NULL
+            """)
+            
+            # Embedding model cascade cepat (CASCADE_FAST_MODEL_NAME) dari foto yang sama; NULL = belum di-encode
+            cursor.execute("""
+                ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS embedding_fast BYTEA
+            """)
+            
+            # Tombstone untuk NIM yang dihapus (supaya worker lain bisa ikut menghapus dari cache)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_deletions (
+                    nim VARCHAR(20) PRIMARY KEY,
+                    version BIGINT NOT NULL,
+                    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
+            # Txid transaksi penulis. version diambil dari nextval() saat statement dijalankan, bukan
+            # saat commit, jadi transaksi yang commit belakangan bisa membawa version < watermark;
+            # catch-up membaca ulang rows dengan txid >= xmin watermark (lihat _catch_up_gallery).
+            # Default dipasang terpisah supaya rows lama tidak di-rewrite (NULL = sudah lama commit).
+            for table in ("embeddings", "embedding_deletions"):
+                cursor.execute(sql.SQL("ALTER TABLE {} ADD COLUMN IF NOT EXISTS txid BIGINT").format(
+                    sql.Identifier(table)))
+                cursor.execute(sql.SQL("ALTER TABLE {} ALTER COLUMN txid SET DEFAULT txid_current()").format(
+                    sql.Identifier(table)))
+            
             # Create recognition_logs table
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS recognition_logs (
@@ -83,6 +145,11 @@ class FaceDatabase:
                 )
             """)
             
+            # Tier cascade yang menghasilkan confidence ('fast' = skala model cepat, 'full' = model utama)
+            cursor.execute("""
+                ALTER TABLE recognition_logs ADD COLUMN IF NOT EXISTS tier VARCHAR(10)
+            """)
+            
             # Create registration_logs table
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS registration_logs (
@@ -94,10 +161,48 @@ class FaceDatabase:
                 )
             """)
             
+            # Roster: daftar NIM per ruang / sesi ujian (alternatif file CSV di ROSTER_DIR)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS rosters (
+                    roster_id VARCHAR(64) NOT NULL,
+                    nim VARCHAR(20) NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (roster_id, nim)
+                )
+            """)
+            
+            # Manifest encoding: fingerprint foto + model / parameter QC (incremental re-encode)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS encoding_manifest (
+                    nim VARCHAR(20) PRIMARY KEY,
+                    photo_path TEXT,
+                    file_size BIGINT,
+                    file_mtime DOUBLE PRECISION,
+                    content_sha256 CHAR(64),
+                    model_name VARCHAR(50),
+                    params_hash VARCHAR(64),
+                    qc_params TEXT,
+                    status VARCHAR(20),
+                    encoded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
             # Create indexes
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_nim ON embeddings(nim)
             """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_embeddings_version ON embeddings(version)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_deletions_version ON embedding_deletions(version)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_embeddings_txid ON embeddings(txid)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_deletions_txid ON embedding_deletions(txid)
+            """)
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_timestamp ON recognition_logs(timestamp)
             """)
@@ -111,6 +216,9 @@ class FaceDatabase:
                 CREATE INDEX IF NOT EXISTS idx_registration_created ON registration_logs(created_at)
             """)
             
+            if PGVECTOR_ENABLED:
+                self._init_pgvector(cursor)
+            
             conn.commit()
             print("Database tables initialized successfully")
         except Exception as e:
@@ -120,7 +228,52 @@ class FaceDatabase:
         finally:
             self._return_connection(conn)
     
-    def save_embedding(self, nim: str, embedding: np.ndarray, photo_path: str = None) -> bool:
+    def _init_pgvector(self, cursor):
+        """Create extension pgvector, kolom vector(512) dan index cosine (HNSW / IVFFlat)."""
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        cursor.execute(
+            f"ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS embedding_vec vector({ARCFACE_EMBEDDING_SIZE})"
+        )
+        if PGVECTOR_INDEX_TYPE == "ivfflat":
+            cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_embeddings_vec_ivfflat ON embeddings
+                USING ivfflat (embedding_vec vector_cosine_ops) WITH (lists = {int(PGVECTOR_IVFFLAT_LISTS)})
+            """)
+        else:
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_embeddings_vec_hnsw ON embeddings
+                USING hnsw (embedding_vec vector_cosine_ops)
+            """)
+    
+    @staticmethod
+    def _to_pgvector(embedding: np.ndarray) -> str:
+        """Convert embedding ke text literal pgvector: '[x1,x2,...]'."""
+        values = np.asarray(embedding, dtype=np.float32).reshape(-1).tolist()
+        return "[" + ",".join(repr(v) for v in values) + "]"
+    
+    @staticmethod
+    def _to_bytes(embedding: Optional[np.ndarray]) -> Optional[bytes]:
+        """Embedding float32 -> BYTEA (None tetap None)."""
+        return None if embedding is None else np.asarray(embedding, dtype=np.float32).tobytes()
+    
+    def _apply_fast(self, nim: str, embedding_fast, photo_path: Optional[str]):
+        """Terapkan embedding_fast (array / bytes, None = tidak ada) ke fast gallery jika sudah di-load."""
+        if self.fast_gallery is None:
+            return
+        if embedding_fast is None:
+            self.fast_gallery.remove(nim)
+        else:
+            if isinstance(embedding_fast, (bytes, memoryview)):
+                embedding_fast = np.frombuffer(embedding_fast, dtype=np.float32)
+            self.fast_gallery.upsert(nim, embedding_fast, photo_path)
+    
+    @property
+    def uses_gallery(self) -> bool:
+        """True jika search memakai resident gallery (bukan pgvector di SQL)."""
+        return GALLERY_ENABLED and not PGVECTOR_ENABLED
+    
+    def save_embedding(self, nim: str, embedding: np.ndarray, photo_path: str = None,
+                       embedding_fast: Optional[np.ndarray] = None) -> bool:
         """
         Save embedding ke database.
         
@@ -128,6 +281,7 @@ class FaceDatabase:
             nim: NIM atau identifier
             embedding: 512-D embedding vector
             photo_path: Path ke foto (optional)
+            embedding_fast: Embedding model cascade cepat dari foto yang sama (None = dikosongkan)
             
         Returns:
             True jika berhasil, False jika gagal
@@ -139,18 +293,33 @@ class FaceDatabase:
             # Convert numpy array to bytes
             embedding_bytes = embedding.tobytes()
             
-            # Insert or update
+            # Insert or update (version baru setiap perubahan)
             cursor.execute("""
-                INSERT INTO embeddings (nim, embedding, photo_path, updated_at)
-                VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+                INSERT INTO embeddings (nim, embedding, photo_path, updated_at, embedding_fast)
+                VALUES (%s, %s, %s, CURRENT_TIMESTAMP, %s)
                 ON CONFLICT (nim) 
                 DO UPDATE SET 
                     embedding = EXCLUDED.embedding,
                     photo_path = EXCLUDED.photo_path,
-                    updated_at = CURRENT_TIMESTAMP
-            """, (nim, embedding_bytes, photo_path))
+                    updated_at = CURRENT_TIMESTAMP,
+                    embedding_fast = EXCLUDED.embedding_fast,
+                    version = nextval('embeddings_version_seq'),
+                    txid = txid_current()
+                RETURNING version
+            """, (nim, embedding_bytes, photo_path, self._to_bytes(embedding_fast)))
+            version = cursor.fetchone()[0]
+            if PGVECTOR_ENABLED:
+                cursor.execute("""
+                    UPDATE embeddings SET embedding_vec = %s::vector WHERE nim = %s
+                """, (self._to_pgvector(embedding), nim))
+            self._notify_change(cursor, "upsert", nim, version)
             
             conn.commit()
+            
+            # Update resident gallery (jika sudah di-load) agar tetap sinkron
+            if self.gallery is not None:
+                self.gallery.upsert(nim, embedding, photo_path)
+            self._apply_fast(nim, embedding_fast, photo_path)
             return True
         except Exception as e:
             conn.rollback()
@@ -159,6 +328,187 @@ class FaceDatabase:
         finally:
             self._return_connection(conn)
     
+    def save_embeddings_batch(self, items: List[Tuple],
+                              transaction_size: int = DB_WRITE_BATCH_SIZE) -> int:
+        """
+        Save banyak embedding: satu INSERT ... ON CONFLICT multi-row (execute_values)
+        dan satu commit per transaction_size NIM, bukan satu round trip + commit per NIM.
+        
+        Args:
+            items: List of (nim, embedding, photo_path) atau (nim, embedding, photo_path, embedding_fast)
+            transaction_size: Jumlah NIM per transaksi
+            
+        Returns:
+            Jumlah embedding yang disimpan (transaksi yang gagal di-rollback dan tidak dihitung)
+        """
+        # Satu statement tidak boleh meng-update NIM yang sama dua kali: ambil yang terakhir
+        items = list({item[0]: (tuple(item) + (None,))[:4] for item in items}.values())
+        transaction_size = max(1, transaction_size)
+        saved = 0
+        
+        conn = self._get_connection()
+        try:
+            for start in range(0, len(items), transaction_size):
+                chunk = items[start:start + transaction_size]
+                try:
+                    cursor = conn.cursor()
+                    if PGVECTOR_ENABLED:
+                        rows = execute_values(cursor, """
+                            INSERT INTO embeddings (nim, embedding, photo_path, updated_at, embedding_fast, embedding_vec)
+                            VALUES %s
+                            ON CONFLICT (nim) 
+                            DO UPDATE SET 
+                                embedding = EXCLUDED.embedding,
+                                photo_path = EXCLUDED.photo_path,
+                                updated_at = CURRENT_TIMESTAMP,
+                                embedding_fast = EXCLUDED.embedding_fast,
+                                embedding_vec = EXCLUDED.embedding_vec,
+                                version = nextval('embeddings_version_seq'),
+                                txid = txid_current()
+                            RETURNING nim, version
+                        """, [(nim, embedding.tobytes(), photo_path, self._to_bytes(embedding_fast),
+                               self._to_pgvector(embedding))
+                              for nim, embedding, photo_path, embedding_fast in chunk],
+                            template="(%s, %s, %s, CURRENT_TIMESTAMP, %s, %s::vector)",
+                            page_size=len(chunk), fetch=True)
+                    else:
+                        rows = execute_values(cursor, """
+                            INSERT INTO embeddings (nim, embedding, photo_path, updated_at, embedding_fast)
+                            VALUES %s
+                            ON CONFLICT (nim) 
+                            DO UPDATE SET 
+                                embedding = EXCLUDED.embedding,
+                                photo_path = EXCLUDED.photo_path,
+                                updated_at = CURRENT_TIMESTAMP,
+                                embedding_fast = EXCLUDED.embedding_fast,
+                                version = nextval('embeddings_version_seq'),
+                                txid = txid_current()
+                            RETURNING nim, version
+                        """, [(nim, embedding.tobytes(), photo_path, self._to_bytes(embedding_fast))
+                              for nim, embedding, photo_path, embedding_fast in chunk],
+                            template="(%s, %s, %s, CURRENT_TIMESTAMP, %s)",
+                            page_size=len(chunk), fetch=True)
+                    
+                    # NOTIFY per NIM (payload sama dengan save_embedding) dalam satu statement
+                    payloads = [json.dumps({'op': 'upsert', 'nim': nim, 'version': version}) for nim, version in rows]
+                    cursor.execute("SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+                                   (GALLERY_SYNC_CHANNEL, payloads))
+                    
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    print(f"Error saving embedding batch ({len(chunk)} NIM): {str(e)}")
+                    continue
+                
+                saved += len(chunk)
+                for nim, embedding, photo_path, embedding_fast in chunk:
+                    if self.gallery is not None:
+                        self.gallery.upsert(nim, embedding, photo_path)
+                    self._apply_fast(nim, embedding_fast, photo_path)
+            return saved
+        finally:
+            self._return_connection(conn)
+    
+    def get_existing_nims(self) -> set:
+        """
+        Semua NIM yang sudah punya embedding (satu query, untuk skip di batch encoder).
+        
+        Returns:
+            Set of NIM
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT nim FROM embeddings")
+            return {row[0] for row in cursor.fetchall()}
+        except Exception as e:
+            print(f"Error getting existing NIMs: {str(e)}")
+            return set()
+        finally:
+            self._return_connection(conn)
+    
+    def get_nims_without_fast(self) -> set:
+        """
+        NIM yang punya embedding tetapi belum punya embedding_fast (backfill cascade).
+        
+        Returns:
+            Set of NIM
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT nim FROM embeddings WHERE embedding_fast IS NULL")
+            return {row[0] for row in cursor.fetchall()}
+        except Exception as e:
+            print(f"Error getting NIMs without embedding_fast: {str(e)}")
+            return set()
+        finally:
+            self._return_connection(conn)
+    
+    def get_manifest(self) -> Dict[str, Dict]:
+        """
+        Semua row encoding_manifest.
+        
+        Returns:
+            Dict {nim: {file_size, file_mtime, content_sha256, model_name, params_hash, status}}
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute("""
+                SELECT nim, file_size, file_mtime, content_sha256, model_name, params_hash, status
+                FROM encoding_manifest
+            """)
+            return {row['nim']: dict(row) for row in cursor.fetchall()}
+        except Exception as e:
+            print(f"Error getting encoding manifest: {str(e)}")
+            return {}
+        finally:
+            self._return_connection(conn)
+    
+    def save_manifest(self, entries: List[Tuple]) -> int:
+        """
+        Upsert row encoding_manifest (satu transaksi).
+        
+        Args:
+            entries: List of (nim, photo_path, file_size, file_mtime, content_sha256,
+                     model_name, params_hash, qc_params JSON, status)
+            
+        Returns:
+            Jumlah row yang disimpan
+        """
+        entries = list({entry[0]: entry for entry in entries}.values())
+        if not entries:
+            return 0
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            execute_values(cursor, """
+                INSERT INTO encoding_manifest (nim, photo_path, file_size, file_mtime, content_sha256,
+                                               model_name, params_hash, qc_params, status, encoded_at)
+                VALUES %s
+                ON CONFLICT (nim)
+                DO UPDATE SET
+                    photo_path = EXCLUDED.photo_path,
+                    file_size = EXCLUDED.file_size,
+                    file_mtime = EXCLUDED.file_mtime,
+                    content_sha256 = EXCLUDED.content_sha256,
+                    model_name = EXCLUDED.model_name,
+                    params_hash = EXCLUDED.params_hash,
+                    qc_params = EXCLUDED.qc_params,
+                    status = EXCLUDED.status,
+                    encoded_at = CURRENT_TIMESTAMP
+            """, entries, template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)",
+                page_size=len(entries))
+            conn.commit()
+            return len(entries)
+        except Exception as e:
+            conn.rollback()
+            print(f"Error saving encoding manifest ({len(entries)} NIM): {str(e)}")
+            return 0
+        finally:
+            self._return_connection(conn)
+    
     def get_embedding(self, nim: str) -> Optional[np.ndarray]:
         """
         Get embedding dari database.
@@ -243,10 +593,662 @@ class FaceDatabase:
         finally:
             self._return_connection(conn)
     
+    def _notify_change(self, cursor, op: str, nim: str, version: int):
+        """
+        Kirim NOTIFY perubahan embeddings (terkirim saat transaksi di-commit).
+        
+        Args:
+            cursor: Cursor dari transaksi yang sedang berjalan
+            op: 'upsert' atau 'delete'
+            nim: NIM yang berubah
+            version: Version baru dari perubahan
+        """
+        payload = json.dumps({'op': op, 'nim': nim, 'version': version})
+        cursor.execute("SELECT pg_notify(%s, %s)", (GALLERY_SYNC_CHANNEL, payload))
+    
+    @staticmethod
+    def _snapshot_xmin(cursor) -> int:
+        """
+        Txid tertua yang masih berjalan (txid_snapshot_xmin). Harus dibaca SEBELUM rows: perubahan
+        yang belum terlihat saat itu pasti ditulis transaksi dengan txid >= nilai ini.
+        """
+        cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        return cursor.fetchone()[0]
+    
+    def _open_listener(self):
+        """Open koneksi khusus (autocommit) untuk LISTEN perubahan embeddings."""
+        self._close_listener()
+        try:
+            conn = psycopg2.connect(
+                host=DB_HOST,
+                port=DB_PORT,
+                database=DB_NAME,
+                user=DB_USER,
+                password=DB_PASSWORD
+            )
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            cursor = conn.cursor()
+            cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(GALLERY_SYNC_CHANNEL)))
+            self._listen_conn = conn
+        except Exception as e:
+            print(f"Warning: LISTEN {GALLERY_SYNC_CHANNEL} gagal, fallback ke periodic sync: {str(e)}")
+            self._listen_conn = None
+    
+    def _close_listener(self):
+        """Close koneksi LISTEN jika ada."""
+        if self._listen_conn is not None:
+            try:
+                self._listen_conn.close()
+            except Exception:
+                pass
+            self._listen_conn = None
+    
+    def load_gallery(self, force: bool = False) -> EmbeddingGallery:
+        """
+        Load semua embeddings ke resident gallery (sekali per proses).
+        
+        Args:
+            force: Jika True, reload dari database meskipun gallery sudah ada
+            
+        Returns:
+            EmbeddingGallery (matrix N x 512 pre-normalized + index NIM/photo_path)
+        """
+        with self._gallery_lock:
+            if self.gallery is not None and not force:
+                return self.gallery
+            
+            # LISTEN dulu sebelum load, supaya perubahan selama load tidak terlewat
+            self._open_listener()
+            
+            if self._load_gallery_from_snapshot():
+                return self.gallery
+            
+            conn = self._get_connection()
+            try:
+                cursor = conn.cursor()
+                xmin = self._snapshot_xmin(cursor)
+                cursor.execute("""
+                    SELECT nim, embedding, photo_path, version FROM embeddings
+                """)
+                rows = cursor.fetchall()
+                cursor.execute("SELECT COALESCE(MAX(version), 0) FROM embedding_deletions")
+                max_deleted = cursor.fetchone()[0]
+                
+                gallery_kwargs = {}
+                if GALLERY_DTYPE == "pq":
+                    gallery_kwargs = {
+                        'pq': self._load_pq_codebook(),
+                        'exact_loader': self.get_embeddings_bulk,
+                    }
+                
+                old_gallery = self.gallery
+                self.gallery = EmbeddingGallery.from_rows(
+                    ((row[0], row[1], row[2]) for row in rows), dim=ARCFACE_EMBEDDING_SIZE,
+                    dtype=GALLERY_DTYPE, **gallery_kwargs
+                )
+                if old_gallery is not None:
+                    old_gallery.close()
+                self._snapshot = None
+                self._gallery_version = max([row[3] or 0 for row in rows] + [max_deleted])
+                self._gallery_xmin = xmin
+                self._last_catchup = time.monotonic()
+                print(f"Gallery loaded: {len(self.gallery)} embeddings (version {self._gallery_version})")
+                return self.gallery
+            finally:
+                self._return_connection(conn)
+    
+    def _load_gallery_from_snapshot(self) -> bool:
+        """
+        Load gallery dari snapshot memory-mapped (jika ada), lalu catch-up perubahan
+        setelah watermark snapshot. Hanya untuk GALLERY_DTYPE float32.
+        
+        Returns:
+            True jika gallery berhasil di-load dari snapshot
+        """
+        if not GALLERY_SNAPSHOT_ENABLED or GALLERY_DTYPE != "float32" or not GALLERY_SNAPSHOT_PATH.exists():
+            return False
+        
+        try:
+            snapshot = GallerySnapshot(GALLERY_SNAPSHOT_PATH)
+            if snapshot.dim != ARCFACE_EMBEDDING_SIZE:
+                raise ValueError(f"Dimensi snapshot {snapshot.dim} != {ARCFACE_EMBEDDING_SIZE}")
+        except Exception as e:
+            print(f"Warning: gagal membuka snapshot {GALLERY_SNAPSHOT_PATH}, load dari database: {str(e)}")
+            return False
+        
+        old_gallery = self.gallery
+        self.gallery = EmbeddingGallery.from_snapshot(snapshot)
+        if old_gallery is not None:
+            old_gallery.close()
+        self._snapshot = snapshot
+        self._gallery_version = snapshot.data_version
+        self._gallery_xmin = snapshot.data_xmin
+        applied = self._catch_up_gallery()
+        print(f"Gallery loaded dari snapshot {GALLERY_SNAPSHOT_PATH}: {snapshot.count} embeddings "
+              f"(version {snapshot.data_version}), {applied} perubahan sesudahnya diterapkan")
+        return True
+    
+    def export_snapshot(self, path=None, headroom: int = GALLERY_SNAPSHOT_HEADROOM) -> Tuple[int, int]:
+        """
+        Export tabel embeddings ke snapshot on-disk untuk di-share antar worker process.
+        Rows dan watermark (version + txid xmin) dibaca dalam satu transaksi REPEATABLE READ
+        (konsisten), lalu file di-publish dengan atomic rename. Worker lain pindah ke snapshot baru
+        pada catch-up berikutnya.
+        
+        Args:
+            path: Lokasi file snapshot (default GALLERY_SNAPSHOT_PATH)
+            headroom: Row kosong untuk insert incremental
+            
+        Returns:
+            (jumlah embeddings, version watermark)
+        """
+        path = path or GALLERY_SNAPSHOT_PATH
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            # Statement pertama menetapkan snapshot transaksi; xmin dari snapshot yang sama.
+            # Transaksi yang belum commit saat ini bisa commit belakangan dengan version
+            # < data_version; worker dari snapshot ini membacanya ulang lewat txid >= data_xmin.
+            cursor.execute("""
+                SELECT GREATEST(
+                    (SELECT COALESCE(MAX(version), 0) FROM embeddings),
+                    (SELECT COALESCE(MAX(version), 0) FROM embedding_deletions)
+                ), txid_snapshot_xmin(txid_current_snapshot())
+            """)
+            data_version, data_xmin = cursor.fetchone()
+            
+            # Server-side cursor: rows di-stream, tidak di-load semua ke memory
+            stream = conn.cursor(name="gallery_snapshot_export")
+            stream.itersize = 10000
+            stream.execute("SELECT nim, embedding, photo_path FROM embeddings ORDER BY nim")
+            count = write_snapshot(path, stream, data_version, data_xmin,
+                                   dim=ARCFACE_EMBEDDING_SIZE, headroom=headroom)
+            stream.close()
+            conn.rollback()
+            return count, data_version
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._return_connection(conn)
+    
+    @staticmethod
+    def _load_pq_codebook() -> ProductQuantizer:
+        """Load codebook PQ untuk gallery mode pq."""
+        if not PQ_CODEBOOK_PATH.exists():
+            raise RuntimeError(
+                f"PQ codebook tidak ditemukan di {PQ_CODEBOOK_PATH}. "
+                f"Jalankan dulu: python main.py pq-train"
+            )
+        return ProductQuantizer.load(PQ_CODEBOOK_PATH)
+    
+    def get_embeddings_bulk(self, nims: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Ambil embedding float32 asli untuk banyak NIM sekaligus (satu query).
+        Dipakai untuk exact rerank kandidat gallery mode pq.
+        
+        Args:
+            nims: List NIM
+            
+        Returns:
+            Dictionary {nim: embedding}
+        """
+        if not nims:
+            return {}
+        
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT nim, embedding FROM embeddings WHERE nim = ANY(%s)
+            """, (list(nims),))
+            return {
+                nim: np.frombuffer(embedding_bytes, dtype=np.float32)
+                for nim, embedding_bytes in cursor.fetchall()
+            }
+        except Exception as e:
+            print(f"Error getting embeddings bulk: {str(e)}")
+            return {}
+        finally:
+            self._return_connection(conn)
+    
+    def get_embedding_rows(self, nims: List[str]) -> List[Tuple[str, np.ndarray, Optional[str]]]:
+        """
+        Ambil (nim, embedding, photo_path) untuk banyak NIM sekaligus (satu query).
+        
+        Args:
+            nims: List NIM
+            
+        Returns:
+            List of (nim, embedding, photo_path)
+        """
+        if not nims:
+            return []
+        
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT nim, embedding, photo_path FROM embeddings WHERE nim = ANY(%s)
+            """, (list(nims),))
+            return [
+                (nim, np.frombuffer(embedding_bytes, dtype=np.float32), photo_path)
+                for nim, embedding_bytes, photo_path in cursor.fetchall()
+            ]
+        except Exception as e:
+            print(f"Error getting embedding rows: {str(e)}")
+            return []
+        finally:
+            self._return_connection(conn)
+    
+    def get_roster_nims(self, roster_id: str) -> List[str]:
+        """
+        Get daftar NIM satu roster dari tabel rosters.
+        
+        Args:
+            roster_id: ID roster
+            
+        Returns:
+            List NIM (kosong jika roster tidak ada)
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT nim FROM rosters WHERE roster_id = %s ORDER BY nim
+            """, (roster_id,))
+            return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Error getting roster {roster_id}: {str(e)}")
+            return []
+        finally:
+            self._return_connection(conn)
+    
+    def save_roster(self, roster_id: str, nims: List[str]) -> int:
+        """
+        Simpan (replace) isi roster di tabel rosters.
+        
+        Args:
+            roster_id: ID roster
+            nims: List NIM anggota roster
+            
+        Returns:
+            Jumlah NIM yang disimpan
+        """
+        nims = list(dict.fromkeys(nims))
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM rosters WHERE roster_id = %s", (roster_id,))
+            execute_values(
+                cursor,
+                "INSERT INTO rosters (roster_id, nim) VALUES %s",
+                [(roster_id, nim) for nim in nims]
+            )
+            # Worker lain meng-evict sub-matrix roster ini dari cache (lihat sync_gallery)
+            cursor.execute("SELECT pg_notify(%s, %s)",
+                           (GALLERY_SYNC_CHANNEL, json.dumps({'op': 'roster', 'roster_id': roster_id})))
+            conn.commit()
+            self._bump_roster_version(roster_id)
+            return len(nims)
+        except Exception as e:
+            conn.rollback()
+            print(f"Error saving roster {roster_id}: {str(e)}")
+            raise
+        finally:
+            self._return_connection(conn)
+    
+    def _bump_roster_version(self, roster_id: Optional[str] = None):
+        """Tandai satu roster (None: semua, NOTIFY mungkin terlewat) berubah."""
+        with self._roster_lock:
+            if roster_id is None:
+                self._roster_epoch += 1
+            else:
+                self._roster_versions[roster_id] = self._roster_versions.get(roster_id, 0) + 1
+    
+    def roster_version(self, roster_id: str) -> Tuple[int, int]:
+        """
+        Versi isi roster di tabel rosters yang diketahui proses ini (berubah setelah save_roster
+        di proses mana pun, begitu NOTIFY-nya diproses sync_gallery).
+        
+        Returns:
+            (epoch, versi roster); epoch naik jika NOTIFY mungkin terlewat (semua roster dianggap berubah)
+        """
+        with self._roster_lock:
+            return self._roster_epoch, self._roster_versions.get(roster_id, 0)
+    
+    def _refresh_gallery_nims(self, nims: set) -> int:
+        """
+        Refresh NIM tertentu dari database ke gallery (upsert jika ada, hapus jika tidak ada).
+        
+        Returns:
+            Jumlah NIM yang diterapkan
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT nim, embedding, photo_path, embedding_fast FROM embeddings WHERE nim = ANY(%s)
+            """, (list(nims),))
+            found = set()
+            for nim, embedding_bytes, photo_path, fast_bytes in cursor.fetchall():
+                self.gallery.upsert(nim, np.frombuffer(embedding_bytes, dtype=np.float32), photo_path)
+                self._apply_fast(nim, fast_bytes, photo_path)
+                found.add(nim)
+            for nim in nims - found:
+                self.gallery.remove(nim)
+                self._apply_fast(nim, None, None)
+            return len(nims)
+        finally:
+            self._return_connection(conn)
+    
+    def _catch_up_gallery(self) -> int:
+        """
+        Terapkan semua perubahan dengan version > watermark (upsert + tombstone), urut version.
+        Dipakai saat notifikasi mungkin terlewat (periodic / reconnect LISTEN).
+        
+        Rows dari transaksi yang masih berjalan saat watermark dibaca (txid >= xmin) ikut dibaca
+        ulang: transaksi itu bisa commit belakangan dengan version di bawah watermark.
+        
+        Returns:
+            Jumlah perubahan yang diterapkan
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            xmin = self._snapshot_xmin(cursor)
+            cursor.execute("""
+                SELECT nim, embedding, photo_path, version, embedding_fast FROM embeddings
+                WHERE version > %s OR txid >= %s
+            """, (self._gallery_version, self._gallery_xmin))
+            changes = [(row[3], 'upsert', row) for row in cursor.fetchall()]
+            cursor.execute("""
+                SELECT nim, version FROM embedding_deletions WHERE version > %s OR txid >= %s
+            """, (self._gallery_version, self._gallery_xmin))
+            changes += [(row[1], 'delete', row) for row in cursor.fetchall()]
+            
+            changes.sort(key=lambda c: c[0])
+            for version, op, row in changes:
+                if op == 'upsert':
+                    self.gallery.upsert(row[0], np.frombuffer(row[1], dtype=np.float32), row[2])
+                    self._apply_fast(row[0], row[4], row[2])
+                else:
+                    self.gallery.remove(row[0])
+                    self._apply_fast(row[0], None, None)
+                self._gallery_version = max(self._gallery_version, version)
+            self._gallery_xmin = xmin
+            
+            self._last_catchup = time.monotonic()
+            return len(changes)
+        finally:
+            self._return_connection(conn)
+    
+    def sync_gallery(self, full_catchup: bool = False) -> int:
+        """
+        Incremental sync gallery dengan perubahan dari proses lain.
+        
+        NIM dari NOTIFY di-refresh langsung; selain itu setiap GALLERY_SYNC_INTERVAL detik
+        (atau jika koneksi LISTEN putus) dilakukan catch-up berdasarkan version watermark.
+        
+        Args:
+            full_catchup: Paksa catch-up watermark sekarang
+            
+        Returns:
+            Jumlah perubahan yang diterapkan ke gallery
+        """
+        with self._gallery_lock:
+            if self.gallery is None:
+                return 0
+            
+            need_catchup = full_catchup or (time.monotonic() - self._last_catchup) >= GALLERY_SYNC_INTERVAL
+            changed_nims = set()
+            
+            if need_catchup and self._snapshot is not None and not self._snapshot.is_current():
+                # Snapshot baru sudah di-publish: pindah ke file baru (page cache bersama)
+                self.load_gallery(force=True)
+                return len(self.gallery)
+            
+            if self._listen_conn is None:
+                self._open_listener()
+                need_catchup = True
+                self._bump_roster_version()
+            else:
+                try:
+                    self._listen_conn.poll()
+                    while self._listen_conn.notifies:
+                        payload = json.loads(self._listen_conn.notifies.pop(0).payload)
+                        if payload['op'] == 'roster':
+                            self._bump_roster_version(payload['roster_id'])
+                        else:
+                            changed_nims.add(payload['nim'])
+                except Exception as e:
+                    print(f"Warning: LISTEN connection error, reconnect: {str(e)}")
+                    self._open_listener()
+                    need_catchup = True
+                    self._bump_roster_version()
+            
+            applied = 0
+            try:
+                if changed_nims:
+                    applied += self._refresh_gallery_nims(changed_nims)
+                if need_catchup:
+                    applied += self._catch_up_gallery()
+            except Exception as e:
+                print(f"Error syncing gallery: {str(e)}")
+            return applied
+    
+    def get_gallery(self) -> EmbeddingGallery:
+        """Get resident gallery yang sudah di-load dan di-sync dengan database."""
+        gallery = self.load_gallery()
+        self.sync_gallery()
+        return gallery
+    
+    def load_fast_gallery(self) -> EmbeddingGallery:
+        """
+        Load kolom embedding_fast ke gallery float32 kedua (sekali per proses).
+        Setelah itu fast gallery ikut di-update oleh sync gallery utama (NOTIFY + watermark).
+        
+        Returns:
+            EmbeddingGallery embedding_fast (hanya NIM yang sudah punya embedding_fast)
+        """
+        self.load_gallery()
+        with self._gallery_lock:
+            if self.fast_gallery is not None:
+                return self.fast_gallery
+            
+            conn = self._get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT nim, embedding_fast, photo_path FROM embeddings WHERE embedding_fast IS NOT NULL
+                """)
+                self.fast_gallery = EmbeddingGallery.from_rows(cursor.fetchall(), dim=ARCFACE_EMBEDDING_SIZE)
+                print(f"Fast gallery loaded: {len(self.fast_gallery)} embeddings "
+                      f"(gallery utama {len(self.gallery)})")
+                return self.fast_gallery
+            finally:
+                self._return_connection(conn)
+    
+    def get_fast_gallery(self) -> EmbeddingGallery:
+        """Get fast gallery (cascade) yang sudah di-load dan di-sync dengan database."""
+        gallery = self.load_fast_gallery()
+        self.sync_gallery()
+        return gallery
+    
     def search_similar(self, query_embedding: np.ndarray, threshold: float = 0.5, top_k: int = 5) -> List[Dict]:
         """
         Search similar faces menggunakan cosine similarity.
         
+        Jika PGVECTOR_ENABLED, threshold + top-k dijalankan di PostgreSQL (index cosine).
+        Jika GALLERY_ENABLED, scoring dilakukan di resident gallery (satu matrix-vector
+        product), tanpa query ke database per request.
+        
+        Args:
+            query_embedding: Query embedding vector
+            threshold: Minimum cosine similarity
+            top_k: Number of top results
+            
+        Returns:
+            List of {nim, confidence, photo_path} sorted by confidence
+        """
+        if PGVECTOR_ENABLED:
+            return self._search_similar_pgvector(query_embedding, threshold, top_k)
+        if not GALLERY_ENABLED:
+            return self._search_similar_scan(query_embedding, threshold, top_k)
+        
+        try:
+            results = self.get_gallery().search(query_embedding, threshold, top_k)
+            
+            # Log top results untuk debugging
+            if results:
+                top_3 = results[:3]
+                top_3_str = [(r['nim'], f"{r['confidence']:.4f}") for r in top_3]
+                print(f"[DEBUG] Top 3 matches: {top_3_str}")
+            
+            return results
+        except Exception as e:
+            print(f"Error searching similar faces: {str(e)}")
+            return []
+    
+    def search_similar_batch(self, query_embeddings: List[np.ndarray], threshold: float = 0.5,
+                             top_k: int = 5) -> List[List[Dict]]:
+        """
+        Search similar faces untuk banyak query sekaligus.
+        
+        Dengan resident gallery, semua query di-score dengan matrix-matrix product
+        (per chunk yang dibatasi memory); backend lain fallback ke search per query.
+        
+        Args:
+            query_embeddings: List of query embedding vectors
+            threshold: Minimum cosine similarity
+            top_k: Number of top results per query
+            
+        Returns:
+            List hasil per query: [[{nim, confidence, photo_path}, ...], ...]
+        """
+        if not self.uses_gallery:
+            return [self.search_similar(embedding, threshold, top_k) for embedding in query_embeddings]
+        
+        try:
+            return self.get_gallery().search_batch(query_embeddings, threshold, top_k)
+        except Exception as e:
+            print(f"Error searching similar faces (batch): {str(e)}")
+            return [[] for _ in query_embeddings]
+    
+    def _search_similar_pgvector(self, query_embedding: np.ndarray, threshold: float = 0.5,
+                                 top_k: int = 5) -> List[Dict]:
+        """
+        Search similar faces di PostgreSQL dengan pgvector (ORDER BY embedding <=> query LIMIT k).
+        Worker tidak perlu menyimpan gallery di RAM.
+        """
+        if top_k <= 0 or np.linalg.norm(query_embedding) == 0:
+            return []
+        
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            
+            # Knob recall vs latency untuk index approximate (berlaku hanya di transaksi ini)
+            if PGVECTOR_INDEX_TYPE == "ivfflat":
+                cursor.execute("SET LOCAL ivfflat.probes = %s", (int(PGVECTOR_IVFFLAT_PROBES),))
+            else:
+                cursor.execute("SET LOCAL hnsw.ef_search = %s", (max(int(PGVECTOR_HNSW_EF_SEARCH), top_k),))
+            
+            query_vec = self._to_pgvector(query_embedding)
+            cursor.execute("""
+                SELECT nim, photo_path, similarity FROM (
+                    SELECT nim, photo_path, 1 - (embedding_vec <=> %s::vector) AS similarity
+                    FROM embeddings
+                    WHERE embedding_vec IS NOT NULL
+                    ORDER BY embedding_vec <=> %s::vector
+                    LIMIT %s
+                ) AS candidates
+                WHERE similarity >= %s
+                ORDER BY similarity DESC
+            """, (query_vec, query_vec, top_k, threshold))
+            
+            results = []
+            for nim, photo_path, similarity in cursor.fetchall():
+                results.append({
+                    'nim': nim,
+                    # Clamp to [0, 1] sama seperti exact search
+                    'confidence': max(0.0, min(1.0, float(similarity))),
+                    'photo_path': photo_path
+                })
+            conn.rollback()  # Tutup transaksi read-only (reset SET LOCAL)
+            
+            if results:
+                top_3_str = [(r['nim'], f"{r['confidence']:.4f}") for r in results[:3]]
+                print(f"[DEBUG] Top 3 matches: {top_3_str}")
+            
+            return results
+        except Exception as e:
+            conn.rollback()
+            print(f"Error searching similar faces (pgvector): {str(e)}")
+            return []
+        finally:
+            self._return_connection(conn)
+    
+    def migrate_to_pgvector(self, batch_size: int = PGVECTOR_MIGRATION_BATCH_SIZE, force: bool = False) -> int:
+        """
+        Bulk convert embedding BYTEA yang sudah ada ke kolom vector(512).
+        
+        Args:
+            batch_size: Jumlah row per UPDATE/commit
+            force: Jika True, convert ulang semua row (bukan hanya yang embedding_vec masih NULL)
+            
+        Returns:
+            Jumlah row yang di-convert
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.cursor()
+            self._init_pgvector(cursor)
+            conn.commit()
+            
+            cursor.execute(
+                "SELECT nim FROM embeddings" + ("" if force else " WHERE embedding_vec IS NULL")
+            )
+            nims = [row[0] for row in cursor.fetchall()]
+            
+            converted = 0
+            for start in range(0, len(nims), batch_size):
+                batch_nims = nims[start:start + batch_size]
+                cursor.execute("""
+                    SELECT nim, embedding FROM embeddings WHERE nim = ANY(%s)
+                """, (batch_nims,))
+                values = [
+                    (nim, self._to_pgvector(np.frombuffer(embedding_bytes, dtype=np.float32)))
+                    for nim, embedding_bytes in cursor.fetchall()
+                ]
+                execute_values(cursor, """
+                    UPDATE embeddings AS e
+                    SET embedding_vec = v.vec::vector
+                    FROM (VALUES %s) AS v(nim, vec)
+                    WHERE e.nim = v.nim
+                """, values, page_size=batch_size)
+                conn.commit()
+                converted += len(values)
+                print(f"Migrated {converted}/{len(nims)} embeddings ke pgvector")
+            
+            # IVFFlat centroid dihitung saat index dibuat, jadi rebuild setelah data terisi
+            if PGVECTOR_INDEX_TYPE == "ivfflat" and converted:
+                cursor.execute("REINDEX INDEX idx_embeddings_vec_ivfflat")
+                conn.commit()
+            
+            return converted
+        except Exception as e:
+            conn.rollback()
+            print(f"Error migrating embeddings ke pgvector: {str(e)}")
+            raise
+        finally:
+            self._return_connection(conn)
+    
+    def _search_similar_scan(self, query_embedding: np.ndarray, threshold: float = 0.5, top_k: int = 5) -> List[Dict]:
+        """
+        Search similar faces dengan full table scan (tanpa resident gallery).
+        
         Args:
             query_embedding: Query embedding vector
             threshold: Minimum cosine similarity
@@ -314,7 +1316,7 @@ class FaceDatabase:
             self._return_connection(conn)
     
     def log_recognition(self, nim: str, confidence: float, photo_path: str = None, 
-                      status: str = 'success', session_id: str = None) -> bool:
+                      status: str = 'success', session_id: str = None, tier: str = None) -> bool:
         """
         Log recognition result.
         
@@ -324,6 +1326,7 @@ class FaceDatabase:
             photo_path: Path ke foto yang di-recognize
             status: 'success', 'failed', 'low_confidence'
             session_id: Session ID untuk tracking
+            tier: Tier cascade ('fast' / 'full'); confidence tier 'fast' berskala model cepat
             
         Returns:
             True jika berhasil
@@ -332,9 +1335,9 @@ class FaceDatabase:
         try:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO recognition_logs (nim, confidence, photo_path, status, session_id)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (nim, confidence, photo_path, status, session_id))
+                INSERT INTO recognition_logs (nim, confidence, photo_path, status, session_id, tier)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (nim, confidence, photo_path, status, session_id, tier))
             
             conn.commit()
             return True
@@ -393,10 +1396,27 @@ class FaceDatabase:
             if not cursor.fetchone():
                 return False  # NIM tidak ditemukan
             
-            # Delete the embedding
+            # Delete the embedding + simpan tombstone untuk sync worker lain
             cursor.execute("DELETE FROM embeddings WHERE nim = %s", (nim,))
+            cursor.execute("DELETE FROM encoding_manifest WHERE nim = %s", (nim,))
+            cursor.execute("""
+                INSERT INTO embedding_deletions (nim, version, deleted_at)
+                VALUES (%s, nextval('embeddings_version_seq'), CURRENT_TIMESTAMP)
+                ON CONFLICT (nim)
+                DO UPDATE SET
+                    version = EXCLUDED.version,
+                    deleted_at = CURRENT_TIMESTAMP,
+                    txid = txid_current()
+                RETURNING version
+            """, (nim,))
+            version = cursor.fetchone()[0]
+            self._notify_change(cursor, "delete", nim, version)
             
             conn.commit()
+            
+            if self.gallery is not None:
+                self.gallery.remove(nim)
+            self._apply_fast(nim, None, None)
             return True
         except Exception as e:
             conn.rollback()
@@ -411,9 +1431,9 @@ class FaceDatabase:
         try:
             cursor = conn.cursor()
             
-            # Count embeddings
-            cursor.execute("SELECT COUNT(*) FROM embeddings")
-            total_embeddings = cursor.fetchone()[0]
+            # Count embeddings (dan yang sudah punya embedding_fast untuk cascade)
+            cursor.execute("SELECT COUNT(*), COUNT(embedding_fast) FROM embeddings")
+            total_embeddings, fast_embeddings = cursor.fetchone()
             
             # Count recognition logs
             cursor.execute("SELECT COUNT(*) FROM recognition_logs")
@@ -428,6 +1448,7 @@ class FaceDatabase:
             
             return {
                 'total_embeddings': total_embeddings,
+                'fast_embeddings': fast_embeddings,
                 'total_logs': total_logs,
                 'recent_logs_24h': recent_logs
             }
@@ -439,6 +1460,11 @@ class FaceDatabase:
     
     def close(self):
         """Close connection pool."""
+        self._close_listener()
+        if self.gallery is not None:
+            self.gallery.close()
+        if self.fast_gallery is not None:
+            self.fast_gallery.close()
         if self.connection_pool:
             self.connection_pool.closeall()
             print("Database connection pool closed")
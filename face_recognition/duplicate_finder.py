@@ -0,0 +1,177 @@
+"""
+Batch job: cari pasangan NIM dengan embedding yang sangat mirip di seluruh gallery.
+Pasangan hampir identik biasanya foto yang sama / orang yang sama terdaftar dua kali;
+pasangan di atas threshold tapi tidak identik adalah risiko impostor (dipakai untuk tuning threshold).
+
+Similarity N x N dihitung per tile (GEMM ukuran cache), hanya segitiga atas,
+hasilnya di-stream ke CSV. Default satu worker: BLAS sudah multithread per GEMM.
+Dengan workers > 1 tile dikerjakan paralel dan thread BLAS dibatasi core / workers.
+"""
+import contextlib
+import csv
+import os
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Dict, List, Tuple, Iterator
+
+from face_recognition.config import (
+    DUPLICATE_SIMILARITY_THRESHOLD, DUPLICATE_NEAR_IDENTICAL_THRESHOLD, DUPLICATE_TILE_SIZE,
+    DUPLICATE_WORKERS, DUPLICATE_OUTPUT_PATH
+)
+
+
+def _tiles(n: int, tile_size: int) -> Iterator[Tuple[int, int]]:
+    """Pasangan (row_start, col_start) untuk segitiga atas matrix N x N."""
+    for i in range(0, n, tile_size):
+        for j in range(i, n, tile_size):
+            yield i, j
+
+
+def _score_tile(matrix: np.ndarray, i: int, j: int, tile_size: int,
+                threshold: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Similarity satu tile; return (row_a, row_b, similarity) untuk pasangan >= threshold.
+    Tile diagonal hanya mengambil bagian di atas diagonal (tanpa pasangan diri sendiri / duplikat urutan).
+    """
+    block = matrix[i:i + tile_size] @ matrix[j:j + tile_size].T
+    if i == j:
+        block[np.tril_indices(block.shape[0], m=block.shape[1])] = -1.0
+    rows, cols = np.nonzero(block >= threshold)
+    return rows + i, cols + j, block[rows, cols]
+
+
+def _blas_thread_limit(workers: int):
+    """
+    Context manager yang membatasi thread BLAS menjadi core / workers (threadpoolctl, opsional),
+    supaya workers tile x thread BLAS tidak melebihi jumlah core. workers = 1: tanpa batas.
+    """
+    if workers <= 1:
+        return contextlib.nullcontext()
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        print(f"Warning: threadpoolctl tidak terinstall, {workers} worker x thread BLAS bisa oversubscribe core "
+              f"(pip install threadpoolctl, set OMP_NUM_THREADS / OPENBLAS_NUM_THREADS, atau --workers 1)")
+        return contextlib.nullcontext()
+    return threadpool_limits(limits=max(1, (os.cpu_count() or 1) // workers), user_api="blas")
+
+
+def find_similar_pairs(nims: List[str], embeddings: np.ndarray, output_path: Path,
+                       threshold: float = DUPLICATE_SIMILARITY_THRESHOLD,
+                       near_identical: float = DUPLICATE_NEAR_IDENTICAL_THRESHOLD,
+                       tile_size: int = DUPLICATE_TILE_SIZE,
+                       workers: int = DUPLICATE_WORKERS) -> Dict:
+    """
+    Hitung semua pasangan NIM dengan cosine similarity >= threshold dan tulis ke CSV.
+
+    Args:
+        nims: List NIM (paralel dengan embeddings)
+        embeddings: Matrix (N x D) float32
+        output_path: Lokasi file CSV (nim_a, nim_b, similarity, category)
+        threshold: Minimum similarity yang dicatat
+        near_identical: Similarity minimum untuk kategori 'near_duplicate' (di bawahnya 'impostor_risk')
+        tile_size: Jumlah row per tile
+        workers: Jumlah tile paralel (GEMM numpy melepas GIL); thread BLAS dibagi rata per worker
+
+    Returns:
+        Statistik: jumlah pasangan per kategori, histogram, waktu, throughput
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = np.ascontiguousarray(embeddings / norms)
+    n = len(nims)
+
+    bins = np.linspace(threshold, 1.0, 11)
+    histogram = np.zeros(len(bins) - 1, dtype=np.int64)
+    stats = {'embeddings': n, 'pairs': 0, 'near_duplicate': 0, 'impostor_risk': 0, 'tiles': 0}
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    start = time.time()
+
+    workers = max(1, workers)
+    with open(output_path, "w", newline="", encoding="utf-8") as f, _blas_thread_limit(workers), \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        writer = csv.writer(f)
+        writer.writerow(['nim_a', 'nim_b', 'similarity', 'category'])
+
+        tiles = _tiles(n, tile_size)
+        pending = set()
+        max_in_flight = workers * 2  # Batasi hasil tile yang menunggu ditulis
+
+        while True:
+            for i, j in tiles:
+                pending.add(executor.submit(_score_tile, matrix, i, j, tile_size, threshold))
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rows_a, rows_b, scores = future.result()
+                stats['tiles'] += 1
+                order = np.argsort(-scores, kind="stable")
+                for a, b, score in zip(rows_a[order], rows_b[order], scores[order]):
+                    category = 'near_duplicate' if score >= near_identical else 'impostor_risk'
+                    writer.writerow([nims[a], nims[b], f"{score:.4f}", category])
+                    stats[category] += 1
+                stats['pairs'] += len(scores)
+                if len(scores):
+                    histogram += np.histogram(np.minimum(scores, 1.0), bins=bins)[0]
+
+    elapsed = time.time() - start
+    compared = n * (n - 1) // 2
+    stats.update({
+        'elapsed_seconds': elapsed,
+        'pairs_compared': compared,
+        'pairs_per_second': compared / elapsed if elapsed > 0 else 0.0,
+        'gflops': 2.0 * compared * matrix.shape[1] / elapsed / 1e9 if elapsed > 0 else 0.0,
+        'histogram': [(float(bins[k]), float(bins[k + 1]), int(histogram[k])) for k in range(len(histogram))],
+    })
+    return stats
+
+
+def print_stats(stats: Dict, output_path: Path):
+    """Print ringkasan hasil job."""
+    print("\n" + "=" * 60)
+    print("DUPLICATE / IMPOSTOR PAIR REPORT")
+    print("=" * 60)
+    print(f"Embeddings: {stats['embeddings']}")
+    print(f"Pasangan dibandingkan: {stats['pairs_compared']:,}")
+    print(f"Pasangan di atas threshold: {stats['pairs']} "
+          f"(near_duplicate: {stats['near_duplicate']}, impostor_risk: {stats['impostor_risk']})")
+    print(f"Waktu: {stats['elapsed_seconds']:.2f} s, {stats['pairs_per_second']:,.0f} pasangan/s, "
+          f"~{stats['gflops']:.1f} GFLOP/s ({stats['tiles']} tiles)")
+    if stats['pairs']:
+        print("Distribusi similarity:")
+        for low, high, count in stats['histogram']:
+            print(f"  {low:.3f} - {high:.3f}: {count}")
+    print(f"Output: {output_path}")
+    print("=" * 60)
+
+
+def main(output_path: Path = DUPLICATE_OUTPUT_PATH, threshold: float = DUPLICATE_SIMILARITY_THRESHOLD,
+         workers: int = DUPLICATE_WORKERS):
+    """Jalankan job untuk semua embeddings di database."""
+    from face_recognition.database import FaceDatabase
+
+    db = FaceDatabase()
+    try:
+        embeddings = db.get_all_embeddings()
+    finally:
+        db.close()
+
+    nims = sorted(embeddings)
+    if len(nims) < 2:
+        print("Embeddings kurang dari 2, tidak ada pasangan untuk dicek")
+        return
+
+    matrix = np.stack([embeddings[nim] for nim in nims]).astype(np.float32)
+    print(f"Mencari pasangan similarity >= {threshold} di {len(nims)} embeddings "
+          f"(tile {DUPLICATE_TILE_SIZE}, {workers} workers)...")
+    stats = find_similar_pairs(nims, matrix, output_path, threshold=threshold, workers=workers)
+    print_stats(stats, output_path)
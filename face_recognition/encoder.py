@@ -1,16 +1,18 @@
 """
 ArcFace Encoder untuk generate 512-D embeddings
-VERSI INSIGHTFACE MURNI - Menggunakan embedding langsung dari detection
+VERSI INSIGHTFACE MURNI - model RetinaFace + ArcFace dari InsightFace,
+dijalankan bertahap: detection -> QC (bbox/kps) -> recognition hanya untuk wajah yang lolos QC
 """
 import cv2
 import numpy as np
+from insightface.utils import face_align
 from typing import Optional, Tuple, Any, List, Dict
-import insightface
-from insightface.app import FaceAnalysis
 
+from face_recognition import model_registry, inference_scheduler
 from face_recognition.config import (
     ARCFACE_MODEL_NAME, ARCFACE_EMBEDDING_SIZE, MODELS_DIR,
-    RETINAFACE_CONFIDENCE_THRESHOLD
+    RETINAFACE_CONFIDENCE_THRESHOLD, INFERENCE_BATCHING_ENABLED,
+    CASCADE_ENABLED, CASCADE_FAST_MODEL_NAME
 )
 from face_recognition.quality_checker import (
     quality_check_lightweight,
@@ -25,22 +27,50 @@ class ArcFaceEncoder:
     VERSI INSIGHTFACE MURNI - embedding langsung dari detection untuk konsistensi maksimal.
     """
     
-    def __init__(self):
-        """Initialize ArcFace model."""
-        self.model = None
+    def __init__(self, batching: bool = INFERENCE_BATCHING_ENABLED, cascade: bool = CASCADE_ENABLED):
+        """
+        Initialize ArcFace model.
+        
+        Args:
+            batching: Lewatkan recognition lewat micro-batching scheduler (untuk API dengan
+                      banyak request concurrent). Batch job single-thread sebaiknya False.
+            cascade: Load juga recognizer cepat CASCADE_FAST_MODEL_NAME (embed_face_fast)
+        """
+        self.det_model = None  # RetinaFace (detection only)
+        self.rec_model = None  # ArcFace (recognition only)
+        self.fast_rec_model = None  # Recognizer cascade (MobileFaceNet), crop aligned yang sama
+        self.batching = batching
         self._load_model()
+        if cascade and CASCADE_FAST_MODEL_NAME != ARCFACE_MODEL_NAME:
+            self.fast_rec_model = model_registry.get_recognizer(CASCADE_FAST_MODEL_NAME)
+        if batching:
+            # Buat batcher sekarang (bukan saat request pertama)
+            inference_scheduler.get_batcher(ARCFACE_MODEL_NAME)
+            if self.fast_rec_model is not None:
+                inference_scheduler.get_batcher(CASCADE_FAST_MODEL_NAME)
+
+    @property
+    def batcher(self):
+        """Batcher process-wide saat ini (diambil ulang: model_registry.reset() menggantinya)."""
+        return inference_scheduler.get_batcher(ARCFACE_MODEL_NAME) if self.batching else None
+
+    @property
+    def fast_batcher(self):
+        """Batcher recognizer cascade, None jika batching atau cascade tidak aktif."""
+        if not self.batching or self.fast_rec_model is None:
+            return None
+        return inference_scheduler.get_batcher(CASCADE_FAST_MODEL_NAME)
     
     def _load_model(self):
-        """Load ArcFace model dari InsightFace."""
+        """
+        Ambil detector + recognizer dari model registry (load sekali per proses).
+        Membuat ArcFaceEncoder baru tidak me-load ulang ONNX session.
+        """
         try:
             # InsightFace akan auto-download model jika belum ada
             # Model akan disimpan di ~/.insightface/models/
-            self.model = FaceAnalysis(
-                name=ARCFACE_MODEL_NAME,
-                providers=['CPUExecutionProvider']  # Bisa ganti ke CUDAExecutionProvider untuk GPU
-            )
-            self.model.prepare(ctx_id=-1, det_size=(640, 640))
-            print(f"ArcFace model '{ARCFACE_MODEL_NAME}' loaded successfully")
+            self.det_model = model_registry.get_detector(ARCFACE_MODEL_NAME)
+            self.rec_model = model_registry.get_recognizer(ARCFACE_MODEL_NAME)
         except Exception as e:
             raise RuntimeError(f"Gagal load ArcFace model: {str(e)}")
 
@@ -67,23 +97,133 @@ class ArcFaceEncoder:
         except Exception:
             return None
 
-    def detect_faces(self, image_bgr: np.ndarray) -> List[Any]:
-        """Return all detected faces from InsightFace."""
+    def detect_faces(self, image_bgr: np.ndarray, det_size: Optional[Tuple[int, int]] = None,
+                     face_scale_hint: Optional[float] = None) -> List[Any]:
+        """
+        Detection only (RetinaFace): return semua wajah dengan bbox, kps, det_score.
+        Recognition TIDAK dijalankan di sini (face.normed_embedding masih None);
+        panggil embed_face() untuk wajah yang dipilih setelah QC.
+
+        Args:
+            image_bgr: Image BGR
+            det_size: Override input size detector (mis. UI_DET_SIZE untuk feedback UI)
+            face_scale_hint: Skala wajah frame sebelumnya (FaceScaleTracker) untuk input size adaptif
+        """
         try:
-            faces = self.model.get(image_bgr)
-            return list(faces) if faces is not None else []
+            return model_registry.detect_faces(image_bgr, det_size=det_size, pack=ARCFACE_MODEL_NAME,
+                                               face_scale_hint=face_scale_hint)
         except Exception:
             return []
 
+    def embed_face(self, image_bgr: np.ndarray, face: Any) -> Optional[np.ndarray]:
+        """
+        Recognition only (ArcFace) untuk satu wajah hasil detect_faces():
+        align 5-point kps -> crop 112x112 -> embedding L2-normalized.
+
+        Args:
+            image_bgr: Image asli (BGR) tempat wajah dideteksi
+            face: Face dengan kps (dari detect_faces)
+
+        Returns:
+            512-D embedding (normalized) atau None jika gagal
+        """
+        return self._embed_face(image_bgr, face, self.rec_model, self.batcher)
+
+    def embed_face_fast(self, image_bgr: np.ndarray, face: Any) -> Optional[np.ndarray]:
+        """
+        Seperti embed_face, tetapi dengan recognizer cascade cepat (CASCADE_FAST_MODEL_NAME).
+
+        Returns:
+            512-D embedding (normalized), None jika cascade tidak aktif atau gagal
+        """
+        if self.fast_rec_model is None:
+            return None
+        return self._embed_face(image_bgr, face, self.fast_rec_model, self.fast_batcher)
+
+    def _embed_face(self, image_bgr: np.ndarray, face: Any, rec_model, batcher) -> Optional[np.ndarray]:
+        try:
+            if getattr(face, "kps", None) is None:
+                return None
+            if batcher is not None:
+                # Align di thread request, forward pass digabung dengan request lain
+                face.embedding = batcher.embed(self.align_face(image_bgr, face))
+            else:
+                rec_model.get(image_bgr, face)
+            embedding = face.normed_embedding
+            if embedding is None:
+                return None
+            embedding = np.array(embedding, dtype=np.float32)
+            if len(embedding) != ARCFACE_EMBEDDING_SIZE:
+                print(f"Warning: Unexpected embedding size {len(embedding)}, expected {ARCFACE_EMBEDDING_SIZE}")
+                return None
+            return embedding
+        except Exception as e:
+            print(f"Error embedding face: {str(e)}")
+            return None
+
+    def align_face(self, image_bgr: np.ndarray, face: Any) -> np.ndarray:
+        """
+        Align 5-point kps -> crop input recognizer (112x112 BGR), sama dengan rec_model.get.
+
+        Args:
+            image_bgr: Image asli (BGR) tempat wajah dideteksi
+            face: Face dengan kps (dari detect_faces)
+
+        Returns:
+            Aligned crop
+        """
+        return face_align.norm_crop(image_bgr, landmark=face.kps, image_size=self.rec_model.input_size[0])
+
+    def embed_aligned_batch(self, aligned_faces: List[np.ndarray], fast: bool = False) -> np.ndarray:
+        """
+        Recognition batched: satu forward pass untuk banyak crop hasil align_face().
+
+        Args:
+            aligned_faces: List crop aligned (112x112 BGR)
+            fast: Pakai recognizer cascade cepat (harus sudah di-load)
+
+        Returns:
+            Matrix (N x 512) embedding L2-normalized (row nol jika norm nol)
+        """
+        if not aligned_faces:
+            return np.zeros((0, ARCFACE_EMBEDDING_SIZE), dtype=np.float32)
+        rec_model = self.fast_rec_model if fast else self.rec_model
+        feats = np.asarray(rec_model.get_feat(aligned_faces), dtype=np.float32)
+        feats = feats.reshape(len(aligned_faces), -1)
+        norms = np.linalg.norm(feats, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return feats / norms
+
     def encode_with_qc(self, image_bgr: np.ndarray, mode: str = "lightweight") -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
         """
         Encode with Quality Control.
+        Urutan: detection -> QC pada bbox/kps -> recognition hanya untuk wajah terpilih,
+        sehingga frame yang gagal QC tidak menjalankan ArcFace sama sekali.
         mode:
           - 'lightweight' for real-time
           - 'strict' for database/registrasi
         Returns: (embedding|None, qc_info|None)
         """
-        faces = self.detect_faces(image_bgr)
+        face, qc = self.detect_with_qc(image_bgr, mode)
+        if face is None:
+            return None, qc
+
+        embedding = self.embed_face(image_bgr, face)
+        if embedding is None:
+            qc = {"ok": False, "reason": "no_face", "user_message": user_message_for_reason("no_face"), "details": {"why": "no_embedding"}}
+            return None, qc
+
+        return embedding, qc
+
+    def detect_with_qc(self, image_bgr: np.ndarray, mode: str = "lightweight",
+                       face_scale_hint: Optional[float] = None) -> Tuple[Optional[Any], Dict[str, Any]]:
+        """
+        Detection + QC tanpa recognition (mis. cascade yang memilih recognizer sendiri).
+        face_scale_hint: lihat detect_faces (frame real-time; None = det_size penuh)
+
+        Returns: (face terpilih|None, qc_info)
+        """
+        faces = self.detect_faces(image_bgr, face_scale_hint=face_scale_hint)
         if len(faces) == 0:
             qc = {"ok": False, "reason": "no_face", "user_message": user_message_for_reason("no_face"), "details": {"num_faces": 0}}
             return None, qc
@@ -97,18 +237,7 @@ class ArcFaceEncoder:
             qc = {"ok": False, "reason": reason, "user_message": user_message_for_reason(reason), "details": details}
             return None, qc
 
-        embedding = getattr(face, "normed_embedding", None)
-        if embedding is None:
-            qc = {"ok": False, "reason": "no_face", "user_message": user_message_for_reason("no_face"), "details": {"why": "no_embedding"}}
-            return None, qc
-
-        embedding = np.array(embedding, dtype=np.float32)
-        if len(embedding) != ARCFACE_EMBEDDING_SIZE:
-            qc = {"ok": False, "reason": "no_face", "user_message": user_message_for_reason("no_face"), "details": {"why": "bad_embedding_size", "size": len(embedding)}}
-            return None, qc
-
-        qc = {"ok": True, "reason": "ok", "user_message": "ok", "details": details}
-        return embedding, qc
+        return face, {"ok": True, "reason": "ok", "user_message": "ok", "details": details}
     
     def encode_from_path(self, image_path: str) -> Optional[np.ndarray]:
         """
@@ -138,8 +267,8 @@ class ArcFaceEncoder:
     
     def encode_from_array(self, image: np.ndarray) -> Optional[np.ndarray]:
         """
-        CARA YANG BENAR: Detection → Embedding langsung dari InsightFace.
-        InsightFace handle semua alignment secara internal, tidak ada custom preprocessing.
+        CARA YANG BENAR: Detection → Embedding dari InsightFace.
+        Alignment 5-point dilakukan oleh recognition model InsightFace, tidak ada custom preprocessing.
         
         Args:
             image: Image array (BGR format)
@@ -148,12 +277,8 @@ class ArcFaceEncoder:
             512-D embedding vector (normalized) atau None jika gagal
         """
         try:
-            # Detect faces dengan InsightFace
-            # InsightFace.get() akan:
-            # 1. Detect dengan RetinaFace
-            # 2. Align secara internal dengan 5-point similarity transform
-            # 3. Generate embedding yang sudah aligned & normalized
-            faces = self.model.get(image)
+            # 1. Detect dengan RetinaFace (tanpa recognition)
+            faces = self.detect_faces(image)
             
             if len(faces) == 0:
                 return None
@@ -165,26 +290,11 @@ class ArcFaceEncoder:
             if best_face.det_score < RETINAFACE_CONFIDENCE_THRESHOLD:
                 return None
             
-            # Ambil embedding langsung dari InsightFace
-            # normed_embedding sudah:
+            # 2. Recognition hanya untuk wajah terpilih:
             # - Aligned dengan similarity transform (5-point)
             # - Cropped ke 112x112
-            # - Normalized
             # - L2 normalized
-            embedding = best_face.normed_embedding
-            
-            if embedding is None:
-                return None
-            
-            # Ensure it's numpy array with correct shape
-            embedding = np.array(embedding, dtype=np.float32)
-            
-            # Verify embedding size
-            if len(embedding) != ARCFACE_EMBEDDING_SIZE:
-                print(f"Warning: Unexpected embedding size {len(embedding)}, expected {ARCFACE_EMBEDDING_SIZE}")
-                return None
-            
-            return embedding
+            return self.embed_face(image, best_face)
             
         except Exception as e:
             print(f"Error encoding from array: {str(e)}")
@@ -209,28 +319,19 @@ class ArcFaceEncoder:
             512-D embedding vector (normalized) atau None jika gagal
         """
         try:
-            # Coba gunakan recognition model langsung
-            rec_model = self.model.models.get('recognition')
-            if rec_model is None:
-                # Fallback: convert ke uint8 dan detect ulang
-                face_uint8 = ((preprocessed_face * 128.0) + 127.5).astype(np.uint8)
-                face_bgr_uint8 = cv2.cvtColor(face_uint8, cv2.COLOR_RGB2BGR)
-                faces = self.model.get(face_bgr_uint8)
-                if len(faces) > 0:
-                    embedding = faces[0].normed_embedding
-                else:
-                    return None
-            else:
-                # Convert RGB ke BGR untuk recognition model
-                face_bgr = preprocessed_face[:, :, ::-1]  # RGB to BGR
-                
-                # Prepare input: CHW format, add batch dimension
-                face_chw = np.transpose(face_bgr, (2, 0, 1))  # HWC to CHW
-                face_batch = np.expand_dims(face_chw, axis=0)  # Add batch dimension
-                
-                # Get embedding directly from recognition model
-                embedding = rec_model.forward(face_batch)
-                embedding = embedding[0]  # Remove batch dimension
+            # Gunakan recognition model langsung
+            rec_model = self.rec_model
+            
+            # Convert RGB ke BGR untuk recognition model
+            face_bgr = preprocessed_face[:, :, ::-1]  # RGB to BGR
+            
+            # Prepare input: CHW format, add batch dimension
+            face_chw = np.transpose(face_bgr, (2, 0, 1))  # HWC to CHW
+            face_batch = np.expand_dims(face_chw, axis=0)  # Add batch dimension
+            
+            # Get embedding directly from recognition model
+            embedding = rec_model.forward(face_batch)
+            embedding = embedding[0]  # Remove batch dimension
             
             if embedding is None:
                 return None
@@ -0,0 +1,630 @@
+"""
+In-memory gallery untuk face recognition embeddings.
+Semua embedding disimpan sebagai satu matrix float32 (N x 512) yang sudah L2-normalized,
+sehingga cosine similarity ke seluruh gallery = satu matrix-vector product.
+
+Mode compact (float16 / int8): first-pass scan memakai codes di RAM, lalu beberapa ratus
+kandidat teratas di-rerank exact dengan float32 dari file memory-mapped.
+Mode pq: codes product quantization (M bytes per NIM), rerank dari embedding asli di database.
+"""
+import os
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Optional, List, Dict, Iterable, Tuple, Callable
+
+from face_recognition.config import (
+    ARCFACE_EMBEDDING_SIZE, GALLERY_BATCH_MAX_SCORE_BYTES, GALLERY_RERANK_CANDIDATES,
+    GALLERY_STORE_DIR
+)
+from face_recognition.pq import ProductQuantizer
+
+
+GALLERY_DTYPES = ("float32", "float16", "int8", "pq")
+
+# Jumlah row per blok saat decode codes compact ke float32 (menjaga buffer sementara tetap kecil)
+_DECODE_BLOCK_ROWS = 16384
+
+# POSIX: file memory-mapped di-unlink begitu di-map (mapping tetap valid, disk dibebaskan saat
+# proses exit / crash). Windows tidak bisa menghapus file yang sedang di-map.
+_UNLINK_AFTER_MAP = os.name != "nt"
+_cleaned_store_dirs: set = set()
+
+
+def _remove_stale_stores(store_dir: Path):
+    """
+    Hapus file gallery_f32_* milik proses lain yang sudah mati (crash / kill sebelum close(),
+    atau Windows). File yang masih di-map proses hidup tidak bisa dihapus di Windows, dan di
+    POSIX menghapusnya tidak mengganggu mapping yang ada.
+    """
+    if store_dir in _cleaned_store_dirs:
+        return
+    _cleaned_store_dirs.add(store_dir)
+    prefix = f"gallery_f32_{os.getpid()}_"
+    for path in store_dir.glob("gallery_f32_*.dat"):
+        if path.name.startswith(prefix):
+            continue
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+class EmbeddingGallery:
+    """
+    Resident gallery: matrix embeddings (pre-normalized) + index NIM/photo_path paralel.
+
+    Row yang dihapus tidak langsung dipadatkan; row tersebut ditandai kosong
+    dan dipakai ulang oleh insert berikutnya, sehingga nomor row tetap stabil.
+    """
+
+    def __init__(self, dim: int = ARCFACE_EMBEDDING_SIZE, capacity: int = 0,
+                 dtype: str = "float32", store_dir: Optional[Path] = None,
+                 rerank_candidates: int = GALLERY_RERANK_CANDIDATES,
+                 pq: Optional[ProductQuantizer] = None,
+                 exact_loader: Optional[Callable[[List[str]], Dict[str, np.ndarray]]] = None):
+        """
+        Initialize gallery kosong.
+
+        Args:
+            dim: Dimensi embedding
+            capacity: Kapasitas awal (row)
+            dtype: 'float32' (exact, semua di RAM), 'float16' / 'int8' (compact + rerank mmap),
+                   atau 'pq' (product quantization + rerank dari database)
+            store_dir: Directory file float32 memory-mapped (mode float16 / int8)
+            rerank_candidates: Jumlah kandidat first-pass yang di-rerank exact (mode compact)
+            pq: ProductQuantizer yang sudah di-train (wajib untuk mode pq)
+            exact_loader: Mode pq: fungsi list NIM -> {nim: embedding float32 asli}
+        """
+        if dtype not in GALLERY_DTYPES:
+            raise ValueError(f"Gallery dtype tidak didukung: {dtype}. Pilih salah satu: {GALLERY_DTYPES}")
+
+        self.dim = dim
+        self.dtype = dtype
+        self.rerank_candidates = rerank_candidates
+        self._store_dir = Path(store_dir) if store_dir else GALLERY_STORE_DIR
+        self._store_generation = 0
+        self._pq = pq
+        self._exact_loader = exact_loader
+
+        self._matrix = self._allocate_matrix(max(0, capacity))
+        if self._matrix is not None:
+            capacity = self._matrix.shape[0]
+        self._codes = None
+        self._scales = None
+        if dtype == "pq":
+            if pq is None or not pq.is_trained or pq.dim != dim:
+                raise ValueError("Gallery mode 'pq' butuh ProductQuantizer yang sudah di-train")
+            self._codes = np.zeros((capacity, pq.code_size), dtype=np.uint8)
+        elif self.quantized:
+            self._codes = np.zeros((capacity, dim), dtype=np.float16 if dtype == "float16" else np.int8)
+            if dtype == "int8":
+                self._scales = np.zeros(capacity, dtype=np.float32)
+
+        self._size = 0
+        self._nims: List[Optional[str]] = []
+        self._photo_paths: List[Optional[str]] = []
+        self._row_of: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._listeners: List = []
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, bytes, Optional[str]]],
+                  dim: int = ARCFACE_EMBEDDING_SIZE, dtype: str = "float32", **kwargs) -> "EmbeddingGallery":
+        """
+        Build gallery dari rows (nim, embedding_bytes, photo_path) hasil query database.
+
+        Args:
+            rows: Iterable of (nim, embedding BYTEA, photo_path)
+            dim: Dimensi embedding
+            dtype: Representasi gallery ('float32', 'float16', 'int8', 'pq')
+            **kwargs: Diteruskan ke constructor (pq, exact_loader, ...)
+
+        Returns:
+            EmbeddingGallery yang sudah terisi
+        """
+        rows = list(rows)
+        gallery = cls(dim=dim, capacity=len(rows), dtype=dtype, **kwargs)
+        for nim, embedding_bytes, photo_path in rows:
+            embedding = np.frombuffer(embedding_bytes, dtype=np.float32)
+            gallery.upsert(nim, embedding, photo_path)
+        return gallery
+
+    @classmethod
+    def from_snapshot(cls, snapshot) -> "EmbeddingGallery":
+        """
+        Build gallery float32 di atas GallerySnapshot tanpa copy matrix.
+        Matrix tetap memory-mapped (copy-on-write): worker yang membuka snapshot yang sama
+        berbagi page cache, hanya page yang di-update incremental menjadi private.
+
+        Args:
+            snapshot: GallerySnapshot yang sudah dibuka
+
+        Returns:
+            EmbeddingGallery (dtype float32)
+        """
+        gallery = cls(dim=snapshot.dim, capacity=0)
+        gallery._matrix = snapshot.matrix
+        gallery._size = snapshot.count
+        gallery._nims = list(snapshot.nims)
+        gallery._photo_paths = list(snapshot.photo_paths)
+        gallery._row_of = {nim: row for row, nim in enumerate(gallery._nims)}
+        return gallery
+
+    @staticmethod
+    def normalize(embedding: np.ndarray) -> Optional[np.ndarray]:
+        """L2-normalize embedding. Return None jika norm = 0."""
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(embedding)
+        if norm == 0:
+            return None
+        return embedding / norm
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, nim: str) -> bool:
+        return nim in self._row_of
+
+    @property
+    def quantized(self) -> bool:
+        """True jika first-pass memakai codes compact (float16 / int8 / pq)."""
+        return self.dtype != "float32"
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """View matrix float32 (termasuk row kosong, yang berisi nol)."""
+        if self._matrix is None:
+            raise RuntimeError("Gallery mode pq tidak menyimpan matrix float32")
+        return self._matrix[:self._size]
+
+    @property
+    def lock(self) -> threading.RLock:
+        """Lock gallery (dipakai listener yang perlu snapshot konsisten)."""
+        return self._lock
+
+    @property
+    def nims(self) -> List[Optional[str]]:
+        """NIM per row (None untuk row kosong)."""
+        return self._nims
+
+    @property
+    def photo_paths(self) -> List[Optional[str]]:
+        """Photo path per row (None untuk row kosong)."""
+        return self._photo_paths
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Ukuran (bytes) data gallery di RAM vs di file memory-mapped."""
+        ram = 0
+        if self._codes is not None:
+            ram += self._codes.nbytes
+        if self._scales is not None:
+            ram += self._scales.nbytes
+        if self._matrix is None:
+            return {'ram_bytes': ram, 'mmap_bytes': 0}
+        matrix_bytes = self._matrix.nbytes
+        if isinstance(self._matrix, np.memmap):
+            return {'ram_bytes': ram, 'mmap_bytes': matrix_bytes}
+        return {'ram_bytes': ram + matrix_bytes, 'mmap_bytes': 0}
+
+    def add_listener(self, listener):
+        """
+        Register listener (mis. ANN index) yang dipanggil setiap row berubah.
+        Listener harus punya method on_upsert(row, normed_embedding) dan on_remove(row).
+        """
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Unregister listener."""
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def row_of(self, nim: str) -> Optional[int]:
+        """Get nomor row untuk NIM, atau None jika tidak ada."""
+        return self._row_of.get(nim)
+
+    def _capacity(self) -> int:
+        """Kapasitas row saat ini."""
+        return self._matrix.shape[0] if self._matrix is not None else self._codes.shape[0]
+
+    def _allocate_matrix(self, capacity: int) -> Optional[np.ndarray]:
+        """
+        Allocate matrix float32. Mode compact: file memory-mapped (page cache, bukan heap proses),
+        karena float32 hanya dibaca untuk rerank kandidat. Mode pq: tidak ada matrix float32.
+        """
+        if self.dtype == "pq":
+            return None
+        if not self.quantized:
+            return np.zeros((capacity, self.dim), dtype=np.float32)
+
+        self._store_dir.mkdir(parents=True, exist_ok=True)
+        _remove_stale_stores(self._store_dir)
+        self._store_generation += 1
+        path = self._store_dir / f"gallery_f32_{os.getpid()}_{id(self)}_{self._store_generation}.dat"
+        # np.memmap tidak bisa membuat file kosong, minimal 1 row
+        matrix = np.memmap(path, dtype=np.float32, mode="w+", shape=(max(1, capacity), self.dim))
+        if _UNLINK_AFTER_MAP:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Sudah dihapus _remove_stale_stores proses lain
+        return matrix
+
+    def _release_store(self, matrix: np.ndarray):
+        """Hapus file memory-mapped lama (jika ada). Snapshot bersama (mode 'c') tidak dihapus."""
+        if _UNLINK_AFTER_MAP:
+            return  # Sudah di-unlink saat allocate; mapping dilepas bersama array
+        if isinstance(matrix, np.memmap) and matrix.filename and matrix.mode != "c":
+            filename = matrix.filename
+            del matrix
+            try:
+                os.remove(filename)
+            except OSError:
+                # Windows: file masih di-map oleh view lain, biarkan
+                pass
+
+    def _grow(self):
+        """Perbesar kapasitas matrix (amortized doubling)."""
+        new_capacity = max(16, self._capacity() * 2)
+        if self._matrix is not None:
+            old_matrix = self._matrix
+            new_matrix = self._allocate_matrix(new_capacity)
+            new_matrix[:self._size] = old_matrix[:self._size]
+            self._matrix = new_matrix
+            self._release_store(old_matrix)
+
+        if self._codes is not None:
+            new_codes = np.zeros((new_capacity, self._codes.shape[1]), dtype=self._codes.dtype)
+            new_codes[:self._size] = self._codes[:self._size]
+            self._codes = new_codes
+        if self._scales is not None:
+            new_scales = np.zeros(new_capacity, dtype=np.float32)
+            new_scales[:self._size] = self._scales[:self._size]
+            self._scales = new_scales
+
+    def _encode_row(self, row: int, normed: Optional[np.ndarray]):
+        """Tulis codes compact untuk row (None = kosongkan)."""
+        if self._codes is None:
+            return
+        if normed is None:
+            self._codes[row] = 0
+            if self._scales is not None:
+                self._scales[row] = 0.0
+        elif self.dtype == "pq":
+            self._codes[row] = self._pq.encode(normed)[0]
+        elif self.dtype == "float16":
+            self._codes[row] = normed.astype(np.float16)
+        else:
+            # Symmetric int8 dengan scale per vector
+            max_abs = float(np.max(np.abs(normed)))
+            scale = max_abs / 127.0 if max_abs > 0 else 1.0
+            self._codes[row] = np.clip(np.rint(normed / scale), -127, 127).astype(np.int8)
+            self._scales[row] = scale
+
+    def upsert(self, nim: str, embedding: np.ndarray, photo_path: Optional[str] = None) -> Optional[int]:
+        """
+        Insert atau update embedding untuk NIM.
+
+        Returns:
+            Nomor row, atau None jika embedding tidak valid (norm = 0 / dimensi salah)
+        """
+        normed = self.normalize(embedding)
+        if normed is None or normed.shape[0] != self.dim:
+            self.remove(nim)
+            return None
+
+        with self._lock:
+            row = self._row_of.get(nim)
+            if row is None:
+                if self._free:
+                    row = self._free.pop()
+                else:
+                    if self._size >= self._capacity():
+                        self._grow()
+                    row = self._size
+                    self._size += 1
+                    self._nims.append(None)
+                    self._photo_paths.append(None)
+                self._row_of[nim] = row
+            if self._matrix is not None:
+                self._matrix[row] = normed
+            self._encode_row(row, normed)
+            self._nims[row] = nim
+            self._photo_paths[row] = photo_path
+            for listener in self._listeners:
+                listener.on_upsert(row, normed)
+            return row
+
+    def remove(self, nim: str) -> bool:
+        """Hapus NIM dari gallery. Return True jika NIM ada."""
+        with self._lock:
+            row = self._row_of.pop(nim, None)
+            if row is None:
+                return False
+            if self._matrix is not None:
+                self._matrix[row] = 0.0
+            self._encode_row(row, None)
+            self._nims[row] = None
+            self._photo_paths[row] = None
+            self._free.append(row)
+            for listener in self._listeners:
+                listener.on_remove(row)
+            return True
+
+    def close(self):
+        """Lepas file memory-mapped (mode compact)."""
+        with self._lock:
+            self._release_store(self._matrix)
+            if self._matrix is not None:
+                self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            if self._codes is not None:
+                self._codes = self._codes[:0]
+            self._size = 0
+            self._nims, self._photo_paths = [], []
+            self._row_of, self._free = {}, []
+
+    def _scores(self, query_normed: np.ndarray) -> np.ndarray:
+        """Cosine similarity (exact, float32) query ke semua row, clamp [0, 1]; row kosong = -1."""
+        scores = self._matrix[:self._size] @ query_normed
+        np.clip(scores, 0.0, 1.0, out=scores)
+        if self._free:
+            scores[self._free] = -1.0
+        return scores
+
+    def _approx_scores(self, query_normed: np.ndarray) -> np.ndarray:
+        """First-pass score dari codes compact (di-decode per blok / ADC lookup table); row kosong = -1."""
+        n = self._size
+        if self.dtype == "pq":
+            scores = self._pq.adc_scores(query_normed, self._codes[:n])
+        else:
+            scores = np.empty(n, dtype=np.float32)
+            for start in range(0, n, _DECODE_BLOCK_ROWS):
+                end = min(n, start + _DECODE_BLOCK_ROWS)
+                scores[start:end] = self._codes[start:end].astype(np.float32) @ query_normed
+            if self._scales is not None:
+                scores *= self._scales[:n]
+        if self._free:
+            scores[self._free] = -1.0
+        return scores
+
+    def _load_exact(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Mode pq: ambil embedding float32 asli (via exact_loader, mis. BYTEA di database).
+
+        Returns:
+            (vectors normalized (R x D), mask row yang ditemukan)
+        """
+        nims = [self._nims[row] for row in rows]
+        originals = {}
+        if self._exact_loader is not None:
+            originals = self._exact_loader([nim for nim in nims if nim is not None])
+
+        vectors = np.zeros((len(rows), self.dim), dtype=np.float32)
+        found = np.zeros(len(rows), dtype=bool)
+        for i, nim in enumerate(nims):
+            embedding = originals.get(nim) if nim is not None else None
+            normed = self.normalize(embedding) if embedding is not None else None
+            if normed is not None and normed.shape[0] == self.dim:
+                vectors[i] = normed
+                found[i] = True
+        return vectors, found
+
+    def _row_scores(self, query_normed: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Cosine similarity (exact, float32) query ke subset row, clamp [0, 1]; row kosong = -1."""
+        if self._matrix is None:
+            vectors, found = self._load_exact(rows)
+            scores = vectors @ query_normed
+            np.clip(scores, 0.0, 1.0, out=scores)
+            scores[~found] = -1.0
+            return scores
+
+        scores = self._matrix[rows] @ query_normed
+        np.clip(scores, 0.0, 1.0, out=scores)
+        if self._free:
+            scores[np.isin(rows, self._free)] = -1.0
+        return scores
+
+    def _shortlist(self, approx_scores: np.ndarray, top_k: int) -> np.ndarray:
+        """Ambil row kandidat teratas dari first-pass untuk di-rerank exact."""
+        n = len(approx_scores)
+        r = min(n, max(self.rerank_candidates, top_k))
+        if r < n:
+            return np.argpartition(-approx_scores, r - 1)[:r]
+        return np.arange(n)
+
+    def search(self, query_embedding: np.ndarray, threshold: float = 0.5, top_k: int = 5,
+               rows: Optional[np.ndarray] = None, exact: bool = False) -> List[Dict]:
+        """
+        Search top-k wajah paling mirip dengan satu matrix-vector product + argpartition.
+
+        Args:
+            query_embedding: Query embedding vector
+            threshold: Minimum cosine similarity
+            top_k: Number of top results
+            rows: Optional subset row kandidat (mis. shortlist dari ANN index).
+                  Scoring tetap exact sehingga confidence sama dengan full search.
+            exact: Mode compact: paksa full scan float32 (tanpa first-pass codes).
+                   Diabaikan di mode pq (tidak ada float32 di memory).
+
+        Returns:
+            List of {nim, confidence, photo_path} sorted by confidence (descending)
+        """
+        query_normed = self.normalize(query_embedding)
+        if query_normed is None or top_k <= 0:
+            return []
+
+        with self._lock:
+            use_shortlist = self.quantized and (not exact or self._matrix is None)
+            if rows is None and use_shortlist and self._size > 0:
+                rows = self._shortlist(self._approx_scores(query_normed), top_k)
+
+            if rows is None:
+                n = self._size
+                if n == 0:
+                    return []
+                scores = self._scores(query_normed)
+                row_ids = None
+            else:
+                row_ids = np.asarray(rows, dtype=np.int64)
+                row_ids = np.sort(row_ids[row_ids < self._size])  # urut -> akses mmap sekuensial
+                n = len(row_ids)
+                if n == 0:
+                    return []
+                scores = self._row_scores(query_normed, row_ids)
+
+            k = min(top_k, n)
+            if k < n:
+                top_idx = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top_idx = np.arange(n)
+            top_idx = top_idx[np.argsort(-scores[top_idx], kind="stable")]
+
+            top_rows = top_idx if row_ids is None else row_ids[top_idx]
+            return self._build_results(top_rows, scores[top_idx], threshold)
+
+    def _build_results(self, rows: np.ndarray, scores: np.ndarray, threshold: float) -> List[Dict]:
+        """Convert row + score (sudah urut descending) ke list dict, berhenti di bawah threshold."""
+        results = []
+        for row, score in zip(rows, scores):
+            confidence = float(score)
+            if confidence < threshold:
+                break
+            results.append({
+                'nim': self._nims[row],
+                'confidence': confidence,
+                'photo_path': self._photo_paths[row]
+            })
+        return results
+
+    def _block_scores(self, block: np.ndarray, n: int, exact: bool) -> np.ndarray:
+        """Score (chunk x N) untuk blok query: float32 exact, atau first-pass dari codes compact."""
+        if exact or not self.quantized:
+            return block @ self._matrix[:n].T
+
+        scores = np.empty((len(block), n), dtype=np.float32)
+        for start in range(0, n, _DECODE_BLOCK_ROWS):
+            end = min(n, start + _DECODE_BLOCK_ROWS)
+            scores[:, start:end] = block @ self._codes[start:end].astype(np.float32).T
+        if self._scales is not None:
+            scores *= self._scales[:n]
+        return scores
+
+    def search_batch(self, query_embeddings, threshold: float = 0.5, top_k: int = 5,
+                     max_chunk_bytes: int = GALLERY_BATCH_MAX_SCORE_BYTES,
+                     exact: bool = False) -> List[List[Dict]]:
+        """
+        Search banyak query sekaligus: satu matrix-matrix product per chunk + top-k per row.
+
+        Args:
+            query_embeddings: List / array (Q x D) query embeddings
+            threshold: Minimum cosine similarity
+            top_k: Number of top results per query
+            max_chunk_bytes: Batas memory matrix score (chunk x N float32) per GEMM
+            exact: Mode compact: paksa full scan float32 (tanpa first-pass codes)
+
+        Returns:
+            List hasil per query, format sama dengan search()
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dim)
+        num_queries = queries.shape[0]
+        results: List[List[Dict]] = [[] for _ in range(num_queries)]
+        if num_queries == 0 or top_k <= 0:
+            return results
+
+        if self.dtype == "pq":
+            # ADC lookup table per query, tidak bisa digabung jadi satu GEMM
+            return [self.search(query, threshold, top_k) for query in queries]
+
+        norms = np.linalg.norm(queries, axis=1)
+        valid = norms > 0
+        queries_normed = np.zeros_like(queries)
+        queries_normed[valid] = queries[valid] / norms[valid, None]
+        rerank = self.quantized and not exact
+
+        with self._lock:
+            n = self._size
+            if n == 0:
+                return results
+            # Mode compact: ambil shortlist per query, lalu rerank exact float32
+            k = min(max(self.rerank_candidates, top_k) if rerank else top_k, n)
+            chunk_size = max(1, int(max_chunk_bytes) // (n * 4))
+
+            for start in range(0, num_queries, chunk_size):
+                block = queries_normed[start:start + chunk_size]
+                scores = self._block_scores(block, n, exact)  # (chunk x N)
+                np.clip(scores, 0.0, 1.0, out=scores)
+                if self._free:
+                    scores[:, self._free] = -1.0
+
+                if k < n:
+                    top_idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                else:
+                    top_idx = np.broadcast_to(np.arange(n), (len(block), n))
+
+                if rerank:
+                    for i in range(len(block)):
+                        if valid[start + i]:
+                            results[start + i] = self.search(block[i], threshold, top_k, rows=top_idx[i])
+                    continue
+
+                top_scores = np.take_along_axis(scores, top_idx, axis=1)
+                order = np.argsort(-top_scores, axis=1, kind="stable")
+                top_idx = np.take_along_axis(top_idx, order, axis=1)
+                top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+                for i in range(len(block)):
+                    if valid[start + i]:
+                        results[start + i] = self._build_results(top_idx[i], top_scores[i], threshold)
+            return results
+
+    def measure_recall(self, sample_size: int = 200, top_k: int = 10, noise: float = 0.0,
+                       seed: int = 0, reference: Optional["EmbeddingGallery"] = None) -> Dict[str, float]:
+        """
+        Recall check compact (first-pass + rerank) vs exact float32 search.
+        Query = sample embeddings di gallery (opsional ditambah noise Gaussian).
+
+        Args:
+            sample_size: Jumlah query
+            top_k: k untuk recall@k
+            noise: Std noise yang ditambahkan ke query (simulasi foto baru)
+            seed: Random seed
+            reference: Gallery float32 untuk ground truth (wajib di mode pq)
+
+        Returns:
+            {'recall_at_k', 'top1_agreement', 'queries'}
+        """
+        exact_gallery = reference or self
+        if exact_gallery._matrix is None:
+            raise ValueError("Recall check mode pq butuh reference gallery float32")
+
+        with exact_gallery.lock:
+            valid_rows = [row for row, nim in enumerate(exact_gallery.nims) if nim is not None]
+            if not valid_rows:
+                return {'recall_at_k': 0.0, 'top1_agreement': 0.0, 'queries': 0}
+            rng = np.random.default_rng(seed)
+            rows = rng.choice(valid_rows, size=min(sample_size, len(valid_rows)), replace=False)
+            queries = np.array(exact_gallery.matrix[rows], dtype=np.float32)
+
+        if noise > 0:
+            queries += rng.normal(0.0, noise, size=queries.shape).astype(np.float32)
+
+        approx = self.search_batch(queries, threshold=0.0, top_k=top_k)
+        exact = exact_gallery.search_batch(queries, threshold=0.0, top_k=top_k, exact=True)
+
+        hits, total, top1 = 0, 0, 0
+        for a, e in zip(approx, exact):
+            exact_nims = {r['nim'] for r in e}
+            hits += len(exact_nims & {r['nim'] for r in a})
+            total += len(exact_nims)
+            if a and e and a[0]['nim'] == e[0]['nim']:
+                top1 += 1
+
+        return {
+            'recall_at_k': hits / total if total else 0.0,
+            'top1_agreement': top1 / len(queries),
+            'queries': len(queries)
+        }
@@ -0,0 +1,186 @@
+"""
+Micro-batching untuk recognition model (ArcFace).
+
+Request /recognize yang datang bersamaan (banyak kiosk auto-scan) masing-masing hanya
+punya satu crop 112x112. Scheduler mengumpulkan crop dari thread request selama
+maksimum INFERENCE_MAX_WAIT_MS atau INFERENCE_MAX_BATCH item, menjalankan satu
+get_feat batched, lalu mengembalikan embedding ke masing-masing request.
+"""
+import queue
+import threading
+import time
+import numpy as np
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+from face_recognition import model_registry
+from face_recognition.config import (
+    ARCFACE_MODEL_NAME, INFERENCE_MAX_BATCH, INFERENCE_MAX_WAIT_MS, INFERENCE_EMBED_TIMEOUT
+)
+
+
+class RecognitionBatcher:
+    """Satu worker thread yang menggabungkan crop dari banyak request menjadi satu forward pass."""
+
+    def __init__(self, rec_model, max_batch: int = INFERENCE_MAX_BATCH,
+                 max_wait_ms: float = INFERENCE_MAX_WAIT_MS):
+        """
+        Initialize batcher.
+
+        Args:
+            rec_model: Recognizer InsightFace (ArcFaceONNX, punya get_feat)
+            max_batch: Jumlah crop maksimum per forward pass
+            max_wait_ms: Waktu tunggu maksimum (ms) setelah crop pertama batch masuk
+        """
+        self.rec_model = rec_model
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes: Counter = Counter()
+        self._requests = 0
+        self._queue_wait_total = 0.0
+        self._forward_total = 0.0
+        self._closed = False
+        self._close_lock = threading.Lock()  # submit vs close: tidak ada item yang masuk setelah sentinel
+        self._thread = threading.Thread(target=self._run, name="recognition-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, crop: np.ndarray) -> Future:
+        """
+        Antrikan satu crop aligned (112x112 BGR).
+
+        Returns:
+            Future berisi embedding mentah (belum dinormalisasi)
+
+        Raises:
+            RuntimeError: Batcher sudah ditutup (worker thread tidak lagi memproses antrian)
+        """
+        future: Future = Future()
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("Recognition batcher sudah ditutup")
+            self._queue.put((crop, future, time.perf_counter()))
+        return future
+
+    def embed(self, crop: np.ndarray, timeout: Optional[float] = INFERENCE_EMBED_TIMEOUT) -> np.ndarray:
+        """
+        Submit crop dan tunggu embedding (blocking, dipanggil dari thread request).
+
+        Raises:
+            concurrent.futures.TimeoutError: Embedding tidak selesai dalam timeout detik
+        """
+        return self.submit(crop).result(timeout=timeout)
+
+    def close(self):
+        """Hentikan worker thread setelah antrian yang ada selesai diproses."""
+        with self._close_lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(None)
+        self._thread.join()
+
+        # Jaga-jaga: item yang tertinggal di antrian tidak akan pernah diproses, gagalkan Future-nya
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError("Recognition batcher sudah ditutup"))
+
+    def _run(self):
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+
+            self._execute(batch)
+
+    def _execute(self, batch):
+        """Satu get_feat untuk seluruh batch, lalu fan-out hasil ke Future masing-masing."""
+        start = time.perf_counter()
+        try:
+            feats = self.rec_model.get_feat([crop for crop, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        forward = time.perf_counter() - start
+
+        feats = np.asarray(feats, dtype=np.float32).reshape(len(batch), -1)
+        for i, (_, future, _) in enumerate(batch):
+            future.set_result(feats[i].copy())
+
+        with self._stats_lock:
+            self._batch_sizes[len(batch)] += 1
+            self._requests += len(batch)
+            self._queue_wait_total += sum(start - enqueued for _, _, enqueued in batch)
+            self._forward_total += forward
+
+    def stats(self) -> Dict[str, Any]:
+        """Distribusi ukuran batch dan rata-rata waktu tunggu / forward pass."""
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000,
+                'requests': self._requests,
+                'batches': batches,
+                'mean_batch_size': self._requests / batches if batches else 0.0,
+                'batch_size_histogram': {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                'mean_queue_wait_ms': self._queue_wait_total / self._requests * 1000 if self._requests else 0.0,
+                'mean_forward_ms': self._forward_total / batches * 1000 if batches else 0.0,
+                'queue_depth': self._queue.qsize(),
+            }
+
+
+_lock = threading.Lock()
+_batchers: Dict[str, RecognitionBatcher] = {}
+
+
+def get_batcher(pack: str = ARCFACE_MODEL_NAME) -> RecognitionBatcher:
+    """Batcher process-wide untuk recognizer pack (dibuat saat pertama dipakai, jadi setelah fork worker)."""
+    batcher = _batchers.get(pack)
+    if batcher is not None:
+        return batcher
+    with _lock:
+        batcher = _batchers.get(pack)
+        if batcher is None:
+            batcher = RecognitionBatcher(model_registry.get_recognizer(pack))
+            _batchers[pack] = batcher
+        return batcher
+
+
+def reset():
+    """
+    Tutup dan lepas semua batcher (dipanggil model_registry.reset()): batcher memegang
+    recognizer lama, get_batcher berikutnya membuat batcher baru dengan session baru.
+    """
+    with _lock:
+        batchers = list(_batchers.values())
+        _batchers.clear()
+    for batcher in batchers:
+        batcher.close()
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Statistik semua batcher yang aktif di proses ini."""
+    with _lock:
+        batchers = dict(_batchers)
+    return {pack: batcher.stats() for pack, batcher in batchers.items()}
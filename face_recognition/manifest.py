@@ -0,0 +1,119 @@
+"""
+Manifest encoding per NIM (tabel encoding_manifest): fingerprint file foto
+(size, mtime, SHA-256) + model dan parameter QC yang dipakai saat embedding dibuat.
+
+Batch encoder memakai manifest untuk incremental re-encode: foto di-encode ulang hanya
+jika file berubah atau model / parameter QC berubah, bukan semua (--force) atau tidak sama sekali.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from face_recognition.config import (
+    ARCFACE_MODEL_NAME, ARCFACE_DET_SIZE, INFERENCE_PRECISION,
+    QC_DB_BLUR_THRESHOLD, QC_DB_MIN_FACE_SIZE_RATIO, QC_DB_MAX_YAW_THRESHOLD,
+    QC_DB_MIN_DETECTION_CONFIDENCE, QC_DB_REJECT_MULTIPLE_FACES
+)
+
+
+STATUS_OK = "ok"
+STATUS_QC_FAILED = "qc_failed"  # Input sama -> hasil QC sama, tidak perlu dicoba ulang
+
+
+def encoding_params() -> Dict[str, Any]:
+    """Model dan parameter QC yang menentukan hasil embedding."""
+    params = {
+        'model_name': ARCFACE_MODEL_NAME,
+        'det_size': list(ARCFACE_DET_SIZE),
+        'qc': {
+            'blur_threshold': QC_DB_BLUR_THRESHOLD,
+            'min_face_size_ratio': QC_DB_MIN_FACE_SIZE_RATIO,
+            'max_yaw_threshold': QC_DB_MAX_YAW_THRESHOLD,
+            'min_detection_confidence': QC_DB_MIN_DETECTION_CONFIDENCE,
+            'reject_multiple_faces': QC_DB_REJECT_MULTIPLE_FACES,
+        },
+    }
+    # Hanya jika bukan fp32, supaya hash manifest yang sudah ada tetap sama
+    if INFERENCE_PRECISION != 'fp32':
+        params['precision'] = INFERENCE_PRECISION
+    return params
+
+
+def params_hash(params: Optional[Dict[str, Any]] = None) -> str:
+    """Hash stabil dari encoding_params() untuk dibandingkan dengan manifest."""
+    params = encoding_params() if params is None else params
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def sha256_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 isi file (dibaca per chunk)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path: Path, stat: Optional[os.stat_result] = None) -> Tuple[int, float, str]:
+    """
+    Fingerprint file foto.
+
+    Returns:
+        (size, mtime, sha256)
+    """
+    stat = os.stat(path) if stat is None else stat
+    return stat.st_size, stat.st_mtime, sha256_file(path)
+
+
+def build_entry(nim: str, path: Path, status: str, fingerprint: Optional[Tuple[int, float, str]] = None,
+                current_params_hash: Optional[str] = None) -> Tuple:
+    """
+    Row untuk FaceDatabase.save_manifest.
+
+    Args:
+        nim: NIM
+        path: Path foto
+        status: STATUS_OK / STATUS_QC_FAILED
+        fingerprint: Hasil file_fingerprint() jika sudah dihitung
+        current_params_hash: params_hash() jika sudah dihitung
+
+    Returns:
+        (nim, photo_path, file_size, file_mtime, content_sha256, model_name, params_hash, qc_params, status)
+    """
+    size, mtime, sha256 = file_fingerprint(path) if fingerprint is None else fingerprint
+    params = encoding_params()
+    return (nim, str(path), size, mtime, sha256, params['model_name'],
+            current_params_hash or params_hash(params), json.dumps(params, sort_keys=True), status)
+
+
+def check_entry(entry: Optional[Dict[str, Any]], path: Path, current_params_hash: str) -> Tuple[str, Optional[Tuple]]:
+    """
+    Bandingkan foto dengan entry manifest.
+    SHA-256 hanya dihitung jika size / mtime berubah.
+
+    Args:
+        entry: Row manifest NIM (None jika belum ada)
+        path: Path foto
+        current_params_hash: params_hash() saat ini
+
+    Returns:
+        (keputusan, fingerprint atau None). Keputusan: 'new', 'params_changed', 'retry',
+        'file_changed', 'touched' (isi sama, mtime berubah) atau 'unchanged'
+    """
+    if entry is None:
+        return 'new', None
+    if entry['params_hash'] != current_params_hash:
+        return 'params_changed', None
+    if entry['status'] not in (STATUS_OK, STATUS_QC_FAILED):
+        return 'retry', None
+
+    stat = os.stat(path)
+    if stat.st_size == entry['file_size'] and stat.st_mtime == entry['file_mtime']:
+        return 'unchanged', None
+
+    fingerprint = file_fingerprint(path, stat)
+    if fingerprint[2] == entry['content_sha256']:
+        return 'touched', fingerprint
+    return 'file_changed', fingerprint
@@ -5,19 +5,47 @@ import numpy as np
 from typing import List, Dict, Optional
 from scipy.spatial.distance import cosine
 
-from face_recognition.config import COSINE_SIMILARITY_THRESHOLD, TOP_K_MATCHES, MIN_CONFIDENCE_GAP
+from face_recognition.config import (
+    COSINE_SIMILARITY_THRESHOLD, TOP_K_MATCHES, MIN_CONFIDENCE_GAP,
+    ANN_INDEX_TYPE, ANN_INDEX_PATH
+)
 from face_recognition.database import FaceDatabase
+from face_recognition.ann_index import load_or_build_ann_index
+from face_recognition.roster import RosterCache
 
 
 class FaceMatcher:
     """Matcher untuk mencari wajah yang mirip menggunakan cosine similarity."""
     
-    def __init__(self, database: FaceDatabase = None):
-        """Initialize matcher dengan database."""
+    def __init__(self, database: FaceDatabase = None, ann_index=None):
+        """
+        Initialize matcher dengan database.
+        
+        Args:
+            database: FaceDatabase instance
+            ann_index: Optional ANN index (mis. IVFFlatIndex). Jika None dan
+                       ANN_INDEX_TYPE di-set, index di-load/build otomatis.
+        """
         self.db = database or FaceDatabase()
         self.threshold = COSINE_SIMILARITY_THRESHOLD
         self.top_k = TOP_K_MATCHES
         self.min_gap = MIN_CONFIDENCE_GAP
+        
+        # Load resident gallery di awal supaya request pertama tidak menanggung load time
+        if self.db.uses_gallery:
+            self.db.load_gallery()
+        
+        self.ann_index = ann_index
+        if self.ann_index is None and ANN_INDEX_TYPE and self.db.uses_gallery:
+            gallery = self.db.load_gallery()
+            if gallery.dtype == "pq":
+                # PQ sudah scan compact + rerank; IVF butuh matrix float32 di memory
+                print("Warning: ANN index tidak didukung untuk gallery mode pq, dilewati")
+            else:
+                self.ann_index = load_or_build_ann_index(ANN_INDEX_TYPE, gallery, ANN_INDEX_PATH)
+        
+        # Sub-matrix per roster (ruang / sesi ujian), LRU
+        self.rosters = RosterCache(self.db)
     
     def cosine_similarity(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
         """
@@ -44,7 +72,7 @@ class FaceMatcher:
         return max(0.0, min(1.0, similarity))
     
     def match(self, query_embedding: np.ndarray, threshold: float = None, 
-              top_k: int = None, require_gap: bool = True) -> List[Dict]:
+              top_k: int = None, require_gap: bool = True, roster_id: Optional[str] = None) -> List[Dict]:
         """
         Match query embedding dengan database.
         
@@ -53,17 +81,24 @@ class FaceMatcher:
             threshold: Minimum similarity threshold (default dari config)
             top_k: Number of top results (default dari config)
             require_gap: Jika True, best match harus punya gap minimum dengan second match
+            roster_id: Optional; hanya cocokkan dengan NIM di roster ini (ruang / sesi ujian)
             
         Returns:
             List of matches: [{'nim': str, 'confidence': float, 'photo_path': str}, ...]
+            
+        Raises:
+            RosterNotFoundError: roster_id tidak ditemukan
         """
         if threshold is None:
             threshold = self.threshold
         if top_k is None:
             top_k = self.top_k
         
-        # Search in database
-        matches = self.db.search_similar(query_embedding, threshold, top_k)
+        # Search in roster, database (atau shortlist ANN + exact rerank)
+        if roster_id:
+            matches = self.rosters.search(roster_id, query_embedding, threshold, top_k)
+        else:
+            matches = self._search(query_embedding, threshold, top_k)
         
         # Validasi gap jika ada lebih dari 1 match
         if require_gap and len(matches) > 1:
@@ -79,22 +114,45 @@ class FaceMatcher:
         
         return matches
     
-    def match_batch(self, query_embeddings: List[np.ndarray], threshold: float = None) -> List[List[Dict]]:
+    def _search(self, query_embedding: np.ndarray, threshold: float, top_k: int) -> List[Dict]:
+        """
+        Search kandidat: via ANN index jika ada, selain itu exact search di database/gallery.
+        Shortlist ANN di-rerank exact sehingga confidence sama dengan cosine biasa.
+        """
+        if self.ann_index is None:
+            return self.db.search_similar(query_embedding, threshold, top_k)
+        
+        gallery = self.db.get_gallery()
+        if self.ann_index.gallery is not gallery:
+            # Gallery di-reload (force), re-attach index ke gallery baru
+            self.ann_index.attach(gallery)
+        rows = self.ann_index.candidates(query_embedding)
+        return gallery.search(query_embedding, threshold, top_k, rows=rows)
+    
+    def match_batch(self, query_embeddings: List[np.ndarray], threshold: float = None,
+                    top_k: int = None) -> List[List[Dict]]:
         """
         Match multiple query embeddings.
         
+        Tanpa ANN index, semua query di-score terhadap gallery dalam satu GEMM per chunk
+        (bukan search_similar per embedding).
+        
         Args:
             query_embeddings: List of query embedding vectors
             threshold: Minimum similarity threshold
+            top_k: Number of top results per query (default dari config)
             
         Returns:
             List of match results for each query
         """
-        results = []
-        for embedding in query_embeddings:
-            matches = self.match(embedding, threshold)
-            results.append(matches)
-        return results
+        if threshold is None:
+            threshold = self.threshold
+        if top_k is None:
+            top_k = self.top_k
+        
+        if self.ann_index is not None:
+            return [self._search(embedding, threshold, top_k) for embedding in query_embeddings]
+        return self.db.search_similar_batch(query_embeddings, threshold, top_k)
     
     def get_best_match(self, query_embedding: np.ndarray, threshold: float = None, 
                       require_gap: bool = True) -> Optional[Dict]:
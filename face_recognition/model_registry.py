@@ -0,0 +1,484 @@
+"""
+Model registry process-wide untuk model InsightFace (detector + recognizer).
+Setiap model ONNX di-load sekali per proses lalu dipakai bersama oleh
+ArcFaceEncoder, FacePreprocessor dan BatchEncoder, bukan satu FaceAnalysis per instance / request.
+
+Session ONNX Runtime dibuat di sini (opsi dari config) dan graph yang sudah dioptimasi
+disimpan di INFERENCE_OPTIMIZED_CACHE_DIR, sehingga start berikutnya tidak mengoptimasi ulang.
+INFERENCE_PRECISION = "int8" memakai model hasil quantization (face_recognition.quantization).
+"""
+import glob
+import hashlib
+import json
+import os
+import platform
+import threading
+import time
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from insightface import model_zoo
+from insightface.app.common import Face
+from insightface.utils import ensure_available
+
+from face_recognition.config import (
+    ARCFACE_MODEL_NAME, ARCFACE_DET_SIZE, INSIGHTFACE_ROOT, INFERENCE_PROVIDERS, MODEL_PACK_FILES,
+    INFERENCE_INTRA_OP_THREADS, INFERENCE_INTER_OP_THREADS, INFERENCE_EXECUTION_MODE,
+    INFERENCE_GRAPH_OPTIMIZATION, INFERENCE_CPU_MEM_ARENA, INFERENCE_MEM_PATTERN,
+    INFERENCE_ALLOW_SPINNING, INFERENCE_THREAD_AFFINITY,
+    INFERENCE_OPTIMIZED_CACHE_ENABLED, INFERENCE_OPTIMIZED_CACHE_DIR,
+    INFERENCE_PRECISION, INFERENCE_QUANTIZED_DIR,
+    ADAPTIVE_DET_ENABLED, ADAPTIVE_DET_SIZES, ADAPTIVE_DET_MIN_FACE_PX
+)
+
+
+_lock = threading.Lock()
+_models: Dict[Tuple[str, str, str], Any] = {}  # (pack, task, precision) -> model
+_load_stats: Dict[str, Dict[str, Any]] = {}
+_det_stats_lock = threading.Lock()  # Terpisah dari _lock (yang ditahan selama load model)
+_det_stats: Dict[str, Dict[int, int]] = {'sizes': {}, 'retries': {}}  # Per input size detector
+
+# Default ONNX Runtime (untuk menampilkan opsi yang diubah dari default)
+SESSION_DEFAULTS: Dict[str, Any] = {
+    'intra_op_threads': 0,
+    'inter_op_threads': 0,
+    'execution_mode': 'sequential',
+    'graph_optimization': 'all',
+    'cpu_mem_arena': True,
+    'mem_pattern': True,
+    'allow_spinning': True,
+    'thread_affinity': '',
+}
+_session_config: Dict[str, Any] = {
+    'intra_op_threads': INFERENCE_INTRA_OP_THREADS,
+    'inter_op_threads': INFERENCE_INTER_OP_THREADS,
+    'execution_mode': INFERENCE_EXECUTION_MODE,
+    'graph_optimization': INFERENCE_GRAPH_OPTIMIZATION,
+    'cpu_mem_arena': INFERENCE_CPU_MEM_ARENA,
+    'mem_pattern': INFERENCE_MEM_PATTERN,
+    'allow_spinning': INFERENCE_ALLOW_SPINNING,
+    'thread_affinity': INFERENCE_THREAD_AFFINITY,
+}
+
+PRECISIONS = ('fp32', 'int8')
+
+_EXECUTION_MODES = {'sequential': 'ORT_SEQUENTIAL', 'parallel': 'ORT_PARALLEL'}
+_GRAPH_OPTIMIZATIONS = {
+    'disable': 'ORT_DISABLE_ALL',
+    'basic': 'ORT_ENABLE_BASIC',
+    'extended': 'ORT_ENABLE_EXTENDED',
+    'all': 'ORT_ENABLE_ALL',
+}
+
+
+def configure(**options):
+    """
+    Set opsi session untuk model yang di-load setelah ini (mis. di awal worker process).
+    Key sama dengan SESSION_DEFAULTS; value None diabaikan.
+
+    Args:
+        intra_op_threads: Thread intra-op ONNX Runtime per session (0 = default ORT)
+        inter_op_threads: Thread inter-op (execution_mode 'parallel')
+        execution_mode: 'sequential' / 'parallel'
+        graph_optimization: 'disable' / 'basic' / 'extended' / 'all'
+        cpu_mem_arena, mem_pattern, allow_spinning: bool
+        thread_affinity: String affinity ORT ('' = tidak di-pin)
+
+    Raises:
+        ValueError: Key atau value tidak dikenal
+    """
+    unknown = set(options) - set(SESSION_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Opsi session tidak dikenal: {', '.join(sorted(unknown))}")
+    if options.get('execution_mode') not in (None, *_EXECUTION_MODES):
+        raise ValueError(f"execution_mode tidak valid: {options['execution_mode']}")
+    if options.get('graph_optimization') not in (None, *_GRAPH_OPTIMIZATIONS):
+        raise ValueError(f"graph_optimization tidak valid: {options['graph_optimization']}")
+
+    with _lock:
+        for key, value in options.items():
+            if value is None:
+                continue
+            if key in ('intra_op_threads', 'inter_op_threads'):
+                value = max(0, int(value))
+            _session_config[key] = value
+
+
+def session_config() -> Dict[str, Any]:
+    """Opsi session yang berlaku untuk model berikutnya."""
+    with _lock:
+        return dict(_session_config)
+
+
+def reset():
+    """
+    Lepas semua model yang sudah di-load (mis. benchmark yang mengganti opsi session),
+    termasuk batcher inference_scheduler yang memegang recognizer lama.
+    """
+    from face_recognition import inference_scheduler  # Import di sini: inference_scheduler import modul ini
+
+    inference_scheduler.reset()
+    with _lock:
+        _models.clear()
+        _load_stats.clear()
+
+
+def _rss_mb() -> Optional[float]:
+    """Resident set size proses saat ini (MB), None jika tidak tersedia."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _model_file(pack: str, task: str) -> Optional[str]:
+    """Path file ONNX untuk task di model pack (None = cari berdasarkan taskname)."""
+    model_dir = ensure_available('models', pack, root=INSIGHTFACE_ROOT)
+    filename = MODEL_PACK_FILES.get(pack, {}).get(task)
+    if filename and os.path.exists(os.path.join(model_dir, filename)):
+        return os.path.join(model_dir, filename)
+    return None
+
+
+def model_file(task: str, pack: str = ARCFACE_MODEL_NAME) -> str:
+    """
+    Path file ONNX (fp32, asli dari pack) untuk task.
+
+    Raises:
+        RuntimeError: Pack tidak punya model untuk task
+    """
+    path = _model_file(pack, task)
+    if path is not None:
+        return path
+
+    # Pack tanpa mapping: sama seperti FaceAnalysis, cek taskname setiap file ONNX
+    model_dir = ensure_available('models', pack, root=INSIGHTFACE_ROOT)
+    for onnx_file in sorted(glob.glob(os.path.join(model_dir, '*.onnx'))):
+        candidate = model_zoo.get_model(onnx_file, providers=INFERENCE_PROVIDERS)
+        if candidate is not None and candidate.taskname == task:
+            return onnx_file
+    raise RuntimeError(f"Model pack '{pack}' tidak punya model {task}")
+
+
+def quantized_model_path(path: str, pack: str = ARCFACE_MODEL_NAME) -> Path:
+    """Lokasi model INT8 untuk file model fp32 di pack."""
+    return INFERENCE_QUANTIZED_DIR / pack / f"{Path(path).stem}.int8.onnx"
+
+
+def _session_options():
+    """SessionOptions ONNX Runtime dari _session_config."""
+    import onnxruntime
+    config = _session_config
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = config['intra_op_threads']
+    options.inter_op_num_threads = config['inter_op_threads']
+    options.execution_mode = getattr(onnxruntime.ExecutionMode, _EXECUTION_MODES[config['execution_mode']])
+    options.graph_optimization_level = getattr(onnxruntime.GraphOptimizationLevel,
+                                               _GRAPH_OPTIMIZATIONS[config['graph_optimization']])
+    options.enable_cpu_mem_arena = config['cpu_mem_arena']
+    options.enable_mem_pattern = config['mem_pattern']
+    spinning = "1" if config['allow_spinning'] else "0"
+    options.add_session_config_entry("session.intra_op.allow_spinning", spinning)
+    options.add_session_config_entry("session.inter_op.allow_spinning", spinning)
+    if config['thread_affinity']:
+        options.add_session_config_entry("session.intra_op_thread_affinities", config['thread_affinity'])
+    return options
+
+
+def _model_hash(path: str) -> str:
+    """
+    SHA-256 file model. Hash disimpan di index (key path + size + mtime)
+    supaya start berikutnya tidak membaca ulang seluruh file.
+    """
+    stat = os.stat(path)
+    index_path = INFERENCE_OPTIMIZED_CACHE_DIR / "model_hashes.json"
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+
+    key = os.path.abspath(path)
+    entry = index.get(key)
+    if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+        return entry['sha256']
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    index[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+
+    tmp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"Warning: gagal menyimpan index hash model: {str(e)}")
+    return index[key]['sha256']
+
+
+_cpu_tag_value: Optional[str] = None
+
+
+def _cpu_tag() -> str:
+    """
+    Arsitektur + hash fitur ISA CPU (flag /proc/cpuinfo di Linux, platform.processor() di OS lain).
+    Level 'all' menulis kernel / layout yang spesifik CPU ke graph, jadi cache yang dibuat di
+    host lain (mis. AVX-512 vs AVX2, volume models/ yang di-share) tidak boleh dipakai.
+    """
+    global _cpu_tag_value
+    if _cpu_tag_value is None:
+        features = platform.processor()
+        try:
+            with open("/proc/cpuinfo", "r") as f:
+                for line in f:
+                    if line.startswith(("flags", "Features")):
+                        features = " ".join(sorted(line.split(":", 1)[1].split()))
+                        break
+        except OSError:
+            pass
+        digest = hashlib.sha256(features.encode("utf-8")).hexdigest()[:8]
+        _cpu_tag_value = f"{platform.machine().lower() or 'unknown'}-{digest}"
+    return _cpu_tag_value
+
+
+def _optimized_model_path(path: str) -> Path:
+    """Lokasi cache graph teroptimasi untuk model + versi ORT + optimization level + provider + CPU."""
+    import onnxruntime
+    providers = "-".join(p.replace("ExecutionProvider", "").lower() for p in INFERENCE_PROVIDERS)
+    name = (f"{Path(path).stem}.{_model_hash(path)[:16]}.ort-{onnxruntime.__version__}"
+            f".{_session_config['graph_optimization']}.{providers}.{_cpu_tag()}.onnx")
+    return INFERENCE_OPTIMIZED_CACHE_DIR / name
+
+
+def _create_session(path: str):
+    """
+    Buat InferenceSession untuk model.
+    Cache hit: load graph teroptimasi dengan optimasi dimatikan (tidak ada optimasi ulang).
+    Cache miss: optimasi normal dan simpan hasilnya untuk start berikutnya.
+
+    Returns:
+        (session, status cache: 'hit' / 'miss' / 'disabled')
+    """
+    import onnxruntime
+
+    if not INFERENCE_OPTIMIZED_CACHE_ENABLED or _session_config['graph_optimization'] == 'disable':
+        return onnxruntime.InferenceSession(path, sess_options=_session_options(),
+                                            providers=INFERENCE_PROVIDERS), 'disabled'
+
+    INFERENCE_OPTIMIZED_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cached_path = _optimized_model_path(path)
+    if cached_path.exists():
+        options = _session_options()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            return onnxruntime.InferenceSession(str(cached_path), sess_options=options,
+                                                providers=INFERENCE_PROVIDERS), 'hit'
+        except Exception as e:
+            print(f"Warning: cache model teroptimasi {cached_path.name} tidak bisa di-load ({str(e)}), dibuat ulang")
+            cached_path.unlink(missing_ok=True)
+
+    # Nama tmp per proses: beberapa worker boleh start bersamaan, rename atomic
+    tmp_path = cached_path.with_name(f"{cached_path.name}.{os.getpid()}.tmp")
+    options = _session_options()
+    options.optimized_model_filepath = str(tmp_path)
+    session = onnxruntime.InferenceSession(path, sess_options=options, providers=INFERENCE_PROVIDERS)
+    try:
+        os.replace(tmp_path, cached_path)
+    except OSError as e:
+        print(f"Warning: gagal menyimpan cache model teroptimasi: {str(e)}")
+    return session, 'miss'
+
+
+def _wrap_model(path: str, session, task: str):
+    """Model InsightFace di atas session yang sudah dibuat (kelas sama dengan ModelRouter insightface)."""
+    if task == 'detection':
+        from insightface.model_zoo.retinaface import RetinaFace
+        return RetinaFace(model_file=path, session=session)
+    # model_file tetap file asli: ArcFaceONNX membaca graph untuk menentukan input mean / std
+    from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+    return ArcFaceONNX(model_file=path, session=session)
+
+
+def _load_model(pack: str, task: str, precision: str):
+    """
+    Load dan prepare satu model ONNX dari pack.
+
+    Returns:
+        (model, path file session, status cache, presisi yang benar-benar dipakai)
+    """
+    path = model_file(task, pack)
+    session_path = path
+    if precision == 'int8':
+        quantized_path = quantized_model_path(path, pack)
+        if quantized_path.exists():
+            session_path = str(quantized_path)
+        else:
+            print(f"Warning: {quantized_path} belum ada (jalankan `python main.py quantize`), pakai model fp32")
+            precision = 'fp32'
+
+    session, cache_status = _create_session(session_path)
+    # Wrapper tetap dari file fp32 (input mean / std dibaca dari graph asli)
+    model = _wrap_model(path, session, task)
+
+    # ctx_id=0: prepare dengan ctx_id < 0 memanggil session.set_providers, yang membuat ulang
+    # session (optimasi graph lagi) dan mengabaikan INFERENCE_PROVIDERS
+    if task == 'detection':
+        model.prepare(ctx_id=0, input_size=ARCFACE_DET_SIZE, det_thresh=0.5)
+    else:
+        model.prepare(ctx_id=0)
+    return model, session_path, cache_status, precision
+
+
+def get_model(task: str, pack: str = ARCFACE_MODEL_NAME, precision: Optional[str] = None):
+    """
+    Get model (load sekali per proses, thread-safe).
+
+    Args:
+        task: 'detection' atau 'recognition'
+        pack: Nama model pack InsightFace (default ARCFACE_MODEL_NAME)
+        precision: 'fp32' / 'int8' (default INFERENCE_PRECISION)
+
+    Returns:
+        Model InsightFace (RetinaFace / SCRFD atau ArcFaceONNX)
+    """
+    precision = precision or INFERENCE_PRECISION
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision tidak valid: {precision}")
+    key = (pack, task, precision)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            return model
+
+        rss_before = _rss_mb()
+        start = time.time()
+        try:
+            model, path, cache_status, loaded_precision = _load_model(pack, task, precision)
+        except Exception as e:
+            raise RuntimeError(f"Gagal load model {task} '{pack}': {str(e)}")
+        load_seconds = time.time() - start
+        rss_after = _rss_mb()
+
+        rss_delta = (rss_after - rss_before) if rss_before is not None and rss_after is not None else None
+        name = f"{pack}/{task}" if precision == 'fp32' else f"{pack}/{task}/{precision}"
+        _load_stats[name] = {
+            'file': os.path.basename(path),
+            'precision': loaded_precision,
+            'load_seconds': round(load_seconds, 3),
+            'rss_delta_mb': round(rss_delta, 1) if rss_delta is not None else None,
+            'rss_mb': round(rss_after, 1) if rss_after is not None else None,
+            'session': {key: value for key, value in _session_config.items() if value != SESSION_DEFAULTS[key]},
+            'optimized_cache': cache_status,
+        }
+        rss_info = f", RSS +{rss_delta:.1f} MB (total {rss_after:.1f} MB)" if rss_delta is not None else ""
+        print(f"Model {task} '{pack}' ({os.path.basename(path)}) loaded in {load_seconds:.2f}s "
+              f"[optimized cache: {cache_status}]{rss_info}")
+
+        _models[key] = model
+        return model
+
+
+def get_detector(pack: str = ARCFACE_MODEL_NAME, precision: Optional[str] = None):
+    """Detector RetinaFace / SCRFD bersama."""
+    return get_model('detection', pack, precision)
+
+
+def get_recognizer(pack: str = ARCFACE_MODEL_NAME, precision: Optional[str] = None):
+    """Recognizer ArcFace bersama."""
+    return get_model('recognition', pack, precision)
+
+
+def adaptive_det_size(face_scale: float, max_size: Tuple[int, int] = ARCFACE_DET_SIZE) -> Tuple[int, int]:
+    """
+    Input size detector terkecil (ADAPTIVE_DET_SIZES, maksimal max_size) yang masih membuat
+    sisi wajah >= ADAPTIVE_DET_MIN_FACE_PX setelah image di-resize ke input detector.
+
+    Args:
+        face_scale: Sisi wajah relatif terhadap sisi terpanjang image (adaptive_detection.face_scale)
+        max_size: Input size default / maksimum
+
+    Returns:
+        (size, size) atau max_size
+    """
+    limit = max(max_size)
+    for size in sorted(ADAPTIVE_DET_SIZES):
+        if size >= limit:
+            break
+        if face_scale * size >= ADAPTIVE_DET_MIN_FACE_PX:
+            return size, size
+    return tuple(max_size)
+
+
+def _detect(image_bgr: np.ndarray, det_size: Tuple[int, int], pack: str, precision: Optional[str]) -> List[Face]:
+    bboxes, kpss = get_detector(pack, precision).detect(image_bgr, input_size=det_size, max_num=0, metric='default')
+    if bboxes is None or bboxes.shape[0] == 0:
+        return []
+    return [
+        Face(bbox=bboxes[i, 0:4], kps=kpss[i] if kpss is not None else None, det_score=bboxes[i, 4])
+        for i in range(bboxes.shape[0])
+    ]
+
+
+def detect_faces(image_bgr: np.ndarray, det_size: Optional[Tuple[int, int]] = None,
+                 pack: str = ARCFACE_MODEL_NAME, precision: Optional[str] = None,
+                 face_scale_hint: Optional[float] = None) -> List[Face]:
+    """
+    Detection only: return Face (bbox, kps, det_score) tanpa menjalankan recognition.
+
+    Args:
+        image_bgr: Image BGR
+        det_size: Override input size detector (default ARCFACE_DET_SIZE); dengan face_scale_hint = ukuran maksimum
+        pack: Nama model pack
+        precision: 'fp32' / 'int8' (default INFERENCE_PRECISION)
+        face_scale_hint: Skala wajah di frame sebelumnya (adaptive_detection.face_scale). Jika diisi,
+            detector dijalankan di adaptive_det_size(); tidak ada wajah -> diulang di det_size penuh
+
+    Returns:
+        List of Face (bbox / kps dalam koordinat image_bgr, apa pun input size detector)
+    """
+    full_size = tuple(det_size or ARCFACE_DET_SIZE)
+    size = full_size
+    if face_scale_hint and ADAPTIVE_DET_ENABLED:
+        size = adaptive_det_size(face_scale_hint, full_size)
+
+    faces = _detect(image_bgr, size, pack, precision)
+    retried = not faces and size != full_size
+    if retried:
+        # Wajah mengecil / orang berganti sejak frame sebelumnya
+        faces = _detect(image_bgr, full_size, pack, precision)
+
+    with _det_stats_lock:
+        _det_stats['sizes'][size[0]] = _det_stats['sizes'].get(size[0], 0) + 1
+        if retried:
+            _det_stats['retries'][size[0]] = _det_stats['retries'].get(size[0], 0) + 1
+    return faces
+
+
+def detection_stats() -> Dict[str, Any]:
+    """Jumlah panggilan detect_faces per input size dan retry di ukuran penuh (adaptive detection)."""
+    with _det_stats_lock:
+        return {
+            'enabled': ADAPTIVE_DET_ENABLED,
+            'sizes': dict(_det_stats['sizes']),
+            'retries': dict(_det_stats['retries']),
+        }
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    """Load time dan memory per model yang sudah di-load di proses ini."""
+    with _lock:
+        return {name: dict(info) for name, info in _load_stats.items()}
@@ -0,0 +1,177 @@
+"""
+Product Quantization (PQ) untuk gallery embeddings yang sangat besar.
+Embedding 512-D dipecah ke M subspace; tiap subspace di-encode ke 1 byte (256 centroid),
+sehingga satu NIM = M bytes. Scoring memakai asymmetric distance computation (ADC):
+query tetap float32, gallery di-score via lookup table M x 256.
+"""
+import os
+import numpy as np
+from pathlib import Path
+from typing import Optional
+
+from face_recognition.config import (
+    ARCFACE_EMBEDDING_SIZE, PQ_NUM_SUBQUANTIZERS, PQ_TRAIN_ITERATIONS, PQ_TRAIN_SAMPLE_SIZE
+)
+
+
+CODEBOOK_FORMAT_VERSION = 1
+PQ_NUM_CENTROIDS = 256  # 1 byte per subspace
+
+# Jumlah row per blok saat ADC / encode (menjaga buffer gather M x blok tetap kecil)
+_BLOCK_ROWS = 65536
+
+
+def _kmeans(data: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    K-means Euclidean sederhana untuk satu subspace.
+
+    Args:
+        data: Matrix (N x d) float32
+        k: Jumlah centroid
+        iterations: Iterasi Lloyd
+        rng: Random generator
+
+    Returns:
+        Centroids (k x d) float32
+    """
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _assign(data, centroids)
+        order = np.argsort(assign, kind="stable")
+        starts = np.searchsorted(assign[order], np.arange(k))
+        counts = np.bincount(assign, minlength=k)
+        nonempty = counts > 0
+
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(data[order], starts[nonempty], axis=0)
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+
+        # Centroid kosong: re-seed dengan titik random
+        empty = ~nonempty
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), size=int(empty.sum()), replace=False)]
+    return centroids
+
+
+def _assign(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (Euclidean): argmax(x.c - 0.5 * ||c||^2)."""
+    bias = 0.5 * np.sum(centroids * centroids, axis=1)
+    return np.argmax(data @ centroids.T - bias, axis=1).astype(np.int32)
+
+
+class ProductQuantizer:
+    """
+    Product quantizer: M codebook (256 x d_sub), encode embedding -> M bytes,
+    dan lookup table ADC untuk inner product query vs codes.
+    """
+
+    def __init__(self, num_subquantizers: int = PQ_NUM_SUBQUANTIZERS, dim: int = ARCFACE_EMBEDDING_SIZE):
+        """Initialize PQ kosong (belum di-train)."""
+        if dim % num_subquantizers != 0:
+            raise ValueError(f"Dimensi {dim} harus habis dibagi jumlah subquantizer {num_subquantizers}")
+        self.m = num_subquantizers
+        self.dim = dim
+        self.dsub = dim // num_subquantizers
+        self.codebooks: Optional[np.ndarray] = None  # (M x 256 x d_sub)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    @property
+    def code_size(self) -> int:
+        """Bytes per embedding."""
+        return self.m
+
+    def train(self, embeddings: np.ndarray, iterations: int = PQ_TRAIN_ITERATIONS,
+              max_train_size: int = PQ_TRAIN_SAMPLE_SIZE, seed: int = 0) -> "ProductQuantizer":
+        """
+        Train codebook per subspace dari embeddings (L2-normalized).
+
+        Args:
+            embeddings: Matrix (N x D) float32
+            iterations: Iterasi k-means per subspace
+            max_train_size: Batas sample training
+            seed: Random seed
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(embeddings) < PQ_NUM_CENTROIDS:
+            raise ValueError(f"Butuh minimal {PQ_NUM_CENTROIDS} embeddings untuk train PQ, ada {len(embeddings)}")
+
+        rng = np.random.default_rng(seed)
+        if len(embeddings) > max_train_size:
+            embeddings = embeddings[rng.choice(len(embeddings), size=max_train_size, replace=False)]
+
+        codebooks = np.empty((self.m, PQ_NUM_CENTROIDS, self.dsub), dtype=np.float32)
+        for sub in range(self.m):
+            data = np.ascontiguousarray(embeddings[:, sub * self.dsub:(sub + 1) * self.dsub])
+            codebooks[sub] = _kmeans(data, PQ_NUM_CENTROIDS, iterations, rng)
+        self.codebooks = codebooks
+        return self
+
+    def encode(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Encode embeddings (N x D) ke codes (N x M) uint8.
+        """
+        if not self.is_trained:
+            raise RuntimeError("PQ codebook belum di-train")
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        codes = np.empty((len(embeddings), self.m), dtype=np.uint8)
+        for start in range(0, len(embeddings), _BLOCK_ROWS):
+            block = embeddings[start:start + _BLOCK_ROWS]
+            for sub in range(self.m):
+                sub_block = block[:, sub * self.dsub:(sub + 1) * self.dsub]
+                codes[start:start + len(block), sub] = _assign(sub_block, self.codebooks[sub])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Rekonstruksi approximate embeddings dari codes (N x M)."""
+        codes = np.asarray(codes, dtype=np.int64).reshape(-1, self.m)
+        parts = [self.codebooks[sub][codes[:, sub]] for sub in range(self.m)]
+        return np.concatenate(parts, axis=1)
+
+    def lookup_table(self, query_normed: np.ndarray) -> np.ndarray:
+        """
+        ADC lookup table: inner product sub-query dengan setiap centroid (M x 256).
+        """
+        sub_queries = np.asarray(query_normed, dtype=np.float32).reshape(self.m, self.dsub)
+        return np.einsum("mkd,md->mk", self.codebooks, sub_queries)
+
+    def adc_scores(self, query_normed: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """
+        Approximate inner product query vs semua codes (N x M) via lookup table.
+        """
+        table = self.lookup_table(query_normed)
+        sub_index = np.arange(self.m)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), _BLOCK_ROWS):
+            block = codes[start:start + _BLOCK_ROWS]
+            scores[start:start + len(block)] = table[sub_index, block].sum(axis=1)
+        return scores
+
+    def save(self, path: Path):
+        """Simpan codebook ke disk (npz, atomic rename)."""
+        if not self.is_trained:
+            raise RuntimeError("PQ codebook belum di-train")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                format_version=np.int32(CODEBOOK_FORMAT_VERSION),
+                dim=np.int32(self.dim),
+                codebooks=self.codebooks,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "ProductQuantizer":
+        """Load codebook dari disk."""
+        with np.load(Path(path), allow_pickle=False) as data:
+            if int(data["format_version"]) != CODEBOOK_FORMAT_VERSION:
+                raise ValueError(f"Format PQ codebook tidak didukung: {int(data['format_version'])}")
+            codebooks = data["codebooks"].astype(np.float32)
+            pq = cls(num_subquantizers=codebooks.shape[0], dim=int(data["dim"]))
+            pq.codebooks = codebooks
+        return pq
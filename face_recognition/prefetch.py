@@ -0,0 +1,167 @@
+"""
+Prefetch decode foto untuk batch encoder.
+
+Thread decoder (cv2.imread melepas GIL) mengisi queue berukuran tetap sehingga stage model
+selalu punya image yang sudah di-decode. Queue penuh = decoder menunggu (backpressure),
+jadi memory tetap terbatas. Statistik kedalaman queue menunjukkan apakah encoder
+I/O-bound (model sering menunggu queue kosong) atau compute-bound (decoder sering menunggu queue penuh).
+"""
+import queue
+import threading
+import time
+import numpy as np
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from face_recognition.config import PREFETCH_DECODE_WORKERS, PREFETCH_QUEUE_SIZE
+
+
+_DONE = object()  # Sentinel: satu decoder selesai
+
+
+class ImagePrefetcher:
+    """Iterator (photo_path, image atau None, detik decode, error atau None) dari thread decoder."""
+
+    def __init__(self, photo_paths: Iterable[Path], load_fn: Callable[[str], Optional[np.ndarray]],
+                 decoders: int = PREFETCH_DECODE_WORKERS, queue_size: int = PREFETCH_QUEUE_SIZE):
+        """
+        Initialize prefetcher (thread decoder mulai saat iterasi / __enter__).
+
+        Args:
+            photo_paths: Path foto yang akan di-decode
+            load_fn: Fungsi decode path -> image BGR (None jika gagal)
+            decoders: Jumlah thread decoder
+            queue_size: Jumlah image decoded maksimum yang menunggu di queue
+        """
+        self._paths = iter(photo_paths)
+        self._paths_lock = threading.Lock()
+        self._load_fn = load_fn
+        self.decoders = max(1, decoders)
+        self.queue_size = max(1, queue_size)
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._decode_loop, name=f"prefetch-decoder-{i}", daemon=True)
+            for i in range(self.decoders)
+        ]
+        self._started = False
+
+        self._stats_lock = threading.Lock()
+        self._items = 0
+        self._empty_gets = 0
+        self._depth_total = 0
+        self._consumer_wait = 0.0
+        self._producer_blocked = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        if not self._started:
+            self._started = True
+            for thread in self._threads:
+                thread.start()
+
+    def close(self):
+        """Hentikan decoder (mis. saat consumer berhenti lebih awal) dan kosongkan queue."""
+        self._stop.set()
+        while any(thread.is_alive() for thread in self._threads):
+            try:
+                while True:
+                    self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            for thread in self._threads:
+                thread.join(timeout=0.05)
+
+    def _decode_loop(self):
+        while not self._stop.is_set():
+            with self._paths_lock:
+                photo_path = next(self._paths, None)
+            if photo_path is None:
+                break
+
+            start = time.perf_counter()
+            try:
+                image = self._load_fn(str(photo_path))
+                error = None if image is not None else "Gagal load image"
+            except Exception as e:
+                image, error = None, str(e)
+            self._put((photo_path, image, time.perf_counter() - start, error))
+        self._put(_DONE)
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+
+        # Queue penuh: stage model belum mengambil -> compute-bound
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        with self._stats_lock:
+            self._producer_blocked += time.perf_counter() - start
+
+    def __iter__(self) -> Iterator[Tuple[Path, Optional[np.ndarray], float, Optional[str]]]:
+        self.start()
+        finished = 0
+        while finished < self.decoders:
+            depth = self._queue.qsize()
+            start = time.perf_counter()
+            item = self._queue.get()
+            waited = time.perf_counter() - start
+            if item is _DONE:
+                finished += 1
+                continue
+
+            with self._stats_lock:
+                self._items += 1
+                self._depth_total += depth
+                self._consumer_wait += waited
+                if depth == 0:
+                    self._empty_gets += 1  # Queue kosong: stage model menunggu decode -> I/O-bound
+            yield item
+
+    def depth(self) -> int:
+        """Jumlah image decoded yang sedang menunggu di queue."""
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistik queue: kedalaman rata-rata, fraksi get saat kosong, waktu tunggu kedua sisi."""
+        with self._stats_lock:
+            return {
+                'decoders': self.decoders,
+                'queue_size': self.queue_size,
+                'items': self._items,
+                'empty_gets': self._empty_gets,
+                'depth_total': self._depth_total,
+                'consumer_wait_seconds': self._consumer_wait,
+                'producer_blocked_seconds': self._producer_blocked,
+            }
+
+
+def summarize(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turunkan indikator dari stats() (boleh hasil penjumlahan beberapa worker).
+
+    Returns:
+        {'mean_queue_depth', 'empty_fraction', 'bound': 'io' / 'compute'}
+    """
+    items = stats.get('items', 0)
+    consumer_wait = stats.get('consumer_wait_seconds', 0.0)
+    producer_blocked = stats.get('producer_blocked_seconds', 0.0)
+    return {
+        'mean_queue_depth': stats.get('depth_total', 0) / items if items else 0.0,
+        'empty_fraction': stats.get('empty_gets', 0) / items if items else 0.0,
+        'bound': 'io' if consumer_wait > producer_blocked else 'compute',
+    }
@@ -8,9 +8,8 @@ import numpy as np
 from pathlib import Path
 from typing import Optional, Tuple, List
 from PIL import Image
-import insightface
-from insightface.app import FaceAnalysis
 
+from face_recognition import model_registry
 from face_recognition.config import (
     ARCFACE_INPUT_SIZE, NORMALIZATION_MEAN, NORMALIZATION_STD,
     RETINAFACE_CONFIDENCE_THRESHOLD, SUPPORTED_FORMATS
@@ -24,15 +23,22 @@ class FacePreprocessor:
     """
     
     def __init__(self):
-        """Initialize InsightFace FaceAnalysis."""
-        # Initialize InsightFace FaceAnalysis (includes RetinaFace + ArcFace)
-        self.app = FaceAnalysis(
-            providers=['CPUExecutionProvider'],  # Use CPU, bisa ganti ke CUDAExecutionProvider untuk GPU
-            allowed_modules=['detection', 'recognition']
-        )
-        self.app.prepare(ctx_id=-1, det_size=(640, 640))
+        """
+        Initialize detector dari model registry (dipakai bersama ArcFaceEncoder).
+        Recognizer baru di-load saat embedding pertama kali dibutuhkan, sehingga
+        pemakaian detection-only (mis. /detect-face) tidak memuat ArcFace.
+        """
+        self.detector = model_registry.get_detector()
+        self._recognizer = None
         print("FacePreprocessor initialized with InsightFace")
     
+    @property
+    def recognizer(self):
+        """ArcFace recognizer bersama (lazy)."""
+        if self._recognizer is None:
+            self._recognizer = model_registry.get_recognizer()
+        return self._recognizer
+    
     def load_image(self, image_path: str) -> Optional[np.ndarray]:
         """
         Load image dengan support multiple formats (JPG, PNG, JPEG).
@@ -79,24 +85,23 @@ class FacePreprocessor:
         except Exception as e:
             raise ValueError(f"Gagal load image {image_path}: {str(e)}")
     
-    def detect_and_get_face(self, image: np.ndarray) -> Optional[dict]:
+    def detect_and_get_face(self, image: np.ndarray, with_embedding: bool = True,
+                            det_size: Optional[Tuple[int, int]] = None) -> Optional[dict]:
         """
         Detect wajah dan dapatkan data face dari InsightFace.
         InsightFace akan handle alignment secara internal.
         
         Args:
             image: Image dalam format BGR (OpenCV)
+            with_embedding: Jika False, recognition tidak dijalankan ('embedding' = None)
+            det_size: Override input size detector (default ARCFACE_DET_SIZE)
             
         Returns:
             Dictionary dengan keys: 'face_obj', 'bbox', 'det_score', 'embedding'
             atau None jika tidak ada wajah
         """
-        # Detect faces dengan InsightFace
-        # InsightFace.get() akan:
         # 1. Detect dengan RetinaFace
-        # 2. Align secara internal dengan 5-point landmarks
-        # 3. Generate embedding yang sudah aligned
-        faces = self.app.get(image)
+        faces = model_registry.detect_faces(image, det_size=det_size)
         
         if len(faces) == 0:
             return None
@@ -108,6 +113,10 @@ class FacePreprocessor:
         if best_face.det_score < RETINAFACE_CONFIDENCE_THRESHOLD:
             return None
         
+        # 2. Align dengan 5-point landmarks + embedding, hanya untuk wajah terbaik
+        if with_embedding:
+            self.recognizer.get(image, best_face)
+        
         return {
             'face_obj': best_face,
             'bbox': best_face.bbox.astype(int),
@@ -116,19 +125,20 @@ class FacePreprocessor:
             'embedding': best_face.normed_embedding  # Sudah aligned & normalized!
         }
     
-    def detect_face(self, image: np.ndarray) -> Optional[dict]:
+    def detect_face(self, image: np.ndarray, det_size: Optional[Tuple[int, int]] = None) -> Optional[dict]:
         """
-        Detect wajah menggunakan InsightFace.
+        Detect wajah menggunakan InsightFace (detection only, tanpa recognition).
         Wrapper untuk backward compatibility.
         
         Args:
             image: Image dalam format BGR (OpenCV)
+            det_size: Override input size detector (mis. UI_DET_SIZE untuk feedback UI)
             
         Returns:
             Dictionary dengan keys: 'bbox', 'kps', 'det_score'
             atau None jika tidak ada wajah
         """
-        result = self.detect_and_get_face(image)
+        result = self.detect_and_get_face(image, with_embedding=False, det_size=det_size)
         if result is None:
             return None
         
@@ -149,7 +159,7 @@ class FacePreprocessor:
         Returns:
             List of dict: [{'bbox':..., 'kps':..., 'det_score':..., 'face_obj':...}, ...]
         """
-        faces = self.app.get(image)
+        faces = model_registry.detect_faces(image)
         results: List[dict] = []
         for f in faces:
             score = float(getattr(f, "det_score", 0.0))
@@ -229,7 +239,7 @@ class FacePreprocessor:
                 return None
             
             # Detect face dan dapatkan crop
-            face_data = self.detect_and_get_face(image)
+            face_data = self.detect_and_get_face(image, with_embedding=False)
             if face_data is None:
                 return None
             
@@ -270,7 +280,7 @@ class FacePreprocessor:
         """
         try:
             # Detect face
-            face_data = self.detect_and_get_face(image)
+            face_data = self.detect_and_get_face(image, with_embedding=False)
             if face_data is None:
                 return None
             
@@ -0,0 +1,375 @@
+"""
+INT8 quantization detector + recognizer untuk inference CPU (`python main.py quantize`).
+
+Model hasil disimpan di INFERENCE_QUANTIZED_DIR/<pack>/<model>.int8.onnx:
+- static (default): weight + activation INT8 (format QDQ). Range activation dikalibrasi dari
+  sample foto PHOTOS_DIR dengan preprocessing yang sama seperti inference (detector: resize +
+  padding seperti RetinaFace.detect, recognizer: crop aligned 112x112)
+- dynamic: weight INT8 saja, range activation dihitung saat runtime (tanpa kalibrasi)
+
+Registry memakai model INT8 jika INFERENCE_PRECISION = "int8". Sebelum mengaktifkan, cek
+drift_report(): embedding INT8 vs fp32 pada foto yang tidak dipakai kalibrasi.
+"""
+import os
+import random
+import time
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from face_recognition import model_registry
+from face_recognition.benchmark import _bbox_iou
+from face_recognition.config import (
+    ARCFACE_MODEL_NAME, ARCFACE_DET_SIZE, UI_DET_SIZE, PHOTOS_DIR, SUPPORTED_FORMATS,
+    COSINE_SIMILARITY_THRESHOLD, QUANTIZATION_MODE, QUANTIZATION_CALIBRATION_SIZE
+)
+
+
+QUANTIZATION_MODES = ('static', 'dynamic')
+
+
+def sample_photo_paths(seed: int = 0) -> List[Path]:
+    """
+    Semua foto PHOTOS_DIR dalam urutan random tetap (seed).
+    Kalibrasi memakai bagian depan list, evaluasi drift memakai foto sesudahnya.
+    """
+    paths = sorted(p for p in PHOTOS_DIR.iterdir() if p.suffix in SUPPORTED_FORMATS) if PHOTOS_DIR.exists() else []
+    random.Random(seed).shuffle(paths)
+    return paths
+
+
+def _read_images(paths: Iterable[Path]) -> Iterator[Tuple[Path, np.ndarray]]:
+    import cv2
+
+    for path in paths:
+        image = cv2.imread(str(path))
+        if image is not None:
+            yield path, image
+
+
+def _detector_blob(detector, image_bgr: np.ndarray, input_size: Tuple[int, int]) -> np.ndarray:
+    """Input detector persis seperti RetinaFace.detect (resize aspect ratio tetap + padding kanan / bawah)."""
+    import cv2
+
+    im_ratio = float(image_bgr.shape[0]) / image_bgr.shape[1]
+    model_ratio = float(input_size[1]) / input_size[0]
+    if im_ratio > model_ratio:
+        new_height = input_size[1]
+        new_width = int(new_height / im_ratio)
+    else:
+        new_width = input_size[0]
+        new_height = int(new_width * im_ratio)
+    det_img = np.zeros((input_size[1], input_size[0], 3), dtype=np.uint8)
+    det_img[:new_height, :new_width, :] = cv2.resize(image_bgr, (new_width, new_height))
+    return cv2.dnn.blobFromImage(det_img, 1.0 / detector.input_std, input_size,
+                                 (detector.input_mean,) * 3, swapRB=True)
+
+
+def _align(recognizer, image_bgr: np.ndarray, face) -> np.ndarray:
+    from insightface.utils import face_align
+    return face_align.norm_crop(image_bgr, landmark=face.kps, image_size=recognizer.input_size[0])
+
+
+def _recognizer_blob(recognizer, crops: List[np.ndarray]) -> np.ndarray:
+    """Input recognizer persis seperti ArcFaceONNX.get_feat."""
+    import cv2
+    return cv2.dnn.blobFromImages(crops, 1.0 / recognizer.input_std, recognizer.input_size,
+                                  (recognizer.input_mean,) * 3, swapRB=True)
+
+
+def _best_face(faces):
+    return max(faces, key=lambda f: f.det_score) if faces else None
+
+
+def _detector_blobs(paths: List[Path], pack: str) -> Iterator[np.ndarray]:
+    """Blob kalibrasi detector di ARCFACE_DET_SIZE dan UI_DET_SIZE (dua ukuran yang dipakai inference)."""
+    detector = model_registry.get_detector(pack, 'fp32')
+    sizes = [ARCFACE_DET_SIZE] + ([UI_DET_SIZE] if UI_DET_SIZE != ARCFACE_DET_SIZE else [])
+    for _, image in _read_images(paths):
+        for size in sizes:
+            yield _detector_blob(detector, image, size)
+
+
+def _recognizer_blobs(paths: List[Path], pack: str) -> Iterator[np.ndarray]:
+    """Blob kalibrasi recognizer: crop aligned wajah terbaik (detector fp32)."""
+    recognizer = model_registry.get_recognizer(pack, 'fp32')
+    for _, image in _read_images(paths):
+        face = _best_face(model_registry.detect_faces(image, pack=pack, precision='fp32'))
+        if face is not None:
+            yield _recognizer_blob(recognizer, [_align(recognizer, image, face)])
+
+
+def _calibration_reader(input_name: str, blobs: Iterator[np.ndarray]):
+    """CalibrationDataReader ORT dari generator blob (dibuat saat dibaca, tidak ditampung di memory)."""
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class _Reader(CalibrationDataReader):
+        def get_next(self):
+            blob = next(blobs, None)
+            return None if blob is None else {input_name: blob}
+
+    return _Reader()
+
+
+def _preprocess(source: str, target: Path) -> str:
+    """Shape inference + optimasi graph sebelum quantization (rekomendasi ORT); gagal -> file asli."""
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        quant_pre_process(source, str(target))
+        return str(target)
+    except Exception as e:
+        print(f"Warning: pre-process {Path(source).name} gagal ({str(e)}), quantize dari file asli")
+        return source
+
+
+def quantize_model(task: str, pack: str = ARCFACE_MODEL_NAME, mode: str = QUANTIZATION_MODE,
+                   calibration_paths: Optional[List[Path]] = None) -> Path:
+    """
+    Buat model INT8 untuk satu task di pack.
+
+    Args:
+        task: 'detection' atau 'recognition'
+        pack: Nama model pack InsightFace
+        mode: 'static' (kalibrasi) atau 'dynamic'
+        calibration_paths: Foto kalibrasi (wajib untuk mode static)
+
+    Returns:
+        Path model INT8 (model_registry.quantized_model_path)
+
+    Raises:
+        ValueError: Mode tidak dikenal atau mode static tanpa foto kalibrasi
+    """
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Mode quantization tidak valid: {mode}")
+    if mode == 'static' and not calibration_paths:
+        raise ValueError("Quantization static butuh foto kalibrasi")
+
+    source = model_registry.model_file(task, pack)
+    output = model_registry.quantized_model_path(source, pack)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    prepared = _preprocess(source, output.with_name(f"{output.stem}.prep.onnx"))
+    tmp_output = output.with_name(f"{output.name}.{os.getpid()}.tmp")
+
+    try:
+        if mode == 'dynamic':
+            quantize_dynamic(prepared, str(tmp_output), weight_type=QuantType.QInt8)
+        else:
+            blobs = (_detector_blobs if task == 'detection' else _recognizer_blobs)(calibration_paths, pack)
+            input_name = model_registry.get_model(task, pack, 'fp32').input_name
+            quantize_static(
+                prepared, str(tmp_output), _calibration_reader(input_name, blobs),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True,
+                calibrate_method=CalibrationMethod.MinMax,
+                # Min / max digabung setiap 16 sample, bukan semua activation ditampung sampai akhir
+                extra_options={'CalibMaxIntermediateOutputs': 16},
+            )
+        os.replace(tmp_output, output)
+    finally:
+        if prepared != source:
+            Path(prepared).unlink(missing_ok=True)
+        tmp_output.unlink(missing_ok=True)
+    return output
+
+
+def quantize_pack(pack: str = ARCFACE_MODEL_NAME, mode: str = QUANTIZATION_MODE,
+                  calibration_size: int = QUANTIZATION_CALIBRATION_SIZE, force: bool = False,
+                  seed: int = 0) -> Dict[str, Path]:
+    """
+    Quantize detector + recognizer pack (skip yang sudah ada kecuali force).
+
+    Returns:
+        {task: path model INT8}
+    """
+    calibration_paths = sample_photo_paths(seed)[:calibration_size]
+    outputs = {}
+    for task in ('detection', 'recognition'):
+        source = model_registry.model_file(task, pack)
+        target = model_registry.quantized_model_path(source, pack)
+        if target.exists() and not force:
+            print(f"{target.name} sudah ada (pakai --force untuk quantize ulang)")
+        else:
+            print(f"Quantize {task} '{pack}' ({mode}, {len(calibration_paths)} foto kalibrasi)...")
+            start = time.time()
+            target = quantize_model(task, pack, mode, calibration_paths)
+            print(f"  {target} ({os.path.getsize(target) / 1e6:.1f} MB, fp32 "
+                  f"{os.path.getsize(source) / 1e6:.1f} MB) in {time.time() - start:.1f}s")
+        outputs[task] = target
+    return outputs
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _normalize(feat: np.ndarray) -> np.ndarray:
+    feat = np.asarray(feat, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(feat)
+    return feat / norm if norm > 0 else feat
+
+
+def drift_report(paths: List[Path], pack: str = ARCFACE_MODEL_NAME, db=None,
+                 threshold: float = COSINE_SIMILARITY_THRESHOLD) -> Dict[str, Any]:
+    """
+    Bandingkan model INT8 dengan fp32 pada foto evaluasi.
+
+    - detection: wajah terbaik detector INT8 vs fp32 (detect rate, IoU bbox, selisih det_score)
+    - recognition: crop aligned yang sama (detector fp32) ke kedua recognizer -> cosine per wajah
+    - gallery (jika db diberikan): top-1 NIM query INT8 vs fp32, baik recognizer saja maupun
+      end-to-end (detector + recognizer INT8), dan keputusan match di threshold
+
+    Args:
+        paths: Foto evaluasi (sebaiknya tidak dipakai kalibrasi)
+        pack: Nama model pack
+        db: FaceDatabase untuk top-1 agreement (None = dilewati)
+        threshold: Threshold match (keputusan accept / reject)
+
+    Returns:
+        {'images', 'detection', 'recognition', 'gallery'}
+
+    Raises:
+        RuntimeError: Model INT8 belum dibuat
+    """
+    for task in ('detection', 'recognition'):
+        quantized_path = model_registry.quantized_model_path(model_registry.model_file(task, pack), pack)
+        if not quantized_path.exists():
+            raise RuntimeError(f"Model INT8 {quantized_path} belum ada (jalankan quantize_pack)")
+
+    # Load semua model dulu supaya latency tidak termasuk waktu load
+    for precision in ('fp32', 'int8'):
+        model_registry.get_detector(pack, precision)
+    recognizers = {precision: model_registry.get_recognizer(pack, precision) for precision in ('fp32', 'int8')}
+
+    images = 0
+    detected = {'fp32': 0, 'int8': 0}
+    det_ms = {'fp32': [], 'int8': []}
+    rec_ms = {'fp32': [], 'int8': []}
+    ious, score_deltas, cosines = [], [], []
+    nims, queries = [], {'fp32': [], 'int8': [], 'e2e': []}
+
+    for path, image in _read_images(paths):
+        images += 1
+        best = {}
+        for precision in ('fp32', 'int8'):
+            faces, ms = _timed(model_registry.detect_faces, image, pack=pack, precision=precision)
+            det_ms[precision].append(ms)
+            best[precision] = _best_face(faces)
+            detected[precision] += best[precision] is not None
+        if best['fp32'] is not None and best['int8'] is not None:
+            ious.append(_bbox_iou(best['int8'].bbox, best['fp32'].bbox))
+            score_deltas.append(abs(float(best['int8'].det_score) - float(best['fp32'].det_score)))
+
+        if best['fp32'] is None:
+            continue
+        crop = _align(recognizers['fp32'], image, best['fp32'])
+        embeddings = {}
+        for precision in ('fp32', 'int8'):
+            feat, ms = _timed(recognizers[precision].get_feat, [crop])
+            rec_ms[precision].append(ms)
+            embeddings[precision] = _normalize(feat)
+        cosines.append(float(np.dot(embeddings['fp32'], embeddings['int8'])))
+
+        if best['int8'] is not None:
+            e2e = _normalize(recognizers['int8'].get_feat([_align(recognizers['int8'], image, best['int8'])]))
+        else:
+            e2e = None
+        nims.append(path.stem)
+        queries['fp32'].append(embeddings['fp32'])
+        queries['int8'].append(embeddings['int8'])
+        queries['e2e'].append(e2e)
+
+    cosines_arr = np.array(cosines) if cosines else np.zeros(1)
+    report = {
+        'images': images,
+        'detection': {
+            'fp32_detect_rate': detected['fp32'] / max(1, images),
+            'int8_detect_rate': detected['int8'] / max(1, images),
+            'mean_iou': float(np.mean(ious)) if ious else 0.0,
+            'mean_score_delta': float(np.mean(score_deltas)) if score_deltas else 0.0,
+            'fp32_ms': float(np.mean(det_ms['fp32'])) if det_ms['fp32'] else 0.0,
+            'int8_ms': float(np.mean(det_ms['int8'])) if det_ms['int8'] else 0.0,
+        },
+        'recognition': {
+            'faces': len(cosines),
+            'cosine_mean': float(cosines_arr.mean()),
+            'cosine_p5': float(np.percentile(cosines_arr, 5)),
+            'cosine_min': float(cosines_arr.min()),
+            'fp32_ms': float(np.mean(rec_ms['fp32'])) if rec_ms['fp32'] else 0.0,
+            'int8_ms': float(np.mean(rec_ms['int8'])) if rec_ms['int8'] else 0.0,
+        },
+        'gallery': None,
+    }
+    if db is not None and nims:
+        report['gallery'] = _gallery_agreement(db, nims, queries, threshold)
+    return report
+
+
+def _gallery_agreement(db, nims: List[str], queries: Dict[str, List[Optional[np.ndarray]]],
+                       threshold: float) -> Dict[str, Any]:
+    """Top-1 gallery untuk query fp32 / INT8 / end-to-end INT8 dan tingkat kesepakatannya."""
+    top1 = {}
+    for variant, embeddings in queries.items():
+        valid = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+        results = db.search_similar_batch([embeddings[i] for i in valid], threshold=-1.0, top_k=1)
+        top1[variant] = [None] * len(embeddings)
+        for i, matches in zip(valid, results):
+            if matches:
+                top1[variant][i] = (matches[0]['nim'], matches[0]['confidence'])
+
+    def decision(match):
+        return match[0] if match is not None and match[1] >= threshold else None
+
+    def agreement(variant: str) -> float:
+        pairs = [(a, b) for a, b in zip(top1['fp32'], top1[variant]) if a is not None]
+        return sum(b is not None and a[0] == b[0] for a, b in pairs) / max(1, len(pairs))
+
+    def correct(variant: str) -> float:
+        return sum(match is not None and match[0] == nim for match, nim in zip(top1[variant], nims)) / max(1, len(nims))
+
+    def mean_score(variant: str) -> float:
+        scores = [match[1] for match in top1[variant] if match is not None]
+        return float(np.mean(scores)) if scores else 0.0
+
+    return {
+        'queries': len(nims),
+        'threshold': threshold,
+        'top1_agreement': agreement('int8'),
+        'e2e_top1_agreement': agreement('e2e'),
+        'decision_agreement': sum(decision(a) == decision(b) for a, b in zip(top1['fp32'], top1['int8'])) / len(nims),
+        'fp32_correct': correct('fp32'),
+        'int8_correct': correct('int8'),
+        'e2e_correct': correct('e2e'),
+        'fp32_mean_score': mean_score('fp32'),
+        'int8_mean_score': mean_score('int8'),
+    }
+
+
+def print_drift_report(report: Dict[str, Any]):
+    """Print hasil drift_report."""
+    detection, recognition, gallery = report['detection'], report['recognition'], report['gallery']
+    print("\n" + "=" * 72)
+    print(f"INT8 vs FP32 DRIFT ({report['images']} images)")
+    print("=" * 72)
+    print(f"Detection   : detect rate fp32 {detection['fp32_detect_rate']:.2%} / int8 {detection['int8_detect_rate']:.2%}, "
+          f"IoU {detection['mean_iou']:.3f}, |det_score delta| {detection['mean_score_delta']:.4f}")
+    print(f"              latency fp32 {detection['fp32_ms']:.1f} ms / int8 {detection['int8_ms']:.1f} ms")
+    print(f"Recognition : cosine(fp32, int8) mean {recognition['cosine_mean']:.4f}, "
+          f"p5 {recognition['cosine_p5']:.4f}, min {recognition['cosine_min']:.4f} ({recognition['faces']} faces)")
+    print(f"              latency fp32 {recognition['fp32_ms']:.1f} ms / int8 {recognition['int8_ms']:.1f} ms")
+    if gallery is None:
+        print("Gallery     : dilewati (database tidak tersedia)")
+    else:
+        print(f"Gallery     : top-1 agreement {gallery['top1_agreement']:.2%} (recognizer int8), "
+              f"{gallery['e2e_top1_agreement']:.2%} (end-to-end int8)")
+        print(f"              keputusan match @ {gallery['threshold']:.2f} sama: {gallery['decision_agreement']:.2%}")
+        print(f"              top-1 = NIM foto: fp32 {gallery['fp32_correct']:.2%}, int8 {gallery['int8_correct']:.2%}, "
+              f"end-to-end {gallery['e2e_correct']:.2%}")
+        print(f"              mean top-1 score fp32 {gallery['fp32_mean_score']:.4f} / int8 {gallery['int8_mean_score']:.4f}")
+    print("Aktifkan dengan INFERENCE_PRECISION=int8 jika agreement dapat diterima")
+    print("=" * 72)
@@ -0,0 +1,276 @@
+"""
+Roster: daftar NIM yang boleh muncul di satu ruang / sesi ujian.
+Matching dengan roster_id hanya men-score sub-matrix roster (beberapa ratus row),
+bukan seluruh gallery. Sub-matrix di-cache LRU dan di-invalidate saat gallery atau isi roster
+(file CSV / tabel rosters) berubah.
+"""
+import re
+import csv
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+from face_recognition.config import ARCFACE_EMBEDDING_SIZE, ROSTER_DIR, ROSTER_CACHE_SIZE, ROSTER_CACHE_TTL
+from face_recognition.gallery import EmbeddingGallery
+
+
+_ROSTER_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+class RosterNotFoundError(LookupError):
+    """Roster tidak ada di ROSTER_DIR maupun tabel rosters."""
+
+
+def load_roster_csv(path: Path) -> List[str]:
+    """
+    Load daftar NIM dari CSV (format nim_list.csv: header 'nim', boleh dengan BOM).
+
+    Args:
+        path: Path file CSV
+
+    Returns:
+        List NIM (urutan file, tanpa duplikat)
+    """
+    nims = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        for i, row in enumerate(reader):
+            if not row or not row[0].strip():
+                continue
+            value = row[0].strip()
+            if i == 0 and value.lower() == "nim":
+                continue
+            nims.append(value)
+    return list(dict.fromkeys(nims))
+
+
+class _RosterEntry:
+    """Sub-matrix satu roster (row L2-normalized) + NIM/photo_path paralel."""
+
+    def __init__(self, nims: List[str], matrix: np.ndarray, photo_paths: List[Optional[str]],
+                 gallery: Optional[EmbeddingGallery], gallery_rows: set, roster_nims: set,
+                 source: Tuple = ()):
+        self.nims = nims
+        self.matrix = matrix
+        self.photo_paths = photo_paths
+        self.gallery = gallery
+        self.gallery_rows = gallery_rows
+        self.roster_nims = roster_nims
+        self.source = source  # Versi sumber roster (CSV stat + versi tabel rosters) saat dibaca
+        self.created_at = time.monotonic()
+
+
+class RosterCache:
+    """
+    Cache LRU sub-matrix per roster.
+
+    Dengan resident gallery, cache mendaftar sebagai listener gallery sehingga roster yang
+    NIM-nya di-upsert / dihapus langsung di-evict. Tanpa gallery (pgvector / scan),
+    sub-matrix diambil dari database. Entry juga stale jika file CSV roster berubah (mtime /
+    size), tabel rosters berubah (roster-import, lewat NOTIFY yang diproses sync_gallery), atau
+    sudah lebih dari ROSTER_CACHE_TTL detik.
+    """
+
+    def __init__(self, database, capacity: int = ROSTER_CACHE_SIZE, roster_dir: Path = ROSTER_DIR):
+        """
+        Initialize cache.
+
+        Args:
+            database: FaceDatabase instance
+            capacity: Jumlah roster maksimum di cache
+            roster_dir: Directory file CSV roster (<roster_id>.csv)
+        """
+        self.db = database
+        self.capacity = capacity
+        self.roster_dir = Path(roster_dir)
+        self._entries: "OrderedDict[str, _RosterEntry]" = OrderedDict()
+        self._gallery: Optional[EmbeddingGallery] = None
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_nims(self, roster_id: str) -> List[str]:
+        """
+        Daftar NIM roster: file ROSTER_DIR/<roster_id>.csv, kalau tidak ada dari tabel rosters.
+
+        Raises:
+            RosterNotFoundError: roster_id tidak valid / tidak ditemukan
+        """
+        if not roster_id or not _ROSTER_ID_PATTERN.fullmatch(roster_id):
+            raise RosterNotFoundError(f"Roster tidak valid: {roster_id}")
+
+        csv_path = self.roster_dir / f"{roster_id}.csv"
+        if csv_path.exists():
+            return load_roster_csv(csv_path)
+
+        nims = self.db.get_roster_nims(roster_id)
+        if not nims:
+            raise RosterNotFoundError(f"Roster tidak ditemukan: {roster_id}")
+        return nims
+
+    def search(self, roster_id: str, query_embedding: np.ndarray, threshold: float = 0.5,
+               top_k: int = 5) -> List[Dict]:
+        """
+        Cosine similarity query hanya terhadap NIM di roster.
+
+        Args:
+            roster_id: ID roster
+            query_embedding: Query embedding vector
+            threshold: Minimum similarity threshold
+            top_k: Number of top results
+
+        Returns:
+            List of {nim, confidence, photo_path} sorted by confidence (descending)
+        """
+        query_normed = EmbeddingGallery.normalize(query_embedding)
+        if query_normed is None or top_k <= 0:
+            return []
+
+        entry = self._get_entry(roster_id)
+        if len(entry.nims) == 0:
+            return []
+
+        scores = entry.matrix @ query_normed
+        np.clip(scores, 0.0, 1.0, out=scores)
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        return [
+            {
+                'nim': entry.nims[i],
+                'confidence': float(scores[i]),
+                'photo_path': entry.photo_paths[i]
+            }
+            for i in top if scores[i] >= threshold
+        ]
+
+    def invalidate(self, roster_id: Optional[str] = None):
+        """Hapus satu roster (atau semua) dari cache, mis. setelah file / tabel roster diubah."""
+        with self._lock:
+            if roster_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(roster_id, None)
+
+    def _get_entry(self, roster_id: str) -> _RosterEntry:
+        """Ambil sub-matrix dari cache (LRU), build ulang jika belum ada / stale."""
+        gallery = self._current_gallery()
+        # Versi sumber dibaca SEBELUM daftar NIM: roster yang berubah di antaranya membuat
+        # entry yang di-build di bawah langsung stale di lookup berikutnya, bukan tersimpan sebagai fresh.
+        # Dibaca di luar lock cache (urutan lock database -> gallery -> cache).
+        source = self._source_version(roster_id)
+        with self._lock:
+            entry = self._entries.get(roster_id)
+            if entry is not None and self._is_fresh(entry, gallery, source):
+                self._entries.move_to_end(roster_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Daftar NIM sengaja dibaca di luar gallery.lock (tanpa I/O file / DB di bawah lock gallery)
+        roster_nims = self.get_nims(roster_id)
+        if gallery is not None:
+            # Urutan lock gallery -> cache, sama dengan saat gallery memanggil listener
+            with gallery.lock:
+                entry = self._build_from_gallery(gallery, roster_nims)
+                entry.source = source
+                self._store(roster_id, entry)
+        else:
+            entry = self._build_from_database(roster_nims)
+            entry.source = source
+            self._store(roster_id, entry)
+        return entry
+
+    def _store(self, roster_id: str, entry: _RosterEntry):
+        with self._lock:
+            self._entries[roster_id] = entry
+            self._entries.move_to_end(roster_id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def _source_version(self, roster_id: str) -> Tuple:
+        """(mtime_ns, size) file CSV roster (None jika tidak ada) + versi tabel rosters di database."""
+        csv_state = None
+        if roster_id and _ROSTER_ID_PATTERN.fullmatch(roster_id):
+            try:
+                stat = (self.roster_dir / f"{roster_id}.csv").stat()
+                csv_state = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+        return csv_state, self.db.roster_version(roster_id)
+
+    def _is_fresh(self, entry: _RosterEntry, gallery: Optional[EmbeddingGallery], source: Tuple) -> bool:
+        if gallery is not None and entry.gallery is not gallery:
+            return False
+        if entry.source != source:
+            return False
+        return (time.monotonic() - entry.created_at) < ROSTER_CACHE_TTL
+
+    def _current_gallery(self) -> Optional[EmbeddingGallery]:
+        """Gallery aktif; pindahkan listener jika gallery di-reload."""
+        if not self.db.uses_gallery:
+            return None
+        gallery = self.db.get_gallery()
+        with self._lock:
+            old_gallery = self._gallery
+            if gallery is old_gallery:
+                return gallery
+            self._gallery = gallery
+            self._entries.clear()
+        # Di luar lock cache: add/remove listener mengambil lock gallery
+        if old_gallery is not None:
+            old_gallery.remove_listener(self)
+        gallery.add_listener(self)
+        return gallery
+
+    def _build_from_gallery(self, gallery: EmbeddingGallery, roster_nims: List[str]) -> _RosterEntry:
+        """Copy row roster dari gallery ke sub-matrix contiguous."""
+        rows = [gallery.row_of(nim) for nim in roster_nims]
+        present = [(nim, row) for nim, row in zip(roster_nims, rows) if row is not None]
+        nims = [nim for nim, _ in present]
+        rows = np.array([row for _, row in present], dtype=np.int64)
+
+        if gallery.dtype == "pq":
+            # Mode pq tidak punya float32 di memory: ambil embedding asli sekali saat build
+            originals = self.db.get_embeddings_bulk(nims)
+            vectors = [EmbeddingGallery.normalize(originals[nim]) if nim in originals else None for nim in nims]
+            keep = [i for i, vector in enumerate(vectors) if vector is not None]
+            matrix = np.array([vectors[i] for i in keep], dtype=np.float32).reshape(-1, gallery.dim)
+            nims = [nims[i] for i in keep]
+            rows = rows[keep]
+        else:
+            matrix = np.array(gallery.matrix[rows], dtype=np.float32)
+
+        photo_paths = [gallery.photo_paths[row] for row in rows]
+        return _RosterEntry(nims, matrix, photo_paths, gallery, set(rows.tolist()), set(roster_nims))
+
+    def _build_from_database(self, roster_nims: List[str]) -> _RosterEntry:
+        """Sub-matrix langsung dari database (tanpa resident gallery)."""
+        nims, vectors, photo_paths = [], [], []
+        for nim, embedding, photo_path in self.db.get_embedding_rows(roster_nims):
+            normed = EmbeddingGallery.normalize(embedding)
+            if normed is not None:
+                nims.append(nim)
+                vectors.append(normed)
+                photo_paths.append(photo_path)
+        matrix = np.array(vectors, dtype=np.float32).reshape(-1, ARCFACE_EMBEDDING_SIZE)
+        return _RosterEntry(nims, matrix, photo_paths, None, set(), set(roster_nims))
+
+    # Listener gallery: evict roster yang terdampak perubahan row / NIM
+
+    def on_upsert(self, row: int, normed_embedding: np.ndarray):
+        nim = self._gallery.nims[row] if self._gallery is not None else None
+        self._evict_where(lambda entry: row in entry.gallery_rows or nim in entry.roster_nims)
+
+    def on_remove(self, row: int):
+        self._evict_where(lambda entry: row in entry.gallery_rows)
+
+    def _evict_where(self, predicate):
+        with self._lock:
+            stale = [roster_id for roster_id, entry in self._entries.items() if predicate(entry)]
+            for roster_id in stale:
+                del self._entries[roster_id]
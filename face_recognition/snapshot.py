@@ -0,0 +1,145 @@
+"""
+Snapshot gallery on-disk yang di-share antar worker process.
+
+Format file (little-endian):
+    [header 4096 bytes] [matrix capacity x dim float32, L2-normalized] [NIM table]
+
+NIM table = offsets uint64 (count + 1) ke blob UTF-8 berisi "nim\\0photo_path" per row.
+Matrix dibuka dengan np.memmap (copy-on-write), sehingga beberapa worker gunicorn
+memakai page cache yang sama, bukan masing-masing menyimpan copy matrix di heap.
+Row headroom (nol) di belakang count menampung insert incremental tanpa copy ulang matrix.
+"""
+import os
+import struct
+import time
+import numpy as np
+from pathlib import Path
+from typing import Iterable, Tuple, Optional, List
+
+from face_recognition.config import ARCFACE_EMBEDDING_SIZE, GALLERY_SNAPSHOT_HEADROOM
+from face_recognition.gallery import EmbeddingGallery
+
+
+SNAPSHOT_MAGIC = b"FRGSNAP1"
+SNAPSHOT_FORMAT_VERSION = 2  # 2: + data_xmin (watermark commit-safe)
+HEADER_SIZE = 4096  # Matrix mulai di batas page
+
+# magic, format_version, dim, count, capacity, data_version, created_at, table_offset, table_size, data_xmin
+_HEADER = struct.Struct("<8sIIQQqdQQq")
+
+# Jumlah row per write saat export (buffer float32 sementara tetap kecil)
+_WRITE_BLOCK_ROWS = 4096
+
+
+def write_snapshot(path: Path, rows: Iterable[Tuple[str, bytes, Optional[str]]], data_version: int,
+                   data_xmin: int, dim: int = ARCFACE_EMBEDDING_SIZE,
+                   headroom: int = GALLERY_SNAPSHOT_HEADROOM) -> int:
+    """
+    Tulis snapshot gallery ke disk lalu publish dengan atomic rename.
+    Proses yang masih memakai snapshot lama tetap membaca file lama (inode lama)
+    sampai mereka membuka ulang.
+
+    Args:
+        path: Lokasi file snapshot
+        rows: Iterable of (nim, embedding BYTEA, photo_path), boleh streaming dari cursor
+        data_version: Version watermark database yang tercakup snapshot
+        data_xmin: Txid tertua yang masih berjalan saat rows dibaca; perubahan dari transaksi
+            dengan txid >= ini (bisa version < data_version) dibaca ulang saat catch-up
+        dim: Dimensi embedding
+        headroom: Jumlah row kosong untuk insert incremental
+
+    Returns:
+        Jumlah embeddings yang ditulis
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    entries: List[bytes] = []
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER_SIZE)
+
+        block = []
+        for nim, embedding_bytes, photo_path in rows:
+            normed = EmbeddingGallery.normalize(np.frombuffer(embedding_bytes, dtype=np.float32))
+            if normed is None or normed.shape[0] != dim:
+                continue
+            block.append(normed)
+            entries.append(f"{nim}\0{photo_path or ''}".encode("utf-8"))
+            if len(block) >= _WRITE_BLOCK_ROWS:
+                f.write(np.stack(block).astype(np.float32).tobytes())
+                block = []
+        if block:
+            f.write(np.stack(block).astype(np.float32).tobytes())
+
+        count = len(entries)
+        capacity = max(1, count + max(0, headroom))
+        f.write(b"\0" * ((capacity - count) * dim * 4))
+
+        offsets = np.zeros(count + 1, dtype=np.uint64)
+        if entries:
+            offsets[1:] = np.cumsum([len(entry) for entry in entries])
+        table_offset = HEADER_SIZE + capacity * dim * 4
+        table = offsets.tobytes() + b"".join(entries)
+        f.write(table)
+
+        f.seek(0)
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, dim, count, capacity,
+                             int(data_version), time.time(), table_offset, len(table), int(data_xmin)))
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+    return count
+
+
+class GallerySnapshot:
+    """Snapshot gallery yang dibuka read-only (copy-on-write) via np.memmap."""
+
+    def __init__(self, path: Path):
+        """
+        Buka snapshot.
+
+        Args:
+            path: Lokasi file snapshot
+        """
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ValueError(f"File snapshot tidak valid: {self.path}")
+            (magic, format_version, self.dim, self.count, self.capacity, self.data_version,
+             self.created_at, table_offset, table_size, self.data_xmin) = _HEADER.unpack(header)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"File snapshot tidak valid: {self.path}")
+            if format_version != SNAPSHOT_FORMAT_VERSION:
+                raise ValueError(f"Format snapshot tidak didukung: {format_version}")
+
+            f.seek(table_offset)
+            table = f.read(table_size)
+
+            # mode 'c': page dibaca dari page cache bersama; page yang ditulis (upsert incremental)
+            # menjadi private per proses dan tidak pernah ditulis balik ke file.
+            # Di-map dari file object yang sama supaya header dan matrix pasti dari inode yang sama.
+            self.matrix = np.memmap(f, dtype=np.float32, mode="c", offset=HEADER_SIZE,
+                                    shape=(self.capacity, self.dim))
+
+        self._stat_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        offsets = np.frombuffer(table, dtype=np.uint64, count=self.count + 1)
+        blob = table[(self.count + 1) * 8:]
+        self.nims: List[str] = []
+        self.photo_paths: List[Optional[str]] = []
+        for i in range(self.count):
+            nim, photo_path = blob[int(offsets[i]):int(offsets[i + 1])].decode("utf-8").split("\0", 1)
+            self.nims.append(nim)
+            self.photo_paths.append(photo_path or None)
+
+    def is_current(self) -> bool:
+        """False jika file di path sudah diganti snapshot baru (atau dihapus)."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size) == self._stat_key
@@ -4,13 +4,35 @@ Main entry point untuk Face Recognition System
 import sys
 import argparse
 
+
+def _build_exact_gallery(db):
+    """Gallery float32 exact dari semua embeddings di database (ground truth recall check)."""
+    from face_recognition.gallery import EmbeddingGallery
+    embeddings = db.get_all_embeddings()
+    gallery = EmbeddingGallery(capacity=len(embeddings))
+    for nim, embedding in embeddings.items():
+        gallery.upsert(nim, embedding)
+    return gallery
+
+
 def main():
     """Main entry point."""
     parser = argparse.ArgumentParser(description="Face Recognition System")
     parser.add_argument(
         'mode',
-        choices=['batch', 'api', 'web'],
-        help='Mode: batch (batch encoding), api (REST API), web (web interface)'
+        choices=['batch', 'api', 'web', 'ann-build', 'migrate-pgvector', 'gallery-recall',
+                 'pq-train', 'snapshot', 'roster-import', 'find-duplicates', 'benchmark-detect',
+                 'benchmark-ort', 'quantize'],
+        help='Mode: batch (batch encoding), api (REST API), web (web interface), '
+             'ann-build (train + simpan ANN index), migrate-pgvector (convert BYTEA ke vector(512)), '
+             'gallery-recall (recall gallery compact GALLERY_DTYPE vs exact float32), '
+             'pq-train (train codebook PQ untuk GALLERY_DTYPE=pq), '
+             'snapshot (export embeddings ke snapshot memory-mapped untuk worker), '
+             'roster-import (simpan CSV NIM ke tabel rosters), '
+             'find-duplicates (pasangan NIM dengan embedding sangat mirip ke CSV), '
+             'benchmark-detect (latency FaceAnalysis.get vs detector-only 640/320), '
+             'benchmark-ort (sweep opsi session ONNX Runtime, print konfigurasi terbaik), '
+             'quantize (buat model INT8 detector + recognizer, print drift INT8 vs fp32)'
     )
     parser.add_argument(
         '--sample', type=int, help='Process N random samples (batch mode)'
@@ -21,6 +43,26 @@ def main():
     parser.add_argument(
         '--all', action='store_true', help='Process all files (batch mode)'
     )
+    parser.add_argument(
+        '--batch-size', type=int, default=None, help='Row per batch (migrate-pgvector mode) / foto per batch (batch mode)'
+    )
+    parser.add_argument(
+        '--roster-id', help='ID roster (roster-import mode; CSV dari --files)'
+    )
+    parser.add_argument(
+        '--threshold', type=float, default=None, help='Similarity minimum (find-duplicates mode)'
+    )
+    parser.add_argument(
+        '--output', help='File CSV output (find-duplicates mode)'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=None, help='Jumlah thread (find-duplicates mode) / worker process (batch mode) / '
+             'request bersamaan (benchmark-ort mode)'
+    )
+    parser.add_argument(
+        '--force', action='store_true', help='Convert ulang semua row (migrate-pgvector mode) / '
+             'quantize ulang model INT8 yang sudah ada (quantize mode)'
+    )
     
     args = parser.parse_args()
     
@@ -34,6 +76,10 @@ def main():
             sys.argv.extend(['--sample', str(args.sample)])
         elif args.all:
             sys.argv.append('--all')
+        if args.batch_size:
+            sys.argv.extend(['--batch-size', str(args.batch_size)])
+        if args.workers:
+            sys.argv.extend(['--workers', str(args.workers)])
         batch_main()
     elif args.mode == 'api':
         from api.recognition_api import app
@@ -41,6 +87,136 @@ def main():
     elif args.mode == 'web':
         from api.web_interface import app
         app.run(debug=True, host='0.0.0.0', port=5000)
+    elif args.mode == 'ann-build':
+        from face_recognition.database import FaceDatabase
+        from face_recognition.ann_index import create_ann_index
+        from face_recognition.config import ANN_INDEX_PATH
+        db = FaceDatabase()
+        gallery = db.load_gallery()
+        index = create_ann_index('ivf').build(gallery)
+        index.save(ANN_INDEX_PATH)
+        print(f"ANN index (nlist={index.nlist}, {len(gallery)} embeddings) disimpan ke {ANN_INDEX_PATH}")
+        db.close()
+    elif args.mode == 'migrate-pgvector':
+        from face_recognition.database import FaceDatabase
+        from face_recognition.config import PGVECTOR_MIGRATION_BATCH_SIZE
+        db = FaceDatabase()
+        converted = db.migrate_to_pgvector(
+            batch_size=args.batch_size or PGVECTOR_MIGRATION_BATCH_SIZE, force=args.force
+        )
+        print(f"Migrasi selesai: {converted} embeddings di-convert ke vector(512)")
+        db.close()
+    elif args.mode == 'gallery-recall':
+        from face_recognition.database import FaceDatabase
+        db = FaceDatabase()
+        gallery = db.load_gallery()
+        reference = _build_exact_gallery(db) if gallery.dtype == 'pq' else None
+        usage = gallery.memory_usage()
+        print(f"Gallery dtype={gallery.dtype}, {len(gallery)} embeddings, "
+              f"RAM {usage['ram_bytes'] / 1e6:.1f} MB, mmap {usage['mmap_bytes'] / 1e6:.1f} MB")
+        for noise in (0.0, 0.02):
+            recall = gallery.measure_recall(sample_size=args.sample or 200, top_k=10, noise=noise,
+                                            reference=reference)
+            print(f"noise={noise}: recall@10={recall['recall_at_k']:.4f}, "
+                  f"top-1 agreement={recall['top1_agreement']:.4f} ({recall['queries']} queries)")
+        db.close()
+    elif args.mode == 'pq-train':
+        from face_recognition.database import FaceDatabase
+        from face_recognition.gallery import EmbeddingGallery
+        from face_recognition.pq import ProductQuantizer
+        from face_recognition.config import PQ_CODEBOOK_PATH
+        db = FaceDatabase()
+        reference = _build_exact_gallery(db)
+        pq = ProductQuantizer().train(reference.matrix)
+        pq.save(PQ_CODEBOOK_PATH)
+        print(f"PQ codebook (M={pq.m}, {pq.code_size} bytes/NIM, {len(reference)} embeddings) "
+              f"disimpan ke {PQ_CODEBOOK_PATH}")
+        
+        pq_gallery = EmbeddingGallery(capacity=len(reference), dtype='pq', pq=pq,
+                                      exact_loader=db.get_embeddings_bulk)
+        for row, nim in enumerate(reference.nims):
+            if nim is not None:
+                pq_gallery.upsert(nim, reference.matrix[row])
+        usage = pq_gallery.memory_usage()
+        print(f"Gallery pq: RAM {usage['ram_bytes'] / 1e6:.1f} MB "
+              f"(float32: {reference.memory_usage()['ram_bytes'] / 1e6:.1f} MB)")
+        for noise in (0.0, 0.02):
+            recall = pq_gallery.measure_recall(sample_size=args.sample or 200, top_k=10, noise=noise,
+                                               reference=reference)
+            print(f"noise={noise}: recall@10={recall['recall_at_k']:.4f}, "
+                  f"top-1 agreement={recall['top1_agreement']:.4f} ({recall['queries']} queries)")
+        db.close()
+    elif args.mode == 'snapshot':
+        from face_recognition.database import FaceDatabase
+        from face_recognition.config import GALLERY_SNAPSHOT_PATH
+        db = FaceDatabase()
+        count, data_version = db.export_snapshot()
+        print(f"Snapshot {count} embeddings (version {data_version}) di-publish ke {GALLERY_SNAPSHOT_PATH}")
+        db.close()
+    elif args.mode == 'roster-import':
+        from face_recognition.database import FaceDatabase
+        from face_recognition.roster import load_roster_csv
+        if not args.roster_id or not args.files:
+            parser.error("roster-import butuh --roster-id dan --files <csv>")
+        nims = []
+        for path in args.files:
+            nims.extend(load_roster_csv(path))
+        db = FaceDatabase()
+        count = db.save_roster(args.roster_id, nims)
+        print(f"Roster {args.roster_id}: {count} NIM disimpan")
+        db.close()
+    elif args.mode == 'find-duplicates':
+        from face_recognition.duplicate_finder import main as duplicates_main
+        from face_recognition.config import (
+            DUPLICATE_OUTPUT_PATH, DUPLICATE_SIMILARITY_THRESHOLD, DUPLICATE_WORKERS
+        )
+        duplicates_main(
+            output_path=args.output or DUPLICATE_OUTPUT_PATH,
+            threshold=args.threshold if args.threshold is not None else DUPLICATE_SIMILARITY_THRESHOLD,
+            workers=args.workers or DUPLICATE_WORKERS
+        )
+    elif args.mode == 'benchmark-detect':
+        from face_recognition.benchmark import load_benchmark_images, benchmark_detection, print_detection_report
+        images = load_benchmark_images(files=args.files, sample=args.sample or 50)
+        if not images:
+            print("Tidak ada image untuk benchmark (gunakan --files atau isi PHOTOS_DIR)")
+            return
+        print_detection_report(benchmark_detection(images), len(images))
+    elif args.mode == 'benchmark-ort':
+        from face_recognition.benchmark import load_benchmark_images, sweep_session_options, print_session_sweep
+        images = load_benchmark_images(files=args.files, sample=args.sample or 50)
+        if not images:
+            print("Tidak ada image untuk benchmark (gunakan --files atau isi PHOTOS_DIR)")
+            return
+        concurrency = args.workers or 1
+        print(f"Sweep opsi session ONNX Runtime ({len(images)} images, concurrency {concurrency})...")
+        best, results = sweep_session_options(images, concurrency=concurrency)
+        print_session_sweep(best, results, len(images), concurrency)
+    elif args.mode == 'quantize':
+        from pathlib import Path
+        from face_recognition.database import FaceDatabase
+        from face_recognition.quantization import quantize_pack, sample_photo_paths, drift_report, print_drift_report
+        from face_recognition.config import QUANTIZATION_CALIBRATION_SIZE
+        quantize_pack(force=args.force)
+
+        # Evaluasi drift pada foto yang tidak dipakai kalibrasi
+        if args.files:
+            eval_paths = [Path(f) for f in args.files]
+        else:
+            paths = sample_photo_paths()
+            eval_paths = paths[QUANTIZATION_CALIBRATION_SIZE:] or paths
+            eval_paths = eval_paths[:args.sample or 200]
+        if not eval_paths:
+            print("Tidak ada foto untuk evaluasi drift (gunakan --files atau isi PHOTOS_DIR)")
+            return
+        try:
+            db = FaceDatabase()
+        except Exception as e:
+            print(f"Warning: database tidak tersedia ({str(e)}), top-1 agreement gallery dilewati")
+            db = None
+        print_drift_report(drift_report(eval_paths, db=db))
+        if db is not None:
+            db.close()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,7 @@
+"""
+Pytest config: repo root di sys.path supaya `pytest` (bukan hanya `python -m pytest`) bisa import face_recognition.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,105 @@
+"""
+Unit test IVFFlatIndex (numpy saja): recall shortlist vs exact search, update incremental
+lewat listener gallery, dan validasi file index saat load.
+"""
+import numpy as np
+import pytest
+
+from face_recognition import ann_index
+from face_recognition.ann_index import IVFFlatIndex, load_or_build_ann_index
+from face_recognition.gallery import EmbeddingGallery
+
+DIM = 32
+
+
+def _clustered(n: int, clusters: int = 16, seed: int = 0) -> np.ndarray:
+    """Embedding berkelompok seperti foto wajah (beberapa identitas mirip), L2-normalized."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, DIM))
+    vectors = centers[rng.integers(0, clusters, size=n)] + 0.3 * rng.normal(size=(n, DIM))
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _gallery(vectors: np.ndarray) -> EmbeddingGallery:
+    gallery = EmbeddingGallery(dim=DIM)
+    for i, vector in enumerate(vectors):
+        gallery.upsert(f"nim{i}", vector)
+    return gallery
+
+
+def _recall_at_1(index: IVFFlatIndex, gallery: EmbeddingGallery, queries: np.ndarray, nprobe: int) -> float:
+    hits = 0
+    for query in queries:
+        exact = gallery.search(query, threshold=0.0, top_k=1)[0]['nim']
+        shortlist = gallery.search(query, threshold=0.0, top_k=1, rows=index.candidates(query, nprobe=nprobe))
+        hits += bool(shortlist) and shortlist[0]['nim'] == exact
+    return hits / len(queries)
+
+
+def test_recall_and_nprobe():
+    vectors = _clustered(2000)
+    gallery = _gallery(vectors)
+    index = IVFFlatIndex(nlist=32, nprobe=4, dim=DIM).build(gallery, iterations=10)
+    queries = vectors[:100] + 0.05 * _clustered(100, seed=1)
+
+    assert _recall_at_1(index, gallery, queries, nprobe=4) >= 0.9
+    # nprobe = nlist: semua row menjadi kandidat (exact)
+    assert sorted(index.candidates(queries[0], nprobe=32).tolist()) == list(range(len(gallery)))
+    assert len(index.candidates(queries[0], nprobe=1)) < len(gallery)
+
+
+def test_listener_tracks_upsert_and_remove():
+    vectors = _clustered(500)
+    gallery = _gallery(vectors)
+    index = IVFFlatIndex(nlist=8, dim=DIM).build(gallery, iterations=5)
+
+    new_vector = _clustered(1, seed=2)[0]
+    gallery.upsert("baru", new_vector)
+    row = gallery.row_of("baru")
+    assert row in index.candidates(new_vector, nprobe=1)
+
+    # Embedding berubah: row pindah ke cluster embedding baru
+    gallery.upsert("baru", vectors[0])
+    assert row in index.candidates(vectors[0], nprobe=1)
+
+    gallery.remove("baru")
+    assert row not in index.candidates(vectors[0], nprobe=8)
+
+
+def test_save_load_roundtrip(tmp_path):
+    vectors = _clustered(300)
+    gallery = _gallery(vectors)
+    index = IVFFlatIndex(nlist=8, nprobe=3, dim=DIM).build(gallery, iterations=5)
+    path = tmp_path / "ann.npz"
+    index.save(path)
+
+    loaded = IVFFlatIndex.load(path, gallery, nlist=8)
+    assert loaded.nlist == 8 and loaded.nprobe == 3
+    np.testing.assert_array_equal(loaded.centroids, index.centroids)
+    for query in vectors[:10]:
+        assert sorted(loaded.candidates(query).tolist()) == sorted(index.candidates(query).tolist())
+
+
+def test_load_rejects_mismatched_file(tmp_path, monkeypatch):
+    gallery = _gallery(_clustered(200))
+    path = tmp_path / "ann.npz"
+    IVFFlatIndex(nlist=8, dim=DIM).build(gallery, iterations=5).save(path)
+
+    with pytest.raises(ValueError):
+        IVFFlatIndex.load(path, nlist=16)
+
+    class OtherIndex(IVFFlatIndex):
+        kind = "hnsw"
+
+    with pytest.raises(ValueError):
+        OtherIndex.load(path)
+
+    # nlist konfigurasi berubah: file diabaikan dan index di-build ulang dengan nlist baru
+    monkeypatch.setattr(ann_index, "ANN_IVF_NLIST", 4)
+    rebuilt = load_or_build_ann_index("ivf", gallery, path)
+    assert rebuilt.nlist == 4
+    assert IVFFlatIndex.load(path).nlist == 4
+
+    with pytest.raises(ValueError):
+        load_or_build_ann_index("hnsw", gallery, path)
@@ -0,0 +1,79 @@
+"""
+Unit test duplicate finder (numpy saja): pasangan dari scan per tile harus sama dengan
+segitiga atas matrix similarity N x N penuh, untuk berbagai ukuran tile dan jumlah worker.
+"""
+import csv
+
+import numpy as np
+import pytest
+
+from face_recognition.duplicate_finder import find_similar_pairs
+
+DIM = 32
+THRESHOLD = 0.5
+NEAR_IDENTICAL = 0.9
+
+
+def _embeddings(n: int = 150, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(n, DIM)).astype(np.float32)
+    # Beberapa NIM terdaftar dua kali (foto hampir sama) dan beberapa pasangan mirip (impostor risk)
+    embeddings[10] = embeddings[3] + 0.01 * rng.normal(size=DIM)
+    embeddings[120] = embeddings[77] + 0.02 * rng.normal(size=DIM)
+    embeddings[140] = embeddings[40] + 0.8 * rng.normal(size=DIM)
+    embeddings[5] = 0.0  # Embedding kosong tidak boleh membuat NaN
+    return [f"nim{i}" for i in range(n)], embeddings
+
+
+def _full_matrix_pairs(nims, embeddings):
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = embeddings / norms
+    scores = matrix @ matrix.T
+    rows, cols = np.nonzero(np.triu(scores >= THRESHOLD, k=1))
+    return {(nims[a], nims[b]): float(scores[a, b]) for a, b in zip(rows, cols)}
+
+
+def _read_pairs(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return rows, {(row['nim_a'], row['nim_b']): float(row['similarity']) for row in rows}
+
+
+@pytest.mark.parametrize("tile_size,workers", [(1000, 1), (16, 1), (7, 3), (64, 4)])
+def test_tiled_pairs_match_full_matrix(tmp_path, tile_size, workers):
+    nims, embeddings = _embeddings()
+    expected = _full_matrix_pairs(nims, embeddings)
+    output_path = tmp_path / "pairs.csv"
+
+    stats = find_similar_pairs(nims, embeddings, output_path, threshold=THRESHOLD,
+                               near_identical=NEAR_IDENTICAL, tile_size=tile_size, workers=workers)
+    rows, found = _read_pairs(output_path)
+
+    # Pasangan tepat di threshold boleh beda urutan pembulatan GEMM tile vs GEMM penuh
+    def certain(pairs):
+        return {pair for pair, score in pairs.items() if abs(score - THRESHOLD) > 1e-4}
+
+    assert certain(expected) <= set(found) and certain(found) <= set(expected)
+    assert len(rows) == len(found)  # Tidak ada pasangan ganda (a, b) / (b, a) atau diri sendiri
+    for pair, score in found.items():
+        if pair in expected:
+            assert score == pytest.approx(expected[pair], abs=1e-4)
+
+    assert stats['pairs'] == len(rows)
+    assert stats['pairs_compared'] == len(nims) * (len(nims) - 1) // 2
+    assert sum(count for _, _, count in stats['histogram']) == stats['pairs']
+    assert stats['near_duplicate'] == sum(row['category'] == 'near_duplicate' for row in rows)
+    assert {("nim3", "nim10"), ("nim77", "nim120")} <= {
+        (row['nim_a'], row['nim_b']) for row in rows if row['category'] == 'near_duplicate'
+    }
+    assert all(row['nim_a'] != "nim5" and row['nim_b'] != "nim5" for row in rows)
+
+
+def test_empty_and_single(tmp_path):
+    output_path = tmp_path / "pairs.csv"
+    for n in (0, 1):
+        stats = find_similar_pairs([f"nim{i}" for i in range(n)], np.ones((n, DIM), dtype=np.float32),
+                                   output_path, threshold=THRESHOLD, tile_size=8, workers=2)
+        assert stats['pairs'] == 0 and stats['pairs_compared'] == 0
+        assert _read_pairs(output_path)[0] == []
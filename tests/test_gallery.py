@@ -0,0 +1,143 @@
+"""
+Unit test EmbeddingGallery (numpy saja, tanpa database / model): hasil search dibandingkan
+dengan brute force cosine similarity, termasuk mode compact (float16 / int8 + rerank) dan pq.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from face_recognition.gallery import EmbeddingGallery
+from face_recognition.pq import ProductQuantizer
+
+DIM = 64
+
+
+def _normalized(n: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _brute_force(vectors: np.ndarray, nims, query: np.ndarray, top_k: int):
+    scores = np.clip(vectors @ (query / np.linalg.norm(query)), 0.0, 1.0)
+    order = np.argsort(-scores, kind="stable")[:top_k]
+    return [nims[i] for i in order], scores[order]
+
+
+def _fill(gallery: EmbeddingGallery, vectors: np.ndarray):
+    nims = [f"nim{i}" for i in range(len(vectors))]
+    for nim, vector in zip(nims, vectors):
+        gallery.upsert(nim, vector, f"{nim}.jpg")
+    return nims
+
+
+def test_float32_search_matches_brute_force():
+    vectors = _normalized(300)
+    gallery = EmbeddingGallery(dim=DIM)
+    nims = _fill(gallery, vectors)
+
+    for query in _normalized(10, seed=1):
+        expected_nims, expected_scores = _brute_force(vectors, nims, query, 5)
+        results = gallery.search(query, threshold=0.0, top_k=5)
+        assert [r['nim'] for r in results] == expected_nims
+        np.testing.assert_allclose([r['confidence'] for r in results], expected_scores, atol=1e-5)
+        assert results[0]['photo_path'] == f"{expected_nims[0]}.jpg"
+
+
+def test_upsert_overwrites_and_remove_reuses_row():
+    vectors = _normalized(20)
+    gallery = EmbeddingGallery(dim=DIM)
+    _fill(gallery, vectors)
+
+    gallery.upsert("nim3", vectors[7])
+    assert len(gallery) == 20
+    assert {r['nim'] for r in gallery.search(vectors[7], threshold=0.99, top_k=5)} == {"nim3", "nim7"}
+
+    row = gallery.row_of("nim5")
+    assert gallery.remove("nim5")
+    assert "nim5" not in gallery and len(gallery) == 19
+    assert all(r['nim'] != "nim5" for r in gallery.search(vectors[5], threshold=0.0, top_k=20))
+    assert not gallery.remove("nim5")
+
+    gallery.upsert("baru", vectors[5])
+    assert gallery.row_of("baru") == row
+    assert gallery.search(vectors[5], threshold=0.99, top_k=1)[0]['nim'] == "baru"
+
+
+def test_search_rows_subset_scores_exact():
+    vectors = _normalized(100)
+    gallery = EmbeddingGallery(dim=DIM)
+    nims = _fill(gallery, vectors)
+    rows = np.arange(0, 100, 3)
+
+    query = _normalized(1, seed=2)[0]
+    expected_nims, expected_scores = _brute_force(vectors[rows], [nims[i] for i in rows], query, 5)
+    results = gallery.search(query, threshold=0.0, top_k=5, rows=rows)
+    assert [r['nim'] for r in results] == expected_nims
+    np.testing.assert_allclose([r['confidence'] for r in results], expected_scores, atol=1e-5)
+
+
+def test_search_batch_matches_search():
+    vectors = _normalized(200)
+    gallery = EmbeddingGallery(dim=DIM)
+    _fill(gallery, vectors)
+    queries = _normalized(7, seed=3)
+
+    batched = gallery.search_batch(queries, threshold=0.0, top_k=4, max_chunk_bytes=3 * 200 * 4)
+    for query, results in zip(queries, batched):
+        single = gallery.search(query, threshold=0.0, top_k=4)
+        assert [r['nim'] for r in results] == [r['nim'] for r in single]
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compact_rerank_matches_exact(dtype, tmp_path):
+    vectors = _normalized(500)
+    gallery = EmbeddingGallery(dim=DIM, dtype=dtype, store_dir=tmp_path, rerank_candidates=64)
+    nims = _fill(gallery, vectors)
+    assert gallery.memory_usage()['mmap_bytes'] > 0
+
+    for query in vectors[:20] + 0.05 * _normalized(20, seed=4):
+        expected_nims, expected_scores = _brute_force(vectors, nims, query, 3)
+        results = gallery.search(query, threshold=0.0, top_k=3)
+        assert results[0]['nim'] == expected_nims[0]
+        # Rerank dari float32: confidence exact, bukan hasil codes compact
+        np.testing.assert_allclose(results[0]['confidence'], expected_scores[0], atol=1e-5)
+    gallery.close()
+
+
+def test_compact_store_file_not_left_behind(tmp_path):
+    stale = tmp_path / "gallery_f32_999999999_1_1.dat"
+    stale.write_bytes(b"\0" * 16)
+
+    gallery = EmbeddingGallery(dim=DIM, dtype="int8", store_dir=tmp_path)
+    _fill(gallery, _normalized(40))  # grow beberapa kali
+    assert not stale.exists()
+    if os.name != "nt":
+        assert list(tmp_path.glob("gallery_f32_*")) == []
+    gallery.close()
+    assert list(tmp_path.glob("gallery_f32_*")) == []
+
+
+def test_pq_rerank_uses_exact_embeddings():
+    vectors = _normalized(400)
+    pq = ProductQuantizer(num_subquantizers=8, dim=DIM).train(vectors, iterations=5)
+    originals = {f"nim{i}": vector for i, vector in enumerate(vectors)}
+    loaded = []
+
+    def exact_loader(nims):
+        loaded.append(len(nims))
+        return {nim: originals[nim] for nim in nims if nim in originals}
+
+    gallery = EmbeddingGallery(dim=DIM, dtype="pq", pq=pq, exact_loader=exact_loader, rerank_candidates=50)
+    nims = _fill(gallery, vectors)
+
+    for query in vectors[:10] + 0.05 * _normalized(10, seed=5):
+        expected_nims, expected_scores = _brute_force(vectors, nims, query, 1)
+        results = gallery.search(query, threshold=0.0, top_k=1)
+        assert results[0]['nim'] == expected_nims[0]
+        np.testing.assert_allclose(results[0]['confidence'], expected_scores[0], atol=1e-5)
+    assert loaded and max(loaded) <= 50
+
+    # Embedding asli tidak ditemukan: kandidat di-skip, bukan di-score dari codes
+    del originals["nim0"]
+    assert all(r['nim'] != "nim0" for r in gallery.search(vectors[0], threshold=0.0, top_k=5))
@@ -0,0 +1,63 @@
+"""
+Unit test manifest encoding (tanpa database): keputusan check_entry untuk incremental re-encode.
+"""
+import hashlib
+import os
+
+from face_recognition import manifest
+
+
+def _entry(path, status=manifest.STATUS_OK):
+    """Row manifest seperti hasil FaceDatabase.get_manifest untuk foto di path."""
+    row = manifest.build_entry("123", path, status)
+    keys = ('nim', 'photo_path', 'file_size', 'file_mtime', 'content_sha256', 'model_name',
+            'params_hash', 'qc_params', 'status')
+    return dict(zip(keys, row))
+
+
+def test_params_hash_stable_and_sensitive(monkeypatch):
+    assert manifest.params_hash() == manifest.params_hash()
+    assert len(manifest.params_hash()) == 16
+    fp32_hash = manifest.params_hash()
+
+    monkeypatch.setattr(manifest, "INFERENCE_PRECISION", "int8")
+    assert manifest.encoding_params()['precision'] == "int8"
+    assert manifest.params_hash() != fp32_hash
+
+    monkeypatch.setattr(manifest, "INFERENCE_PRECISION", "fp32")
+    monkeypatch.setattr(manifest, "QC_DB_BLUR_THRESHOLD", manifest.QC_DB_BLUR_THRESHOLD + 1)
+    assert manifest.params_hash() != fp32_hash
+
+
+def test_check_entry_decisions(tmp_path):
+    path = tmp_path / "123.jpg"
+    path.write_bytes(b"foto asli")
+    current = manifest.params_hash()
+
+    assert manifest.check_entry(None, path, current) == ('new', None)
+
+    entry = _entry(path)
+    assert entry['params_hash'] == current
+    assert manifest.check_entry(entry, path, current) == ('unchanged', None)
+    assert manifest.check_entry(entry, path, "hash-lain") == ('params_changed', None)
+    assert manifest.check_entry(_entry(path, status="error"), path, current) == ('retry', None)
+    assert manifest.check_entry(_entry(path, status=manifest.STATUS_QC_FAILED), path, current)[0] == 'unchanged'
+
+    # Isi sama, mtime berubah (mis. di-copy ulang): tidak di-encode, fingerprint baru dicatat
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+    decision, fingerprint = manifest.check_entry(entry, path, current)
+    assert decision == 'touched'
+    assert fingerprint == manifest.file_fingerprint(path)
+
+    # Isi berubah
+    path.write_bytes(b"foto baru, ukuran beda")
+    decision, fingerprint = manifest.check_entry(entry, path, current)
+    assert decision == 'file_changed'
+    assert fingerprint[2] != entry['content_sha256']
+
+
+def test_sha256_file_chunked(tmp_path):
+    path = tmp_path / "besar.bin"
+    path.write_bytes(os.urandom(3 * 1024 + 17))
+    assert manifest.sha256_file(path, chunk_size=1024) == hashlib.sha256(path.read_bytes()).hexdigest()
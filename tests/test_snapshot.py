@@ -0,0 +1,88 @@
+"""
+Unit test snapshot gallery on-disk (numpy saja): write_snapshot -> GallerySnapshot roundtrip,
+is_current setelah snapshot diganti, dan gallery yang dibuka dari snapshot.
+"""
+import struct
+
+import numpy as np
+import pytest
+
+from face_recognition.gallery import EmbeddingGallery
+from face_recognition.snapshot import GallerySnapshot, write_snapshot
+
+DIM = 16
+
+
+def _rows(n: int, seed: int = 0):
+    vectors = np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+    return [(f"nim{i}", vectors[i].tobytes(), f"foto/{i}.jpg" if i % 2 else None) for i in range(n)], vectors
+
+
+def test_roundtrip(tmp_path):
+    rows, vectors = _rows(50)
+    rows.append(("nol", np.zeros(DIM, dtype=np.float32).tobytes(), None))  # Tidak bisa dinormalisasi: di-skip
+    path = tmp_path / "snapshot.bin"
+
+    assert write_snapshot(path, rows, data_version=42, data_xmin=1000, dim=DIM, headroom=10) == 50
+
+    snapshot = GallerySnapshot(path)
+    assert (snapshot.count, snapshot.capacity, snapshot.dim) == (50, 60, DIM)
+    assert snapshot.data_version == 42 and snapshot.data_xmin == 1000
+    assert snapshot.nims == [f"nim{i}" for i in range(50)]
+    assert snapshot.photo_paths[0] is None and snapshot.photo_paths[1] == "foto/1.jpg"
+    expected = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.testing.assert_allclose(snapshot.matrix[:50], expected, atol=1e-6)
+    assert not np.any(snapshot.matrix[50:])
+
+
+def test_is_current_after_replace(tmp_path):
+    path = tmp_path / "snapshot.bin"
+    write_snapshot(path, _rows(5)[0], data_version=1, data_xmin=1, dim=DIM)
+    snapshot = GallerySnapshot(path)
+    assert snapshot.is_current()
+
+    write_snapshot(path, _rows(6, seed=1)[0], data_version=2, data_xmin=2, dim=DIM)
+    assert not snapshot.is_current()
+    # Snapshot lama tetap terbaca (inode lama) sampai dibuka ulang
+    assert snapshot.count == 5 and snapshot.data_version == 1
+    assert GallerySnapshot(path).data_version == 2
+
+    path.unlink()
+    assert not snapshot.is_current()
+
+
+def test_rejects_invalid_file(tmp_path):
+    path = tmp_path / "snapshot.bin"
+    path.write_bytes(b"bukan snapshot" * 400)
+    with pytest.raises(ValueError):
+        GallerySnapshot(path)
+
+    path.write_bytes(b"pendek")
+    with pytest.raises(ValueError):
+        GallerySnapshot(path)
+
+    # Format lama (v1, tanpa data_xmin) harus ditolak supaya watermark tidak dibaca salah
+    write_snapshot(path, _rows(3)[0], data_version=1, data_xmin=1, dim=DIM)
+    with open(path, "r+b") as f:
+        f.seek(8)
+        f.write(struct.pack("<I", 1))
+    with pytest.raises(ValueError):
+        GallerySnapshot(path)
+
+
+def test_gallery_from_snapshot_is_copy_on_write(tmp_path):
+    rows, vectors = _rows(20)
+    path = tmp_path / "snapshot.bin"
+    write_snapshot(path, rows, data_version=7, data_xmin=7, dim=DIM, headroom=4)
+
+    gallery = EmbeddingGallery.from_snapshot(GallerySnapshot(path))
+    assert len(gallery) == 20
+    assert gallery.search(vectors[3], threshold=0.99, top_k=1)[0]['nim'] == "nim3"
+
+    # Upsert di gallery tidak menulis balik ke file snapshot
+    gallery.upsert("nim3", vectors[4])
+    gallery.upsert("baru", vectors[5])
+    assert gallery.search(vectors[5], threshold=0.99, top_k=5)[0]['nim'] in ("nim5", "baru")
+    reopened = GallerySnapshot(path)
+    assert reopened.count == 20
+    np.testing.assert_allclose(reopened.matrix[3], vectors[3] / np.linalg.norm(vectors[3]), atol=1e-6)